@@ -0,0 +1,25 @@
+"""
+Python client for the BUCChain AI service
+
+    from ai.client import AsyncBucchainClient
+
+    async with AsyncBucchainClient("http://localhost:8002", coalesce=True) as client:
+        result = await client.detect("scans/IMG_0001.jpg")
+
+BucchainClient offers the same calls synchronously. Uploads given as paths
+are streamed from disk, shed requests (429 / 503) are retried with jittered
+backoff that respects Retry-After, and with `coalesce=True` concurrent
+single-image calls are sent as /detect/batch requests.
+"""
+
+from ai.client.async_client import AsyncBucchainClient
+from ai.client.base import BucchainError, RetryPolicy, ServiceOverloaded
+from ai.client.sync_client import BucchainClient
+
+__all__ = [
+    "AsyncBucchainClient",
+    "BucchainClient",
+    "BucchainError",
+    "RetryPolicy",
+    "ServiceOverloaded"
+]
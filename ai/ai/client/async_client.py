@@ -0,0 +1,334 @@
+"""
+Asyncio client for the BUCChain AI service
+
+One pooled httpx.AsyncClient per client instance: connections are kept alive
+between calls and HTTP/2 is negotiated when the h2 package is installed.
+With `coalesce=True`, concurrent detect() calls made within a short window
+are sent together as one /detect/batch request.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+
+from ai.client.base import (
+    DEFAULT_TIMEOUT,
+    MAX_BATCH_SIZE,
+    RETRY_STATUSES,
+    ImageSource,
+    RetryPolicy,
+    build_files,
+    coalesced_name,
+    http2_available,
+    merge_batches,
+    parse_batch,
+    parse_detection,
+    parse_multi_frame,
+    raise_for_status,
+    split_coalesced_results,
+    upload_name
+)
+from ai.models.predictions import (
+    BatchDetectionResponse,
+    DetectionResponse,
+    MultiFrameDetectionResponse
+)
+
+
+class AsyncBucchainClient:
+    """Asyncio client for detection and analytics endpoints"""
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8002",
+        api_prefix: str = "/api/v1",
+        timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        http2: Optional[bool] = None,
+        retry: Optional[RetryPolicy] = None,
+        coalesce: bool = False,
+        coalesce_window: float = 0.01,
+        max_batch_size: int = 16,
+        priority: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            base_url: Service URL
+            api_prefix: Prefix of the versioned API routes
+            timeout: Request timeout
+            max_connections: Connection pool size
+            max_keepalive_connections: Idle connections kept open
+            http2: Use HTTP/2 (defaults to whether h2 is installed)
+            retry: Retry policy for 429 / 503 and connection failures
+            coalesce: Send concurrent detect() calls as batch requests
+            coalesce_window: Seconds to wait for more calls to join a batch
+            max_batch_size: Calls per coalesced batch (at most 50)
+            priority: X-Priority lane sent with detection requests
+            headers: Extra headers sent with every request
+            transport: Custom transport, e.g. httpx.ASGITransport(app=app)
+                to call the app in-process
+        """
+        if http2 is None:
+            http2 = transport is None and http2_available()
+        self.api_prefix = api_prefix.rstrip("/")
+        self.retry = retry or RetryPolicy()
+        self.coalesce = coalesce
+        self.coalesce_window = coalesce_window
+        self.max_batch_size = min(max_batch_size, MAX_BATCH_SIZE)
+        self.priority = priority
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ),
+            http2=http2,
+            headers=headers,
+            transport=transport
+        )
+        self.retries = 0
+        self.coalesced_batches = 0
+        self._pending: List[Tuple[ImageSource, str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "AsyncBucchainClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Send pending coalesced calls and close the connection pool"""
+        if self._pending:
+            self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.http.aclose()
+
+    def _headers(self, priority: Optional[str]) -> Dict[str, str]:
+        priority = priority or self.priority
+        return {"X-Priority": priority} if priority else {}
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        uploads: Optional[Sequence[Tuple[ImageSource, Optional[str]]]] = None,
+        field: str = "file",
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        """
+        Send a request, retrying shed requests and failed connections
+
+        Raises:
+            ServiceOverloaded: If the service kept shedding the request
+            BucchainError: For other error responses
+        """
+        attempt = 0
+        while True:
+            files, opened = build_files(field, uploads) if uploads else (None, [])
+            try:
+                response = await self.http.request(
+                    method, path, files=files, params=params, headers=headers
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if not self.retry.should_retry(attempt, None):
+                    raise
+                response = None
+            finally:
+                for f in opened:
+                    f.close()
+
+            if response is None or response.status_code in RETRY_STATUSES:
+                if self.retry.should_retry(attempt, response):
+                    await asyncio.sleep(self.retry.delay(attempt, response))
+                    attempt += 1
+                    self.retries += 1
+                    continue
+            raise_for_status(response)
+            return response
+
+    async def detect(
+        self,
+        source: ImageSource,
+        filename: Optional[str] = None,
+        priority: Optional[str] = None
+    ) -> DetectionResponse:
+        """
+        Detect counterfeits in one image
+
+        Args:
+            source: File path (streamed from disk), bytes, or binary file
+            filename: Filename to report (defaults to the path's name)
+            priority: X-Priority lane override
+
+        Returns:
+            DetectionResponse
+        """
+        if self.coalesce and priority is None:
+            return await self._coalesced_detect(source, upload_name(source, filename))
+        return await self._detect_single(source, filename, priority)
+
+    async def _detect_single(
+        self,
+        source: ImageSource,
+        filename: Optional[str],
+        priority: Optional[str] = None
+    ) -> DetectionResponse:
+        response = await self._request(
+            "POST",
+            f"{self.api_prefix}/detect",
+            uploads=[(source, filename)],
+            headers=self._headers(priority)
+        )
+        return parse_detection(response.json())
+
+    async def detect_batch(
+        self,
+        sources: Sequence[ImageSource],
+        priority: Optional[str] = None
+    ) -> BatchDetectionResponse:
+        """
+        Detect counterfeits in several images
+
+        Lists longer than the server's batch limit are split into several
+        requests, sent concurrently over the pool, and merged.
+
+        Args:
+            sources: File paths, bytes, or binary files
+            priority: X-Priority lane override (the service defaults to bulk)
+
+        Returns:
+            BatchDetectionResponse over all images
+        """
+        chunks = [sources[i:i + MAX_BATCH_SIZE] for i in range(0, len(sources), MAX_BATCH_SIZE)]
+        batches = await asyncio.gather(*(self._batch(chunk, priority) for chunk in chunks))
+        return merge_batches(batches)
+
+    async def _batch(
+        self,
+        uploads: Sequence[Any],
+        priority: Optional[str],
+        names: Optional[Sequence[str]] = None
+    ) -> BatchDetectionResponse:
+        response = await self._request(
+            "POST",
+            f"{self.api_prefix}/detect/batch",
+            uploads=[(source, names[i] if names else None) for i, source in enumerate(uploads)],
+            field="files",
+            headers=self._headers(priority)
+        )
+        return parse_batch(response.json())
+
+    async def detect_burst(
+        self,
+        sources: Sequence[ImageSource],
+        priority: Optional[str] = None
+    ) -> MultiFrameDetectionResponse:
+        """
+        Get one verdict for a short video or a burst of photos of one item
+
+        Args:
+            sources: One video, or several images
+            priority: X-Priority lane override
+
+        Returns:
+            MultiFrameDetectionResponse
+        """
+        response = await self._request(
+            "POST",
+            f"{self.api_prefix}/detect/burst",
+            uploads=[(source, None) for source in sources],
+            field="files",
+            headers=self._headers(priority)
+        )
+        return parse_multi_frame(response.json())
+
+    async def _coalesced_detect(self, source: ImageSource, filename: str) -> DetectionResponse:
+        """Queue a detect() call for the next coalesced batch"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((source, filename, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_window, self._flush)
+        return await future
+
+    def _flush(self):
+        """Send the pending calls as one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._send_coalesced(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send_coalesced(self, pending: List[Tuple[ImageSource, str, asyncio.Future]]):
+        """Send a coalesced batch and resolve its callers' futures"""
+        if len(pending) == 1:
+            results = {}
+        else:
+            try:
+                batch = await self._batch(
+                    [source for source, _, _ in pending],
+                    # Single calls keep the lane /detect would have used
+                    self.priority or "interactive",
+                    names=[coalesced_name(i, name) for i, (_, name, _) in enumerate(pending)]
+                )
+                self.coalesced_batches += 1
+                results = split_coalesced_results(batch, len(pending))
+            except Exception as e:
+                for _, _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        # Files the batch endpoint skipped are retried alone to get their error
+        async def resolve(index: int, source: ImageSource, name: str, future: asyncio.Future):
+            try:
+                result = results.get(index) or await self._detect_single(source, name)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+
+        await asyncio.gather(*(
+            resolve(i, source, name, future) for i, (source, name, future) in enumerate(pending)
+        ))
+
+    async def health(self) -> Dict[str, Any]:
+        """Service health (/health)"""
+        return (await self._request("GET", "/health")).json()
+
+    async def analytics(self, name: str, **params) -> Dict[str, Any]:
+        """
+        Fetch an analytics endpoint
+
+        Args:
+            name: Endpoint below /analytics, e.g. "summary", "admission"
+            **params: Query parameters
+
+        Returns:
+            Decoded JSON body
+        """
+        response = await self._request("GET", f"{self.api_prefix}/analytics/{name}", params=params or None)
+        return response.json()
+
+    async def summary(self) -> Dict[str, Any]:
+        """Aggregated detection statistics (/analytics/summary)"""
+        return await self.analytics("summary")
+
+    async def recent(self, limit: int = 10, offset: int = 0) -> Dict[str, Any]:
+        """Recent detections (/analytics/recent)"""
+        return await self.analytics("recent", limit=limit, offset=offset)
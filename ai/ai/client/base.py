@@ -0,0 +1,292 @@
+"""
+Shared pieces of the BUCChain AI clients
+
+Errors, the retry policy, upload handling and response parsing used by both
+the sync and the asyncio client.
+"""
+
+import importlib.util
+import mimetypes
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+
+from ai.models.predictions import (
+    BatchDetectionResponse,
+    DetectionResponse,
+    MultiFrameDetectionResponse
+)
+
+# A file path, raw encoded bytes, or an open binary file
+ImageSource = Union[str, os.PathLike, bytes, IO[bytes]]
+
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+# Status codes the service uses for load shedding (with Retry-After)
+RETRY_STATUSES = frozenset({429, 503})
+
+# Server-side limit of /detect/batch
+MAX_BATCH_SIZE = 50
+
+# Filename prefix the coalescers use to match batch results to callers
+COALESCE_PREFIX = "__c"
+
+
+class BucchainError(Exception):
+    """Error response from the AI service"""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ServiceOverloaded(BucchainError):
+    """429 / 503 load shedding that persisted through all retries"""
+
+    def __init__(self, status_code: int, detail: Any, retry_after: Optional[float]):
+        super().__init__(status_code, detail)
+        self.retry_after = retry_after
+
+
+def http2_available() -> bool:
+    """Whether httpx can negotiate HTTP/2 (needs the h2 package)"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header
+
+    Args:
+        value: Header value (delay in seconds or an HTTP date)
+
+    Returns:
+        Delay in seconds, or None if absent or malformed
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Retries with full-jitter exponential backoff on 429 / 503"""
+
+    def __init__(self, max_retries: int = 3, backoff: float = 0.25, max_backoff: float = 8.0):
+        """
+        Args:
+            max_retries: Retries after the first attempt (0 disables retries)
+            backoff: Base delay in seconds, doubled per attempt
+            max_backoff: Upper bound of a single delay
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def should_retry(self, attempt: int, response: Optional[httpx.Response]) -> bool:
+        """
+        Check whether a failed attempt should be retried
+
+        Args:
+            attempt: Attempts made so far minus one
+            response: Response, or None if the connection failed
+        """
+        if attempt >= self.max_retries:
+            return False
+        return response is None or response.status_code in RETRY_STATUSES
+
+    def delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """
+        Seconds to wait before the next attempt
+
+        The service's Retry-After is a lower bound; jitter on top of it keeps
+        clients that were shed together from coming back together.
+
+        Args:
+            attempt: Attempts made so far minus one
+            response: Last response, or None if the connection failed
+        """
+        ceiling = min(self.max_backoff, self.backoff * (2 ** attempt))
+        jitter = random.uniform(0, ceiling)
+        retry_after = parse_retry_after(response.headers.get("retry-after")) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff) + jitter / 2
+        return jitter
+
+
+def upload_name(source: ImageSource, filename: Optional[str] = None) -> str:
+    """Filename sent for an upload (the path's name unless given)"""
+    if filename:
+        return filename
+    if isinstance(source, (str, os.PathLike)):
+        return Path(source).name
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return "image.jpg"
+    return Path(getattr(source, "name", "image.jpg")).name
+
+
+def open_upload(source: ImageSource, filename: Optional[str] = None) -> Tuple[str, Any, str, bool]:
+    """
+    Prepare a multipart file field
+
+    Paths are opened rather than read, so httpx streams them in chunks.
+    File objects are rewound, so the same source can be sent again on retry.
+
+    Args:
+        source: File path, bytes, or binary file object
+        filename: Filename to send (defaults to the path's name)
+
+    Returns:
+        (filename, content, content_type, opened); close the content when
+        `opened` is True
+    """
+    name = upload_name(source, filename)
+    if isinstance(source, (str, os.PathLike)):
+        return name, open(source, "rb"), content_type_for(name), True
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return name, bytes(source), content_type_for(name), False
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return name, source, content_type_for(name), False
+
+
+def build_files(
+    field: str,
+    uploads: Sequence[Tuple[ImageSource, Optional[str]]]
+) -> Tuple[List[Tuple[str, Tuple[str, Any, str]]], List[IO[bytes]]]:
+    """
+    Build httpx multipart files for one attempt
+
+    Args:
+        field: Form field name
+        uploads: (source, filename) pairs
+
+    Returns:
+        (files, opened); close every file in `opened` after the attempt
+    """
+    files, opened = [], []
+    try:
+        for source, filename in uploads:
+            name, content, content_type, owned = open_upload(source, filename)
+            if owned:
+                opened.append(content)
+            files.append((field, (name, content, content_type)))
+    except BaseException:
+        for f in opened:
+            f.close()
+        raise
+    return files, opened
+
+
+def content_type_for(filename: str) -> str:
+    """MIME type the service expects for a filename"""
+    guessed, _ = mimetypes.guess_type(filename)
+    return guessed or "image/jpeg"
+
+
+def raise_for_status(response: httpx.Response):
+    """
+    Raise BucchainError for error responses
+
+    Raises:
+        ServiceOverloaded: For 429 / 503
+        BucchainError: For other 4xx / 5xx
+    """
+    if response.status_code < 400:
+        return
+    try:
+        body = response.json()
+        detail = body.get("detail", body) if isinstance(body, dict) else body
+    except ValueError:
+        detail = response.text
+    if response.status_code in RETRY_STATUSES:
+        raise ServiceOverloaded(
+            response.status_code, detail, parse_retry_after(response.headers.get("retry-after"))
+        )
+    raise BucchainError(response.status_code, detail)
+
+
+def parse_detection(data: Dict[str, Any]) -> DetectionResponse:
+    """Build a DetectionResponse from a /detect response body"""
+    return DetectionResponse.model_validate(data)
+
+
+def parse_batch(data: Dict[str, Any]) -> BatchDetectionResponse:
+    """Build a BatchDetectionResponse from a /detect/batch response body"""
+    return BatchDetectionResponse.model_validate(data)
+
+
+def parse_multi_frame(data: Dict[str, Any]) -> MultiFrameDetectionResponse:
+    """Build a MultiFrameDetectionResponse from a /detect/burst response body"""
+    return MultiFrameDetectionResponse.model_validate(data)
+
+
+def merge_batches(batches: Sequence[BatchDetectionResponse]) -> BatchDetectionResponse:
+    """
+    Combine the responses of a batch split across several requests
+
+    Args:
+        batches: Responses in request order
+
+    Returns:
+        BatchDetectionResponse with aggregates over all results
+    """
+    if len(batches) == 1:
+        return batches[0]
+    results = [r for batch in batches for r in batch.results]
+    completed = [r for r in results if r.status == "completed"]
+    return BatchDetectionResponse(
+        results=results,
+        total_processed=len(results),
+        total_counterfeit=sum(1 for r in completed if r.is_counterfeit),
+        average_confidence=sum(r.confidence for r in completed) / len(completed) if completed else 0.0,
+        total_processing_time_seconds=sum(b.total_processing_time_seconds for b in batches)
+    )
+
+
+def coalesced_name(index: int, filename: str) -> str:
+    """Filename tagged with its position in a coalesced batch"""
+    return f"{COALESCE_PREFIX}{index}_{filename}"
+
+
+def split_coalesced_results(
+    batch: BatchDetectionResponse,
+    count: int
+) -> Dict[int, DetectionResponse]:
+    """
+    Map coalesced batch results back to their callers
+
+    The batch endpoint skips files it cannot process, so results are
+    matched by the tagged filename rather than by position; the original
+    filename is restored.
+
+    Args:
+        batch: Response of the coalesced batch
+        count: Number of files in the batch
+
+    Returns:
+        Results by position in the batch (missing for skipped files)
+    """
+    results: Dict[int, DetectionResponse] = {}
+    for result in batch.results:
+        name = result.image_metadata.filename
+        if not name.startswith(COALESCE_PREFIX):
+            continue
+        index, _, original = name[len(COALESCE_PREFIX):].partition("_")
+        if index.isdigit() and int(index) < count:
+            result.image_metadata.filename = original
+            results[int(index)] = result
+    return results
@@ -0,0 +1,338 @@
+"""
+Synchronous client for the BUCChain AI service
+
+Same API as AsyncBucchainClient for scripts and threaded tools. The client
+is thread-safe; with `coalesce=True`, detect() calls made concurrently from
+several threads are sent together as one /detect/batch request: the first
+caller waits up to `coalesce_window` for others to join and sends the batch
+for all of them.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from ai.client.base import (
+    DEFAULT_TIMEOUT,
+    MAX_BATCH_SIZE,
+    RETRY_STATUSES,
+    ImageSource,
+    RetryPolicy,
+    build_files,
+    coalesced_name,
+    http2_available,
+    merge_batches,
+    parse_batch,
+    parse_detection,
+    parse_multi_frame,
+    raise_for_status,
+    split_coalesced_results,
+    upload_name
+)
+from ai.models.predictions import (
+    BatchDetectionResponse,
+    DetectionResponse,
+    MultiFrameDetectionResponse
+)
+
+
+class BucchainClient:
+    """Synchronous client for detection and analytics endpoints"""
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8002",
+        api_prefix: str = "/api/v1",
+        timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        http2: Optional[bool] = None,
+        retry: Optional[RetryPolicy] = None,
+        coalesce: bool = False,
+        coalesce_window: float = 0.01,
+        max_batch_size: int = 16,
+        priority: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+        http_client: Optional[httpx.Client] = None
+    ):
+        """
+        Args:
+            base_url: Service URL
+            api_prefix: Prefix of the versioned API routes
+            timeout: Request timeout
+            max_connections: Connection pool size
+            max_keepalive_connections: Idle connections kept open
+            http2: Use HTTP/2 (defaults to whether h2 is installed)
+            retry: Retry policy for 429 / 503 and connection failures
+            coalesce: Send concurrent detect() calls as batch requests
+            coalesce_window: Seconds to wait for more calls to join a batch
+            max_batch_size: Calls per coalesced batch (at most 50)
+            priority: X-Priority lane sent with detection requests
+            headers: Extra headers sent with every request
+            transport: Custom transport
+            http_client: Ready-made httpx.Client to use instead of creating
+                one, e.g. starlette's TestClient(app) to call the app
+                in-process (closed with this client)
+        """
+        if http2 is None:
+            http2 = transport is None and http2_available()
+        self.api_prefix = api_prefix.rstrip("/")
+        self.retry = retry or RetryPolicy()
+        self.coalesce = coalesce
+        self.coalesce_window = coalesce_window
+        self.max_batch_size = min(max_batch_size, MAX_BATCH_SIZE)
+        self.priority = priority
+        self.http = http_client or httpx.Client(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ),
+            http2=http2,
+            headers=headers,
+            transport=transport
+        )
+        self.retries = 0
+        self.coalesced_batches = 0
+        self._pending: List[Tuple[ImageSource, str, Future]] = []
+        self._leader = False
+        self._cond = threading.Condition()
+
+    def __enter__(self) -> "BucchainClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Close the connection pool"""
+        self.http.close()
+
+    def _headers(self, priority: Optional[str]) -> Dict[str, str]:
+        priority = priority or self.priority
+        return {"X-Priority": priority} if priority else {}
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        uploads: Optional[Sequence[Tuple[ImageSource, Optional[str]]]] = None,
+        field: str = "file",
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        """
+        Send a request, retrying shed requests and failed connections
+
+        Raises:
+            ServiceOverloaded: If the service kept shedding the request
+            BucchainError: For other error responses
+        """
+        attempt = 0
+        while True:
+            files, opened = build_files(field, uploads) if uploads else (None, [])
+            try:
+                response = self.http.request(
+                    method, path, files=files, params=params, headers=headers
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if not self.retry.should_retry(attempt, None):
+                    raise
+                response = None
+            finally:
+                for f in opened:
+                    f.close()
+
+            if response is None or response.status_code in RETRY_STATUSES:
+                if self.retry.should_retry(attempt, response):
+                    time.sleep(self.retry.delay(attempt, response))
+                    attempt += 1
+                    self.retries += 1
+                    continue
+            raise_for_status(response)
+            return response
+
+    def detect(
+        self,
+        source: ImageSource,
+        filename: Optional[str] = None,
+        priority: Optional[str] = None
+    ) -> DetectionResponse:
+        """
+        Detect counterfeits in one image
+
+        Args:
+            source: File path (streamed from disk), bytes, or binary file
+            filename: Filename to report (defaults to the path's name)
+            priority: X-Priority lane override
+
+        Returns:
+            DetectionResponse
+        """
+        if self.coalesce and priority is None:
+            return self._coalesced_detect(source, upload_name(source, filename))
+        return self._detect_single(source, filename, priority)
+
+    def _detect_single(
+        self,
+        source: ImageSource,
+        filename: Optional[str],
+        priority: Optional[str] = None
+    ) -> DetectionResponse:
+        response = self._request(
+            "POST",
+            f"{self.api_prefix}/detect",
+            uploads=[(source, filename)],
+            headers=self._headers(priority)
+        )
+        return parse_detection(response.json())
+
+    def detect_batch(
+        self,
+        sources: Sequence[ImageSource],
+        priority: Optional[str] = None
+    ) -> BatchDetectionResponse:
+        """
+        Detect counterfeits in several images
+
+        Lists longer than the server's batch limit are split into several
+        requests and merged.
+
+        Args:
+            sources: File paths, bytes, or binary files
+            priority: X-Priority lane override (the service defaults to bulk)
+
+        Returns:
+            BatchDetectionResponse over all images
+        """
+        return merge_batches([
+            self._batch(sources[i:i + MAX_BATCH_SIZE], priority)
+            for i in range(0, len(sources), MAX_BATCH_SIZE)
+        ])
+
+    def _batch(
+        self,
+        uploads: Sequence[Any],
+        priority: Optional[str],
+        names: Optional[Sequence[str]] = None
+    ) -> BatchDetectionResponse:
+        response = self._request(
+            "POST",
+            f"{self.api_prefix}/detect/batch",
+            uploads=[(source, names[i] if names else None) for i, source in enumerate(uploads)],
+            field="files",
+            headers=self._headers(priority)
+        )
+        return parse_batch(response.json())
+
+    def detect_burst(
+        self,
+        sources: Sequence[ImageSource],
+        priority: Optional[str] = None
+    ) -> MultiFrameDetectionResponse:
+        """
+        Get one verdict for a short video or a burst of photos of one item
+
+        Args:
+            sources: One video, or several images
+            priority: X-Priority lane override
+
+        Returns:
+            MultiFrameDetectionResponse
+        """
+        response = self._request(
+            "POST",
+            f"{self.api_prefix}/detect/burst",
+            uploads=[(source, None) for source in sources],
+            field="files",
+            headers=self._headers(priority)
+        )
+        return parse_multi_frame(response.json())
+
+    def _coalesced_detect(self, source: ImageSource, filename: str) -> DetectionResponse:
+        """Join the next coalesced batch, sending it if no other caller will"""
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((source, filename, future))
+            if len(self._pending) >= self.max_batch_size:
+                self._cond.notify_all()
+            leader = not self._leader
+            self._leader = True
+
+        if leader:
+            deadline = time.monotonic() + self.coalesce_window
+            with self._cond:
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            # Keep sending until no calls are waiting; calls arriving after
+            # the last batch was taken start a new one
+            while True:
+                with self._cond:
+                    pending = self._pending[:self.max_batch_size]
+                    del self._pending[:self.max_batch_size]
+                    if not self._pending:
+                        self._leader = False
+                    done = not self._leader
+                self._send_coalesced(pending)
+                if done:
+                    break
+
+        return future.result()
+
+    def _send_coalesced(self, pending: List[Tuple[ImageSource, str, Future]]):
+        """Send a coalesced batch and resolve its callers' futures"""
+        results = {}
+        if len(pending) > 1:
+            try:
+                batch = self._batch(
+                    [source for source, _, _ in pending],
+                    # Single calls keep the lane /detect would have used
+                    self.priority or "interactive",
+                    names=[coalesced_name(i, name) for i, (_, name, _) in enumerate(pending)]
+                )
+                self.coalesced_batches += 1
+                results = split_coalesced_results(batch, len(pending))
+            except Exception as e:
+                for _, _, future in pending:
+                    future.set_exception(e)
+                return
+
+        # Files the batch endpoint skipped are retried alone to get their error
+        for index, (source, name, future) in enumerate(pending):
+            try:
+                future.set_result(results.get(index) or self._detect_single(source, name))
+            except Exception as e:
+                future.set_exception(e)
+
+    def health(self) -> Dict[str, Any]:
+        """Service health (/health)"""
+        return self._request("GET", "/health").json()
+
+    def analytics(self, name: str, **params) -> Dict[str, Any]:
+        """
+        Fetch an analytics endpoint
+
+        Args:
+            name: Endpoint below /analytics, e.g. "summary", "admission"
+            **params: Query parameters
+
+        Returns:
+            Decoded JSON body
+        """
+        return self._request("GET", f"{self.api_prefix}/analytics/{name}", params=params or None).json()
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregated detection statistics (/analytics/summary)"""
+        return self.analytics("summary")
+
+    def recent(self, limit: int = 10, offset: int = 0) -> Dict[str, Any]:
+        """Recent detections (/analytics/recent)"""
+        return self.analytics("recent", limit=limit, offset=offset)
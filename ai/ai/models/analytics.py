@@ -7,6 +7,28 @@ from typing import Dict, List, Optional
 from datetime import datetime
 
 
+class CpuLayout(BaseModel):
+    """Effective CPU thread layout of the process that served the request"""
+    pid: int = Field(..., description="Process id")
+    cores: int = Field(..., description="Cores available to the service")
+    workers: int = Field(..., description="API worker processes")
+    processes: int = Field(..., description="Processes sharing the cores (workers x inference processes)")
+    threads_per_process: int = Field(..., description="Thread budget per process")
+    opencv_threads: int = Field(..., description="OpenCV thread pool size")
+    blas_threads: int = Field(..., description="BLAS / OpenMP threads from the environment")
+    intra_op_threads: Optional[int] = Field(None, description="Inference runtime intra-op threads")
+    affinity: Optional[List[int]] = Field(None, description="Pinned CPUs (null when pinning is off)")
+    worker_index: Optional[int] = Field(None, description="Index of this worker when pinned")
+
+
+class MemoryStatus(BaseModel):
+    """Memory state of the process that served the request"""
+    rss_mb: float = Field(..., description="Resident set size in MB")
+    peak_rss_mb: float = Field(..., description="Highest sampled RSS in MB")
+    soft_limit_mb: Optional[float] = Field(None, description="RSS at which the worker recycles (null: never)")
+    state: str = Field(..., description="ok, or draining while the worker recycles")
+
+
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str = Field(..., description="Service status")
@@ -15,6 +37,8 @@ class HealthResponse(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now, description="Check timestamp")
     dependencies: Dict[str, str] = Field(..., description="Dependency versions")
     uptime_seconds: Optional[float] = Field(None, description="Service uptime in seconds")
+    cpu: Optional[CpuLayout] = Field(None, description="CPU thread layout")
+    memory: Optional[MemoryStatus] = Field(None, description="Memory watchdog state")
     
     class Config:
         json_schema_extra = {
@@ -83,3 +107,306 @@ class AnalyticsRequest(BaseModel):
     """Analytics query request"""
     limit: int = Field(default=10, ge=1, le=100, description="Maximum number of results")
     offset: int = Field(default=0, ge=0, description="Offset for pagination")
+
+
+class AdmissionDecisionEntry(BaseModel):
+    """Single admission control decision"""
+    timestamp: datetime = Field(..., description="Decision timestamp")
+    decision: str = Field(..., description="admit, degrade or shed")
+    reason: str = Field(..., description="Why the decision was made")
+    estimated_latency_ms: float = Field(..., description="Predicted latency at decision time")
+    cost: int = Field(default=1, description="Number of images in the request")
+    lane: str = Field(default="interactive", description="Priority lane of the request")
+
+
+class AdmissionStats(BaseModel):
+    """Admission control and load shedding statistics"""
+    latency_slo_ms: float = Field(..., description="Configured latency SLO in milliseconds")
+    max_concurrent_inferences: int = Field(..., description="Concurrent inference slots")
+    max_queue_depth: int = Field(..., description="Maximum images waiting for a slot")
+    degrade_enabled: bool = Field(
+        default=True,
+        description="Whether overload is met by reduced resolution (needs a dynamic-shape model)"
+    )
+    in_flight: int = Field(..., description="Admitted images not yet completed")
+    running: int = Field(..., description="Images currently holding an inference slot")
+    estimated_latency_ms: float = Field(..., description="Predicted latency for a new request")
+    average_queue_wait_ms: float = Field(..., description="Mean queue wait over the recent window")
+    p95_queue_wait_ms: float = Field(..., description="95th percentile queue wait over the recent window")
+    average_service_time_ms: float = Field(..., description="Mean full-resolution service time")
+    average_degraded_service_time_ms: float = Field(..., description="Mean reduced-resolution service time")
+    admitted: int = Field(default=0, description="Requests admitted at full resolution")
+    degraded: int = Field(default=0, description="Requests admitted at reduced resolution")
+    shed_queue_full: int = Field(default=0, description="Requests rejected with 429 (queue full)")
+    shed_slo: int = Field(default=0, description="Requests rejected with 503 (SLO would be violated)")
+    shed_draining: int = Field(default=0, description="Requests rejected with 503 while the worker drains")
+    closed_reason: Optional[str] = Field(None, description="Why admission is closed, if it is")
+    recent_decisions: List[AdmissionDecisionEntry] = Field(
+        default_factory=list,
+        description="Most recent non-admit decisions"
+    )
+    timestamp: datetime = Field(default_factory=datetime.now, description="Stats timestamp")
+
+
+class LaneStats(BaseModel):
+    """Scheduling statistics for one priority lane"""
+    lane: str = Field(..., description="Lane name (interactive or bulk)")
+    weight: int = Field(..., description="Relative share of slots under contention")
+    queue_depth: int = Field(..., description="Images currently waiting for a slot")
+    max_queue_depth: int = Field(..., description="Highest queue depth observed")
+    running: int = Field(..., description="Images currently holding a slot")
+    served: int = Field(..., description="Images processed since startup")
+    average_wait_ms: float = Field(..., description="Mean queue wait over the recent window")
+    average_latency_ms: float = Field(..., description="Mean wait plus service time over the recent window")
+    p95_latency_ms: float = Field(..., description="95th percentile wait plus service time")
+
+
+class SchedulerStats(BaseModel):
+    """Priority scheduler statistics"""
+    capacity: int = Field(..., description="Concurrent inference slots")
+    running: int = Field(..., description="Slots currently in use")
+    lanes: List[LaneStats] = Field(..., description="Per-lane statistics")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Stats timestamp")
+
+
+class QualityGateStats(BaseModel):
+    """Image quality gate statistics"""
+    enabled: bool = Field(..., description="Whether the quality gate is enabled")
+    checked: int = Field(default=0, description="Images assessed by the gate")
+    rejected: int = Field(default=0, description="Images rejected with retake_photo")
+    rejection_rate: float = Field(default=0.0, description="Fraction of assessed images rejected")
+    rejections_by_issue: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Rejection counts per failed check"
+    )
+    average_assessment_time_ms: float = Field(default=0.0, description="Mean cost of the checks")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Stats timestamp")
+
+
+class DecodeFormatStats(BaseModel):
+    """Decode statistics of one image format and decode path"""
+    format: str = Field(..., description="Format detected from the file's leading bytes, e.g. jpeg or heic")
+    path: str = Field(..., description="full (the image itself) or preview (embedded thumbnail)")
+    images: int = Field(..., description="Images decoded")
+    average_decode_ms: float = Field(..., description="Mean decode time")
+    max_decode_ms: float = Field(..., description="Slowest decode")
+    average_decoded_mb: float = Field(..., description="Mean size of the decoded BGR image in MB")
+    max_decoded_mb: float = Field(..., description="Largest decoded BGR image in MB")
+    average_full_resolution_mb: float = Field(
+        ...,
+        description="Mean size the images would have had decoded at full resolution, in MB"
+    )
+
+
+class ImageDecodeStats(BaseModel):
+    """Image decode statistics by format"""
+    heic_supported: bool = Field(..., description="Whether a HEIC decoder (pillow-heif) is installed")
+    avif_supported: bool = Field(..., description="Whether an AVIF decoder is installed")
+    preview_min_side: int = Field(..., description="Smallest embedded preview used instead of the image (0: never)")
+    formats: List[DecodeFormatStats] = Field(default_factory=list, description="Statistics per format and path")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Stats timestamp")
+
+
+class ResolutionBucket(BaseModel):
+    """Images run at one model input size"""
+    size: int = Field(..., description="Model input size (square side in pixels)")
+    images: int = Field(..., description="Images run at this size")
+    share: float = Field(..., description="Fraction of all images")
+    average_inference_ms: float = Field(..., description="Mean measured inference time (including batching waits)")
+    calibrated_inference_ms: Optional[float] = Field(
+        None,
+        description="Forward-pass time measured at startup (null when not calibrated)"
+    )
+
+
+class ResolutionStats(BaseModel):
+    """Content-adaptive input resolution statistics"""
+    enabled: bool = Field(..., description="Whether adaptive input resolution is enabled")
+    dynamic_input: bool = Field(default=False, description="Whether the model accepts the chosen sizes")
+    sizes: List[int] = Field(default_factory=list, description="Supported input sizes")
+    edge_thresholds: List[float] = Field(default_factory=list, description="Edge densities separating the sizes")
+    images: int = Field(default=0, description="Images run")
+    average_edge_density: float = Field(default=0.0, description="Mean edge density of the images")
+    distribution: List[ResolutionBucket] = Field(default_factory=list, description="Images per input size")
+    largest_size: Optional[int] = Field(None, description="Largest supported size, the savings baseline")
+    saved_ms_total: Optional[float] = Field(
+        None,
+        description="Inference time saved against running every image at the largest size (calibrated estimate)"
+    )
+    saved_ms_per_image: Optional[float] = Field(None, description="saved_ms_total per image")
+    batches: int = Field(default=0, description="Same-size inference batches run")
+    average_batch_size: float = Field(default=0.0, description="Mean images per batch")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Stats timestamp")
+
+
+class CascadeStageStats(BaseModel):
+    """Latency of one model cascade stage"""
+    stage: str = Field(..., description="screen or full")
+    model: str = Field(..., description="Model file of the stage")
+    input_size: int = Field(..., description="Model input size")
+    images: int = Field(default=0, description="Images run through the stage")
+    decided: int = Field(default=0, description="Verdicts produced by the stage")
+    average_latency_ms: float = Field(default=0.0, description="Mean stage latency over the recent window")
+    p95_latency_ms: float = Field(default=0.0, description="95th percentile stage latency")
+
+
+class CascadeStats(BaseModel):
+    """Two-stage model cascade statistics"""
+    enabled: bool = Field(..., description="Whether the cascade is active")
+    band_low: float = Field(default=0.0, description="Lower edge of the uncertainty band")
+    band_high: float = Field(default=0.0, description="Upper edge of the uncertainty band")
+    escalated: int = Field(default=0, description="Images escalated to the full model")
+    escalation_rate: float = Field(default=0.0, description="Fraction of screened images escalated")
+    batches: int = Field(default=0, description="Batches run by the full model")
+    average_batch_size: float = Field(default=0.0, description="Mean escalated images per batch")
+    average_batch_wait_ms: float = Field(
+        default=0.0,
+        description="Mean time escalated images waited for their batch to start"
+    )
+    stages: List[CascadeStageStats] = Field(default_factory=list, description="Per-stage latency")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Stats timestamp")
+
+
+class MemoryStats(BaseModel):
+    """Memory watchdog statistics"""
+    pid: int = Field(..., description="Process id")
+    state: str = Field(..., description="ok, or draining while the worker recycles")
+    rss_mb: float = Field(..., description="Resident set size in MB")
+    peak_rss_mb: float = Field(..., description="Highest sampled RSS in MB")
+    soft_limit_mb: Optional[float] = Field(None, description="RSS at which the worker recycles (null: never)")
+    growth_mb_per_hour: Optional[float] = Field(
+        None,
+        description="RSS growth over the sample window, extrapolated to an hour "
+                    "(null until the samples span a minute)"
+    )
+    samples: int = Field(default=0, description="RSS samples taken")
+    check_interval_seconds: float = Field(..., description="Seconds between RSS samples")
+    reclaims: int = Field(default=0, description="Times garbage collection and malloc_trim were tried")
+    reclaimed_mb: float = Field(default=0.0, description="RSS returned by those attempts in total")
+    recycle_reason: Optional[str] = Field(None, description="Why the worker is recycling, if it is")
+    draining_since: Optional[datetime] = Field(None, description="When draining started")
+    tracing: bool = Field(default=False, description="Whether tracemalloc is tracing allocations")
+    traced_mb: Optional[float] = Field(None, description="Python allocations traced by tracemalloc in MB")
+    traced_peak_mb: Optional[float] = Field(None, description="Peak traced allocations in MB")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Stats timestamp")
+
+
+class AllocationSite(BaseModel):
+    """Allocation site from a tracemalloc snapshot"""
+    location: str = Field(..., description="file:line (innermost frame first when tracing more frames)")
+    size_kb: float = Field(..., description="Memory allocated there and still alive, in KB")
+    count: int = Field(..., description="Live allocations")
+    size_diff_kb: Optional[float] = Field(None, description="Change since the previous dump, in KB")
+
+
+class AllocationReport(BaseModel):
+    """Largest allocation sites of the process"""
+    pid: int = Field(..., description="Process id")
+    tracing: bool = Field(..., description="Whether tracemalloc is tracing allocations")
+    tracing_since: Optional[datetime] = Field(None, description="When tracing started")
+    traced_mb: float = Field(default=0.0, description="Python allocations traced in MB")
+    rss_mb: float = Field(..., description="Resident set size in MB (includes untraced native memory)")
+    sites: List[AllocationSite] = Field(default_factory=list, description="Largest allocation sites")
+    note: Optional[str] = Field(None, description="Hint when the report is empty")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Report timestamp")
+
+
+class RollupGroup(BaseModel):
+    """Detections of one key of a dimension"""
+    key: str = Field(..., description="Dimension value, e.g. a supplier id")
+    detections: int = Field(..., description="Detections counted for the key (upper bound)")
+    error: int = Field(
+        default=0,
+        description="Maximum overcount of detections from evicted keys (0: exact)"
+    )
+    counterfeit: int = Field(..., description="Counterfeit verdicts since the key was tracked")
+    counterfeit_rate: float = Field(..., description="Counterfeit fraction of the tracked detections")
+    average_confidence: float = Field(..., description="Mean verdict confidence")
+    average_processing_time_ms: float = Field(..., description="Mean processing time")
+
+
+class RollupResponse(BaseModel):
+    """Detections grouped by one dimension over a time window"""
+    dimension: str = Field(..., description="Grouping dimension")
+    window_start: datetime = Field(..., description="Start of the oldest bucket included")
+    window_end: datetime = Field(..., description="Query time")
+    detections: int = Field(..., description="All detections in the window")
+    counterfeit: int = Field(..., description="All counterfeit verdicts in the window")
+    groups: List[RollupGroup] = Field(..., description="Groups, largest first (or by the requested order)")
+    tracked_groups: int = Field(..., description="Distinct keys held in the window's top-key tables")
+    other_detections: int = Field(
+        default=0,
+        description="Detections of keys not returned (below the limit or evicted)"
+    )
+    approximate: bool = Field(
+        default=False,
+        description="Whether keys were evicted, making counts of returned groups approximate"
+    )
+
+
+class RollupEstimate(BaseModel):
+    """Detection counts of a single key, including keys outside the top tables"""
+    dimension: str = Field(..., description="Dimension")
+    key: str = Field(..., description="Dimension value")
+    window_start: datetime = Field(..., description="Start of the oldest bucket included")
+    detections: int = Field(..., description="Detections (upper bound when approximate)")
+    counterfeit: int = Field(..., description="Counterfeit verdicts (upper bound when approximate)")
+    counterfeit_rate: Optional[float] = Field(None, description="Counterfeit fraction, if any detections")
+    approximate: bool = Field(..., description="Whether the counts come from a count-min sketch")
+
+
+class SpikeAlert(BaseModel):
+    """Significant change of counterfeit rate or confidence for one key"""
+    kind: str = Field(..., description="counterfeit_rate or confidence_drift")
+    direction: str = Field(..., description="up or down")
+    dimension: str = Field(..., description="Dimension of the key, e.g. supplier")
+    key: str = Field(..., description="Dimension value, e.g. a supplier id")
+    baseline: float = Field(..., description="Long-run counterfeit rate or mean confidence of the key")
+    recent: float = Field(..., description="Counterfeit rate or mean confidence over the recent detections")
+    cusum: float = Field(..., description="CUSUM statistic that crossed the threshold")
+    threshold: float = Field(..., description="Alert threshold of the statistic")
+    detections: int = Field(..., description="Detections of the key seen by this worker")
+    timestamp: datetime = Field(..., description="Alert time")
+
+
+class SpikeReport(BaseModel):
+    """Spike detector state and recent alerts"""
+    enabled: bool = Field(..., description="Whether spike detection is enabled")
+    dimensions: List[str] = Field(..., description="Monitored dimensions")
+    events: int = Field(..., description="Detections processed")
+    tracked_keys: Dict[str, int] = Field(..., description="Keys tracked per dimension")
+    alerts_total: int = Field(..., description="Alerts raised since startup")
+    alerts: List[SpikeAlert] = Field(..., description="Recent alerts, newest first")
+    alert_file: Optional[str] = Field(None, description="JSON-lines file alerts are appended to")
+    webhook: bool = Field(..., description="Whether alerts are posted to a webhook")
+    sink_errors: int = Field(default=0, description="Failed file writes and webhook posts")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Report timestamp")
+
+
+class ClientUsage(BaseModel):
+    """Quota usage of one client, across all workers"""
+    client: str = Field(..., description="Client id: key:<digest>, client:<id> or ip:<address>")
+    requests: int = Field(..., description="Requests admitted")
+    images: int = Field(..., description="Images charged")
+    throttled_rate: int = Field(..., description="Requests rejected with 429 (token bucket empty)")
+    throttled_concurrency: int = Field(..., description="Requests rejected with 429 (too many in flight)")
+    in_flight: int = Field(..., description="Requests in flight now")
+    tokens: float = Field(..., description="Tokens in the bucket now (negative after a large batch)")
+    rate: float = Field(..., description="Tokens (images) added per second")
+    burst: float = Field(..., description="Bucket size")
+    max_concurrent: int = Field(..., description="Requests allowed in flight")
+    last_seen: datetime = Field(..., description="Last request")
+
+
+class ClientUsageResponse(BaseModel):
+    """Per-client quota usage and throttling"""
+    enabled: bool = Field(..., description="Whether client quotas are enforced")
+    clients_tracked: int = Field(..., description="Clients in the quota store")
+    requests: int = Field(..., description="Requests admitted, all clients")
+    throttled_rate: int = Field(..., description="Requests throttled by the token bucket, all clients")
+    throttled_concurrency: int = Field(..., description="Requests throttled by the concurrency cap, all clients")
+    clients: List[ClientUsage] = Field(..., description="Clients, busiest first")
+    default_rate: float = Field(..., description="Default tokens per second")
+    default_burst: float = Field(..., description="Default bucket size")
+    default_max_concurrent: int = Field(..., description="Default requests in flight")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Report timestamp")
@@ -44,6 +44,21 @@ class ImageMetadata(BaseModel):
     dtype: str = Field(..., description="Data type of image array")
 
 
+class ImageQuality(BaseModel):
+    """Result of the pre-inference image quality gate"""
+    passed: bool = Field(..., description="Whether the image is good enough for inference")
+    issues: List[str] = Field(
+        default_factory=list,
+        description="Failed checks: too_small, blurry, underexposed, overexposed, uniform_frame"
+    )
+    blur_score: float = Field(..., description="Laplacian variance of the analysis view (higher is sharper)")
+    brightness: float = Field(..., description="Mean gray level (0-255)")
+    underexposed_fraction: float = Field(..., description="Fraction of near-black pixels")
+    overexposed_fraction: float = Field(..., description="Fraction of near-white pixels")
+    contrast: float = Field(..., description="Gray-level standard deviation")
+    assessment_time_ms: float = Field(..., description="Time spent on the quality checks")
+
+
 class DetectionResponse(BaseModel):
     """Complete detection response"""
     is_counterfeit: bool = Field(..., description="Whether counterfeit was detected")
@@ -56,6 +71,21 @@ class DetectionResponse(BaseModel):
     processing_time_seconds: float = Field(..., ge=0, description="Processing time in seconds")
     timestamp: datetime = Field(default_factory=datetime.now, description="Response timestamp")
     model_version: str = Field(default="yolov10n", description="Model version used")
+    degraded: bool = Field(
+        default=False,
+        description="Whether reduced input resolution was used because the service was under load"
+    )
+    status: str = Field(
+        default="completed",
+        description="completed, or retake_photo when the image failed the quality gate "
+                    "and the model was not run (is_counterfeit is then not a verdict)"
+    )
+    quality: Optional[ImageQuality] = Field(None, description="Image quality assessment")
+    stage: Optional[str] = Field(
+        None,
+        description="Model cascade stage that produced the verdict: screen or full "
+                    "(None when the cascade is disabled)"
+    )
     
     class Config:
         json_schema_extra = {
@@ -73,7 +103,11 @@ class DetectionResponse(BaseModel):
                 },
                 "processing_time_seconds": 0.45,
                 "timestamp": "2025-11-29T00:00:00",
-                "model_version": "yolov10n"
+                "model_version": "yolov10n",
+                "degraded": False,
+                "status": "completed",
+                "quality": None,
+                "stage": None
             }
         }
 
@@ -90,3 +124,51 @@ class BatchDetectionResponse(BaseModel):
     total_counterfeit: int = Field(..., description="Number of counterfeit items detected")
     average_confidence: float = Field(..., description="Average confidence across all detections")
     total_processing_time_seconds: float = Field(..., description="Total processing time")
+
+
+class Keyframe(BaseModel):
+    """A frame of a clip or burst selected for inference, with its result"""
+    frame_index: int = Field(..., description="Position of the frame in the clip or burst")
+    sharpness: float = Field(..., description="Laplacian variance of the selection view (higher is sharper)")
+    difference: float = Field(
+        ...,
+        description="Mean gray-level difference to the most similar other keyframe"
+    )
+    result: DetectionResponse = Field(..., description="Detection result for this frame")
+
+
+class MultiFrameDetectionResponse(BaseModel):
+    """Single verdict fused from the keyframes of a clip or photo burst"""
+    is_counterfeit: bool = Field(..., description="Fused counterfeit verdict")
+    confidence: float = Field(..., ge=0.0, le=1.0, description="Confidence in the fused verdict")
+    status: str = Field(
+        default="completed",
+        description="completed, or retake_photo when no keyframe passed the quality gate"
+    )
+    source: str = Field(..., description="video or burst")
+    frames_read: int = Field(..., description="Frames read from the clip, or images in the burst")
+    frames_examined: int = Field(..., description="Frames scored for keyframe selection")
+    counterfeit_votes: int = Field(..., description="Keyframes with a counterfeit verdict")
+    keyframes: List[Keyframe] = Field(default_factory=list, description="Selected keyframes in clip order")
+    selection_time_seconds: float = Field(..., ge=0, description="Decoding and keyframe selection time")
+    processing_time_seconds: float = Field(..., ge=0, description="Total processing time in seconds")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Response timestamp")
+    model_version: str = Field(default="yolov10n", description="Model version used")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "is_counterfeit": False,
+                "confidence": 0.97,
+                "status": "completed",
+                "source": "video",
+                "frames_read": 142,
+                "frames_examined": 71,
+                "counterfeit_votes": 0,
+                "keyframes": [],
+                "selection_time_seconds": 0.31,
+                "processing_time_seconds": 0.58,
+                "timestamp": "2025-11-29T00:00:00",
+                "model_version": "yolov10n"
+            }
+        }
@@ -0,0 +1,84 @@
+"""
+Pydantic models for reference-catalog endpoints
+"""
+
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+
+class ReferenceRegistration(BaseModel):
+    """Result of registering a genuine reference image"""
+    product_id: str = Field(..., description="Product the reference belongs to")
+    reference_count: int = Field(..., description="References registered for the product")
+    index_size: int = Field(..., description="Total vectors in the embedding index")
+    keypoints: int = Field(0, description="Keypoints stored for geometric verification (0 if too few)")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Registration timestamp")
+
+
+class CatalogNeighbour(BaseModel):
+    """Nearest catalog entry for an upload"""
+    product_id: str = Field(..., description="Product id of the neighbour")
+    similarity: float = Field(..., description="Cosine similarity (1.0 is identical)")
+
+
+class SimilarityResponse(BaseModel):
+    """Similarity of an upload to a product's genuine references"""
+    product_id: str = Field(..., description="Product the upload claims to be")
+    reference_count: int = Field(..., description="References compared against")
+    best_similarity: float = Field(..., description="Highest similarity to a reference")
+    mean_similarity: float = Field(..., description="Mean similarity across references")
+    nearest_products: List[CatalogNeighbour] = Field(
+        default_factory=list,
+        description="Nearest products across the whole catalog (approximate search)"
+    )
+    search_time_ms: float = Field(..., description="Descriptor plus search time in milliseconds")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Response timestamp")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "product_id": "BAG-2025-0001",
+                "reference_count": 4,
+                "best_similarity": 0.94,
+                "mean_similarity": 0.89,
+                "nearest_products": [
+                    {"product_id": "BAG-2025-0001", "similarity": 0.94},
+                    {"product_id": "BAG-2025-0107", "similarity": 0.81}
+                ],
+                "search_time_ms": 3.2,
+                "timestamp": "2025-11-29T00:00:00"
+            }
+        }
+
+
+class VerificationResponse(BaseModel):
+    """Keypoint verification of an upload against a product's references"""
+    product_id: str = Field(..., description="Product the upload claims to be")
+    verified: bool = Field(..., description="Whether enough geometrically consistent matches were found")
+    authenticity_score: float = Field(..., ge=0.0, le=1.0, description="Inlier-based score (1.0 at the inlier target)")
+    inliers: int = Field(..., description="RANSAC homography inliers against the best reference")
+    good_matches: int = Field(..., description="Ratio-test matches against the best reference")
+    query_keypoints: int = Field(..., description="Keypoints extracted from the upload")
+    best_reference: Optional[str] = Field(None, description="Reference with the most inliers")
+    reference_count: int = Field(..., description="References compared against")
+    detector: str = Field(..., description="Feature detector (orb or akaze)")
+    verification_time_ms: float = Field(..., description="Extraction plus matching time in milliseconds")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Response timestamp")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "product_id": "BAG-2025-0001",
+                "verified": True,
+                "authenticity_score": 0.87,
+                "inliers": 52,
+                "good_matches": 71,
+                "query_keypoints": 1000,
+                "best_reference": "5f0c1d2e9a8b4c7d8e6f0a1b2c3d4e5f",
+                "reference_count": 3,
+                "detector": "orb",
+                "verification_time_ms": 18.4,
+                "timestamp": "2025-11-29T00:00:00"
+            }
+        }
@@ -4,22 +4,43 @@ Analytics API Routes
 Provides monitoring, health checks, and analytics endpoints.
 """
 
-from fastapi import APIRouter, Query
+import asyncio
+
+from fastapi import APIRouter, Path, Query, Response
 from datetime import datetime
 import logging
 import numpy as np
 import cv2
 
 from ai.models.analytics import (
+    CpuLayout,
     HealthResponse,
     ServiceInfoResponse,
     AnalyticsSummary,
     RecentDetectionsResponse,
-    AnalyticsRequest
+    AnalyticsRequest,
+    AdmissionStats,
+    SchedulerStats,
+    QualityGateStats,
+    ImageDecodeStats,
+    CascadeStats,
+    ResolutionStats,
+    MemoryStats,
+    AllocationReport,
+    RollupResponse,
+    RollupEstimate,
+    SpikeReport,
+    ClientUsageResponse
 )
 from ai.services.analytics_service import analytics_service
+from ai.services.admission_service import admission_controller
+from ai.services.scheduler_service import priority_scheduler
 from ai.services.ml_service import ml_service
-from ai.utils.config import settings
+from ai.services.memory_service import STATE_DRAINING, memory_watchdog
+from ai.services.quota_service import quota_store
+from ai.services.rollup_service import Dimension, RollupOrder
+from ai.utils.config import settings, cpu_resources
+from ai.utils.image_formats import decode_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -34,20 +55,25 @@ router = APIRouter(
     summary="Health check",
     description="Check the health status of the AI service and its dependencies"
 )
-async def health_check() -> HealthResponse:
+async def health_check(response: Response) -> HealthResponse:
     """
     Perform health check on the service
     
     Returns:
         HealthResponse with service status and dependency information
+        (status draining and HTTP 503 while the worker recycles, so load
+        balancers stop routing to it)
     """
     try:
+        if memory_watchdog.state == STATE_DRAINING:
+            response.status_code = 503
+
         # Verify dependencies are working
         _ = np.array([1, 2, 3])
         _ = np.zeros((10, 10, 3), dtype=np.uint8)
         
         return HealthResponse(
-            status="online",
+            status=STATE_DRAINING if memory_watchdog.state == STATE_DRAINING else "online",
             model=settings.model_name,
             model_loaded=ml_service.is_model_loaded,
             timestamp=datetime.now(),
@@ -57,10 +83,12 @@ async def health_check() -> HealthResponse:
                 "fastapi": "0.115.6",
                 "pydantic": "2.10.5"
             },
-            uptime_seconds=analytics_service.get_uptime()
+            uptime_seconds=analytics_service.get_uptime(),
+            cpu=CpuLayout(**cpu_resources.layout(ml_service.intra_op_threads)),
+            memory=memory_watchdog.status()
         )
     except Exception as e:
-        logger.error(f"Health check failed: {e}", exc_info=True)
+        logger.error("Health check failed: %s", e, exc_info=True)
         return HealthResponse(
             status="degraded",
             model=settings.model_name,
@@ -92,9 +120,26 @@ async def root() -> ServiceInfoResponse:
         endpoints=[
             "/health",
             "/api/v1/detect",
+            "/api/v1/detect/raw",
             "/api/v1/detect/batch",
+            "/api/v1/detect/burst",
+            "/api/v1/references/{product_id}",
+            "/api/v1/references/{product_id}/similarity",
+            "/api/v1/references/{product_id}/verify",
             "/api/v1/analytics/summary",
             "/api/v1/analytics/recent",
+            "/api/v1/analytics/admission",
+            "/api/v1/analytics/lanes",
+            "/api/v1/analytics/quality",
+            "/api/v1/analytics/decode",
+            "/api/v1/analytics/cascade",
+            "/api/v1/analytics/resolution",
+            "/api/v1/analytics/rollups/{dimension}",
+            "/api/v1/analytics/rollups/{dimension}/{key}",
+            "/api/v1/analytics/spikes",
+            "/api/v1/analytics/clients",
+            "/api/v1/analytics/memory",
+            "/api/v1/analytics/memory/allocations",
             "/docs"
         ]
     )
@@ -146,3 +191,247 @@ async def get_recent_detections(
         RecentDetectionsResponse with recent detection records
     """
     return analytics_service.get_recent_detections(limit=limit, offset=offset)
+
+
+@router.get(
+    "/analytics/admission",
+    response_model=AdmissionStats,
+    summary="Admission control statistics",
+    description="Get current load, latency estimates and load-shedding decisions"
+)
+async def get_admission_stats() -> AdmissionStats:
+    """
+    Get admission control statistics
+    
+    Returns:
+        AdmissionStats with in-flight work, queue-wait latency and shed counts
+    """
+    return admission_controller.get_stats()
+
+
+@router.get(
+    "/analytics/lanes",
+    response_model=SchedulerStats,
+    summary="Priority lane statistics",
+    description="Get per-lane queue depth and latency for interactive and bulk traffic"
+)
+async def get_lane_stats() -> SchedulerStats:
+    """
+    Get priority scheduler statistics
+    
+    Returns:
+        SchedulerStats with queue depth, wait and latency per lane
+    """
+    return priority_scheduler.get_stats()
+
+
+@router.get(
+    "/analytics/quality",
+    response_model=QualityGateStats,
+    summary="Image quality gate statistics",
+    description="Get how often uploads are rejected with retake_photo, by failed check"
+)
+async def get_quality_stats() -> QualityGateStats:
+    """
+    Get image quality gate statistics
+    
+    Returns:
+        QualityGateStats with rejection counts and rates
+    """
+    return analytics_service.get_quality_stats()
+
+
+@router.get(
+    "/analytics/decode",
+    response_model=ImageDecodeStats,
+    summary="Image decode statistics",
+    description="Get decode time and decoded-image memory by format, for full images and embedded previews"
+)
+async def get_decode_stats() -> ImageDecodeStats:
+    """
+    Get image decode statistics
+    
+    Returns:
+        ImageDecodeStats per format and decode path
+    """
+    return decode_tracker.get_stats()
+
+
+@router.get(
+    "/analytics/cascade",
+    response_model=CascadeStats,
+    summary="Model cascade statistics",
+    description="Get the escalation rate, escalation batching and per-stage latency of the model cascade"
+)
+async def get_cascade_stats() -> CascadeStats:
+    """
+    Get model cascade statistics
+    
+    Returns:
+        CascadeStats (enabled=False when the cascade is not active)
+    """
+    if ml_service.cascade is None:
+        return CascadeStats(enabled=False)
+    return ml_service.cascade.get_stats()
+
+
+@router.get(
+    "/analytics/resolution",
+    response_model=ResolutionStats,
+    summary="Adaptive input resolution statistics",
+    description="Get the distribution of model input sizes and the inference time saved against the largest size"
+)
+async def get_resolution_stats() -> ResolutionStats:
+    """
+    Get adaptive input resolution statistics
+    
+    Returns:
+        ResolutionStats (enabled=False when adaptive resolution is not active)
+    """
+    return ml_service.get_resolution_stats()
+
+
+@router.get(
+    "/analytics/memory",
+    response_model=MemoryStats,
+    summary="Memory watchdog statistics",
+    description="Get RSS, its growth rate, the soft limit and the recycling state of this worker"
+)
+async def get_memory_stats() -> MemoryStats:
+    """
+    Get memory watchdog statistics
+    
+    Returns:
+        MemoryStats of the worker that served the request
+    """
+    return memory_watchdog.get_stats()
+
+
+@router.get(
+    "/analytics/memory/allocations",
+    response_model=AllocationReport,
+    summary="Largest allocation sites (debug)",
+    description="Dump the largest live Python allocation sites from tracemalloc. "
+                "The first call starts tracing; stop=true stops it again."
+)
+async def get_memory_allocations(
+    limit: int = Query(default=25, ge=1, le=500, description="Number of sites"),
+    stop: bool = Query(default=False, description="Stop tracing after the dump")
+) -> AllocationReport:
+    """
+    Dump the largest allocation sites
+    
+    Args:
+        limit: Number of sites to return
+        stop: Stop tracing afterwards (tracing slows allocation down)
+        
+    Returns:
+        AllocationReport of the worker that served the request
+    """
+    # Snapshots of a large heap take a while; keep the event loop free
+    report = await asyncio.to_thread(memory_watchdog.top_allocations, limit)
+    if stop:
+        memory_watchdog.stop_tracing()
+        report.tracing = False
+    return report
+
+
+@router.get(
+    "/analytics/rollups/{dimension}",
+    response_model=RollupResponse,
+    summary="Detections grouped by supplier, product, client, model version or region",
+    description="Group the detections of the last hours by one dimension, e.g. the counterfeit "
+                "rate per supplier over the last day. Served from pre-aggregated rollups; "
+                "tag detections with the X-Supplier-Id, X-Product-Id, X-Client-Id and X-Region headers."
+)
+async def get_rollup(
+    dimension: Dimension = Path(..., description="Dimension to group by"),
+    hours: float = Query(default=24, gt=0, description="Window length in hours, ending now"),
+    limit: int = Query(default=20, ge=1, le=1000, description="Maximum groups returned"),
+    order: RollupOrder = Query(default=RollupOrder.DETECTIONS, description="Sort order"),
+    min_detections: int = Query(default=1, ge=1, description="Leave out smaller groups")
+) -> RollupResponse:
+    """
+    Group detections by a dimension
+    
+    Args:
+        dimension: supplier, product, client, model_version or region
+        hours: Window length
+        limit: Maximum groups
+        order: detections, counterfeit or counterfeit_rate
+        min_detections: Minimum detections per group
+        
+    Returns:
+        RollupResponse with the top groups and the window totals
+    """
+    return analytics_service.rollups.group_by(dimension, hours, limit, order, min_detections)
+
+
+@router.get(
+    "/analytics/rollups/{dimension}/{key}",
+    response_model=RollupEstimate,
+    summary="Detections of one supplier, product, client, model version or region",
+    description="Count the detections of one key over the last hours, including keys too "
+                "small to appear in the group-by results (estimated from a count-min sketch)"
+)
+async def get_rollup_key(
+    dimension: Dimension = Path(..., description="Dimension of the key"),
+    key: str = Path(..., description="Dimension value, e.g. a supplier id"),
+    hours: float = Query(default=24, gt=0, description="Window length in hours, ending now")
+) -> RollupEstimate:
+    """
+    Estimate the detections of one key
+    
+    Args:
+        dimension: supplier, product, client, model_version or region
+        key: Dimension value
+        hours: Window length
+        
+    Returns:
+        RollupEstimate for the key
+    """
+    return analytics_service.rollups.estimate(dimension, key, hours)
+
+
+@router.get(
+    "/analytics/spikes",
+    response_model=SpikeReport,
+    summary="Counterfeit-spike and confidence-drift alerts",
+    description="Recent alerts of suppliers, products or regions whose counterfeit rate jumped "
+                "or whose verdict confidence drifted, detected with CUSUM over the detection stream"
+)
+async def get_spikes(
+    limit: int = Query(default=20, ge=1, le=100, description="Maximum alerts returned")
+) -> SpikeReport:
+    """
+    Get spike detection alerts
+    
+    Args:
+        limit: Maximum alerts, newest first
+        
+    Returns:
+        SpikeReport with recent alerts and tracked keys per dimension
+    """
+    return analytics_service.spikes.get_report(limit)
+
+
+@router.get(
+    "/analytics/clients",
+    response_model=ClientUsageResponse,
+    summary="Per-client quota usage and throttling",
+    description="Requests, images and 429 rejections per client (API key, X-Client-Id or IP "
+                "address), with each client's token bucket and in-flight requests across all workers"
+)
+async def get_client_usage(
+    limit: int = Query(default=50, ge=1, le=1000, description="Maximum clients returned")
+) -> ClientUsageResponse:
+    """
+    Get per-client quota usage
+    
+    Args:
+        limit: Maximum clients, busiest first
+        
+    Returns:
+        ClientUsageResponse with usage and throttling counters
+    """
+    return await asyncio.to_thread(quota_store.get_usage, limit)
@@ -4,23 +4,106 @@ Prediction/Detection API Routes
 Handles image upload and counterfeit detection endpoints.
 """
 
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Request, Header
+from fastapi.responses import Response
+from typing import List, Optional
+from datetime import datetime
+import asyncio
 import logging
+import os
+import sqlite3
+import time
 
-from ai.models.predictions import DetectionResponse, BatchDetectionResponse
+from ai.models.predictions import (
+    DetectionResponse,
+    BatchDetectionResponse,
+    Keyframe,
+    MultiFrameDetectionResponse
+)
 from ai.services.ml_service import ml_service
 from ai.services.analytics_service import analytics_service
-from ai.utils.helpers import validate_and_decode_image
+from ai.services.admission_service import admission_controller
+from ai.services.quota_service import quota_store
+from ai.services.rollup_service import DetectionTags, clean_tag
+from ai.services.scheduler_service import Lane, resolve_lane
+from ai.utils.config import settings
+from ai.utils.helpers import (
+    SUPPORTED_IMAGE_TYPES,
+    SUPPORTED_VIDEO_TYPES,
+    decode_image_bytes,
+    read_raw_image,
+    save_video_upload,
+    validate_and_decode_image
+)
+from ai.utils.keyframes import KeyframeSelector, select_video_keyframes
+from ai.utils.logging_config import SAMPLED
+from ai.utils.shared_frames import release_frame
+from ai.utils.serialization import (
+    BINARY_MEDIA_TYPE,
+    COMPACT_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    render_binary,
+    render_detection,
+    render_batch,
+    render_multi_frame
+)
 
 logger = logging.getLogger(__name__)
 
+
+def detection_tags(
+    x_supplier_id: Optional[str] = Header(None, description="Supplier id, for analytics rollups"),
+    x_product_id: Optional[str] = Header(None, description="Product id, for analytics rollups"),
+    x_client_id: Optional[str] = Header(None, description="Calling client, for analytics rollups"),
+    x_region: Optional[str] = Header(None, description="Region the item was scanned in, for analytics rollups")
+) -> DetectionTags:
+    """Dimension tags of a detection request, from its headers"""
+    return DetectionTags(
+        supplier=clean_tag(x_supplier_id),
+        product=clean_tag(x_product_id),
+        client=clean_tag(x_client_id),
+        region=clean_tag(x_region)
+    )
+
+
+async def _charge_quota(request: Request, images: int):
+    """Charge a client's quota for the images of a multi-image request"""
+    # The quota middleware charged one image when the request arrived
+    quota_client = getattr(request.state, "quota_client", None)
+    if quota_client is None or images <= 1:
+        return
+    try:
+        await asyncio.to_thread(quota_store.charge, quota_client, images - 1)
+    except sqlite3.Error as e:
+        # Like the check itself, a busy or broken store never fails the request
+        logger.error("Failed to charge quota of %s: %s", quota_client, e)
+
+
+def _record_analytics(result: DetectionResponse, tags: DetectionTags):
+    """Record quality gate and detection analytics for one result"""
+    if result.quality is not None:
+        analytics_service.record_quality(result.quality)
+    
+    # Retake results carry no verdict, so keep them out of detection stats
+    if result.status == "completed":
+        analytics_service.record_detection(
+            filename=result.image_metadata.filename,
+            is_counterfeit=result.is_counterfeit,
+            confidence=result.confidence,
+            processing_time=result.processing_time_seconds,
+            tags=tags._replace(model_version=result.model_version)
+        )
+
+
 router = APIRouter(
     prefix="/detect",
     tags=["Detection"],
     responses={
+        200: {"content": {COMPACT_MEDIA_TYPE: {}}},
         400: {"description": "Invalid input"},
-        500: {"description": "Internal server error"}
+        429: {"description": "Queue full, retry after the Retry-After delay"},
+        500: {"description": "Internal server error"},
+        503: {"description": "Latency SLO would be violated, retry after the Retry-After delay"}
     }
 )
 
@@ -40,44 +123,155 @@ router = APIRouter(
     
     Supported image formats: JPEG, PNG, WebP, BMP
     Maximum file size: 10MB
+    
+    Blurry, badly exposed, tiny or blank photos are not sent to the model;
+    the response then has `status: "retake_photo"` and lists the failed
+    checks under `quality.issues`.
+    
+    Send `Accept: application/vnd.bucchain.compact+json` to receive bounding
+    boxes as `[x1, y1, x2, y2]` arrays instead of objects.
+    
+    Requests are scheduled in the interactive lane unless `X-Priority: bulk`
+    is sent.
     """
 )
 async def detect_counterfeit(
-    file: UploadFile = File(..., description="Image file to analyze")
-) -> DetectionResponse:
+    request: Request,
+    file: UploadFile = File(..., description="Image file to analyze"),
+    x_priority: Optional[str] = Header(
+        None,
+        description="Priority lane: interactive (default) or bulk"
+    ),
+    tags: DetectionTags = Depends(detection_tags)
+) -> Response:
     """
     Detect counterfeit products in an uploaded image
     
     Args:
+        request: Incoming request (used for response format negotiation)
         file: Uploaded image file
+        x_priority: Optional priority lane override
+        tags: Supplier, product, client and region from the X-Supplier-Id,
+            X-Product-Id, X-Client-Id and X-Region headers
         
     Returns:
-        DetectionResponse with analysis results
+        Encoded DetectionResponse with analysis results
         
     Raises:
         HTTPException: If validation or processing fails
     """
     try:
-        # Validate and decode image
-        img = await validate_and_decode_image(file)
-        
-        # Perform detection
-        result = await ml_service.detect(img, file.filename or "unknown.jpg")
+        # Shed or degrade before doing any work if the SLO is at risk
+        lane = resolve_lane(x_priority, Lane.INTERACTIVE)
+        async with admission_controller.admit(lane=lane) as ticket:
+            async with ticket.slot():
+                # Validate and decode image
+                img = await validate_and_decode_image(file, frames=ml_service.frames)
+                
+                # Perform detection
+                try:
+                    result = await ml_service.detect(
+                        img,
+                        file.filename or "unknown.jpg",
+                        input_size=ticket.input_size
+                    )
+                finally:
+                    release_frame(img)
         
         # Record analytics
-        analytics_service.record_detection(
-            filename=result.image_metadata.filename,
-            is_counterfeit=result.is_counterfeit,
-            confidence=result.confidence,
-            processing_time=result.processing_time_seconds
+        _record_analytics(result, tags)
+        
+        return render_detection(result, request)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error processing detection request: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
         )
+
+
+@router.post(
+    "/raw",
+    summary="Detect counterfeit products (binary protocol)",
+    description="""
+    Service-to-service variant of `/detect` without multipart or JSON.
+    
+    Send the encoded image as the request body with its `Content-Type`
+    (image/jpeg, image/png, image/webp or image/bmp), and optionally
+    `X-Filename` and `X-Priority` headers. The image goes through the same
+    pipeline, admission control and analytics as `/detect`.
+    
+    The response is `application/vnd.bucchain.detection`, a fixed
+    little-endian layout: a 28-byte header (magic `BUCD`, version, status,
+    flags, confidence, processing time, image size, quality issue bits, box
+    count N), then N x 5 float32 (x1, y1, x2, y2, confidence), then the N
+    class names as newline-separated UTF-8. Send
+    `Accept: application/msgpack` to get the same fields as a msgpack map
+    instead (boxes stay packed float32).
+    """,
+    responses={
+        200: {"content": {BINARY_MEDIA_TYPE: {}, MSGPACK_MEDIA_TYPE: {}}},
+        413: {"description": "Image too large"},
+        415: {"description": "Unsupported content type"}
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                media_type: {"schema": {"type": "string", "format": "binary"}}
+                for media_type in sorted(SUPPORTED_IMAGE_TYPES)
+            }
+        }
+    }
+)
+async def detect_counterfeit_raw(
+    request: Request,
+    x_filename: Optional[str] = Header(None, description="Original filename"),
+    x_priority: Optional[str] = Header(
+        None,
+        description="Priority lane: interactive (default) or bulk"
+    ),
+    tags: DetectionTags = Depends(detection_tags)
+) -> Response:
+    """
+    Detect counterfeit products in an image sent as the raw request body
+    
+    Args:
+        request: Incoming request (body, Content-Type and Accept)
+        x_filename: Optional original filename
+        x_priority: Optional priority lane override
+        tags: Supplier, product, client and region from the X-Supplier-Id,
+            X-Product-Id, X-Client-Id and X-Region headers
         
-        return result
+    Returns:
+        Binary or msgpack encoded detection result
+        
+    Raises:
+        HTTPException: If validation or processing fails
+    """
+    try:
+        lane = resolve_lane(x_priority, Lane.INTERACTIVE)
+        async with admission_controller.admit(lane=lane) as ticket:
+            contents = await read_raw_image(request)
+            async with ticket.slot():
+                filename = x_filename or "unknown.jpg"
+                img = decode_image_bytes(contents, filename, frames=ml_service.frames)
+                try:
+                    result = await ml_service.detect(img, filename, input_size=ticket.input_size)
+                finally:
+                    release_frame(img)
+        
+        _record_analytics(result, tags)
+        
+        return render_binary(result, request)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error processing detection request: {e}", exc_info=True)
+        logger.error("Error processing raw detection request: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -93,19 +287,36 @@ async def detect_counterfeit(
     
     Maximum 50 images per batch request.
     Each image is processed individually and results are aggregated.
+    
+    Send `Accept: application/vnd.bucchain.compact+json` to receive bounding
+    boxes as `[x1, y1, x2, y2]` arrays instead of objects.
+    
+    Batches are scheduled in the bulk lane unless `X-Priority: interactive`
+    is sent. Each image takes its own inference slot, so interactive requests
+    are served between images of a running batch.
     """
 )
 async def batch_detect_counterfeit(
-    files: List[UploadFile] = File(..., description="Multiple image files to analyze")
-) -> BatchDetectionResponse:
+    request: Request,
+    files: List[UploadFile] = File(..., description="Multiple image files to analyze"),
+    x_priority: Optional[str] = Header(
+        None,
+        description="Priority lane: bulk (default) or interactive"
+    ),
+    tags: DetectionTags = Depends(detection_tags)
+) -> Response:
     """
     Perform batch detection on multiple images
     
     Args:
+        request: Incoming request (used for response format negotiation)
         files: List of uploaded image files (max 50)
+        x_priority: Optional priority lane override
+        tags: Supplier, product, client and region from the X-Supplier-Id,
+            X-Product-Id, X-Client-Id and X-Region headers
         
     Returns:
-        BatchDetectionResponse with aggregated results
+        Encoded BatchDetectionResponse with aggregated results
         
     Raises:
         HTTPException: If validation or processing fails
@@ -128,31 +339,39 @@ async def batch_detect_counterfeit(
         results = []
         total_processing_time = 0.0
         
-        for file in files:
-            try:
-                img = await validate_and_decode_image(file)
-                result = await ml_service.detect(img, file.filename or "unknown.jpg")
-                results.append(result)
-                total_processing_time += result.processing_time_seconds
-                
-                # Record analytics
-                analytics_service.record_detection(
-                    filename=result.image_metadata.filename,
-                    is_counterfeit=result.is_counterfeit,
-                    confidence=result.confidence,
-                    processing_time=result.processing_time_seconds
-                )
-                
-            except Exception as e:
-                logger.error(f"Error processing file {file.filename}: {e}")
-                # Continue processing other files
-                continue
+        lane = resolve_lane(x_priority, Lane.BULK)
+        async with admission_controller.admit(cost=len(files), lane=lane) as ticket:
+            # Only admitted batches use up the client's quota
+            await _charge_quota(request, len(files))
+            for file in files:
+                try:
+                    async with ticket.slot():
+                        img = await validate_and_decode_image(file, frames=ml_service.frames)
+                        try:
+                            result = await ml_service.detect(
+                                img,
+                                file.filename or "unknown.jpg",
+                                input_size=ticket.input_size
+                            )
+                        finally:
+                            release_frame(img)
+                    results.append(result)
+                    total_processing_time += result.processing_time_seconds
+                    
+                    # Record analytics
+                    _record_analytics(result, tags)
+                    
+                except Exception as e:
+                    logger.error("Error processing file %s: %s", file.filename, e)
+                    # Continue processing other files
+                    continue
         
-        # Calculate aggregates
-        total_counterfeit = sum(1 for r in results if r.is_counterfeit)
-        avg_confidence = sum(r.confidence for r in results) / len(results) if results else 0.0
+        # Calculate aggregates (retake_photo results carry no verdict)
+        completed = [r for r in results if r.status == "completed"]
+        total_counterfeit = sum(1 for r in completed if r.is_counterfeit)
+        avg_confidence = sum(r.confidence for r in completed) / len(completed) if completed else 0.0
         
-        return BatchDetectionResponse(
+        batch_response = BatchDetectionResponse.model_construct(
             results=results,
             total_processed=len(results),
             total_counterfeit=total_counterfeit,
@@ -160,10 +379,177 @@ async def batch_detect_counterfeit(
             total_processing_time_seconds=total_processing_time
         )
         
+        return render_batch(batch_response, request)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error processing batch detection request: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+
+@router.post(
+    "/burst",
+    response_model=MultiFrameDetectionResponse,
+    summary="Detect counterfeit products in a short clip or photo burst",
+    description="""
+    Upload one short video, or several photos of the same item, and get a
+    single verdict.
+    
+    Frames are decoded one at a time and scored on small grayscale
+    thumbnails; only the sharpest frame of each visually distinct view is
+    kept (at most BURST_MAX_KEYFRAMES), so memory use does not depend on the
+    clip length. The keyframes are run through the detector together, in
+    shared forward passes, and their results are fused into one verdict;
+    keyframes rejected by the quality gate do not vote.
+    
+    Supported video formats: MP4, MOV, WebM, AVI, MKV (max BURST_MAX_VIDEO_MB).
+    Bursts: up to BURST_MAX_IMAGES images in the formats accepted by /detect.
+    
+    Send `Accept: application/vnd.bucchain.compact+json` to receive bounding
+    boxes as `[x1, y1, x2, y2]` arrays instead of objects.
+    
+    Requests are scheduled in the interactive lane unless `X-Priority: bulk`
+    is sent.
+    """
+)
+async def burst_detect_counterfeit(
+    request: Request,
+    files: List[UploadFile] = File(..., description="One video file, or several image files"),
+    x_priority: Optional[str] = Header(
+        None,
+        description="Priority lane: interactive (default) or bulk"
+    ),
+    tags: DetectionTags = Depends(detection_tags)
+) -> Response:
+    """
+    Detect counterfeit products in a clip or burst with one fused verdict
+    
+    Args:
+        request: Incoming request (used for response format negotiation)
+        files: One video file, or up to BURST_MAX_IMAGES image files
+        x_priority: Optional priority lane override
+        tags: Supplier, product, client and region from the X-Supplier-Id,
+            X-Product-Id, X-Client-Id and X-Region headers
+        
+    Returns:
+        Encoded MultiFrameDetectionResponse
+        
+    Raises:
+        HTTPException: If validation or processing fails
+    """
+    try:
+        if len(files) == 0:
+            raise HTTPException(
+                status_code=400,
+                detail="No files provided"
+            )
+        
+        is_video = len(files) == 1 and files[0].content_type in SUPPORTED_VIDEO_TYPES
+        if not is_video and len(files) > settings.burst_max_images:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Maximum {settings.burst_max_images} images per burst, or one video"
+            )
+        
+        start_time = time.time()
+        name = files[0].filename or ("clip.mp4" if is_video else "burst.jpg")
+        selector = KeyframeSelector(
+            settings.burst_max_keyframes,
+            settings.burst_min_difference,
+            settings.burst_keyframe_max_side
+        )
+        
+        # Reserve capacity for the largest possible number of keyframes;
+        # the unused part is returned when the ticket closes
+        lane = resolve_lane(x_priority, Lane.INTERACTIVE)
+        async with admission_controller.admit(cost=settings.burst_max_keyframes, lane=lane) as ticket:
+            if is_video:
+                path = await save_video_upload(files[0], settings.burst_max_video_mb * 1024 * 1024)
+                try:
+                    frames_read = await asyncio.to_thread(
+                        select_video_keyframes,
+                        path,
+                        selector,
+                        settings.burst_max_frames,
+                        settings.burst_frame_stride
+                    )
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid video data: {str(e)}")
+                finally:
+                    os.unlink(path)
+            else:
+                for file in files:
+                    # Decoded images are dropped as soon as they are scored
+                    img = await validate_and_decode_image(file)
+                    selector.offer(img)
+                frames_read = len(files)
+            
+            selected = selector.result()
+            selection_time = time.time() - start_time
+            # The client's quota pays for the keyframes actually run
+            await _charge_quota(request, len(selected))
+            
+            # The keyframes go through the model together and share one slot
+            async with ticket.slot(len(selected)):
+                results = await ml_service.detect_many(
+                    [(k.image, f"{name}#{k.index}") for k in selected],
+                    input_size=ticket.input_size
+                )
+            for result in results:
+                if result.quality is not None:
+                    analytics_service.record_quality(result.quality)
+        
+        is_counterfeit, confidence, votes = ml_service.fuse_results(results)
+        completed = any(r.status == "completed" for r in results)
+        response = MultiFrameDetectionResponse.model_construct(
+            is_counterfeit=is_counterfeit,
+            confidence=confidence,
+            status="completed" if completed else "retake_photo",
+            source="video" if is_video else "burst",
+            frames_read=frames_read,
+            frames_examined=selector.offered,
+            counterfeit_votes=votes,
+            keyframes=[
+                Keyframe.model_construct(
+                    frame_index=k.index,
+                    sharpness=k.sharpness,
+                    difference=k.difference,
+                    result=r
+                )
+                for k, r in zip(selected, results)
+            ],
+            selection_time_seconds=selection_time,
+            processing_time_seconds=time.time() - start_time,
+            timestamp=datetime.now(),
+            model_version=ml_service.model_name
+        )
+        
+        # One clip is one item: record the fused verdict, not every frame
+        if completed:
+            analytics_service.record_detection(
+                filename=name,
+                is_counterfeit=is_counterfeit,
+                confidence=confidence,
+                processing_time=response.processing_time_seconds,
+                tags=tags._replace(model_version=response.model_version)
+            )
+        
+        logger.info(
+            "Burst detection completed: %s, source=%s, frames=%s, keyframes=%s, counterfeit=%s",
+            name, response.source, frames_read, len(selected), is_counterfeit,
+            extra=SAMPLED
+        )
+        
+        return render_multi_frame(response, request)
+        
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error processing batch detection request: {e}", exc_info=True)
+        logger.error("Error processing burst detection request: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
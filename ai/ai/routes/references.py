@@ -0,0 +1,199 @@
+"""
+Reference Catalog API Routes
+
+Registers known-genuine reference images per product (the product id from
+the blockchain passport) and compares uploads against them.
+"""
+
+from fastapi import APIRouter, File, UploadFile, HTTPException, Path, Query
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+from ai.models.references import (
+    CatalogNeighbour,
+    ReferenceRegistration,
+    SimilarityResponse,
+    VerificationResponse
+)
+from ai.services.embedding_service import embedding_service
+from ai.services.verification_service import verification_service
+from ai.utils.helpers import validate_and_decode_image
+
+logger = logging.getLogger(__name__)
+
+# Product ids are kept verbatim by both reference stores, so ids that could
+# not round-trip through them (control characters, overlong) are rejected
+PRODUCT_ID_PATTERN = r"^[^\x00-\x1f\x7f]+$"
+PRODUCT_ID_MAX_LENGTH = 128
+
+
+def _product_id_param(description: str):
+    return Path(..., min_length=1, max_length=PRODUCT_ID_MAX_LENGTH, pattern=PRODUCT_ID_PATTERN, description=description)
+
+
+router = APIRouter(
+    prefix="/references",
+    tags=["References"],
+    responses={
+        400: {"description": "Invalid input"},
+        404: {"description": "No references registered for the product"},
+        500: {"description": "Internal server error"}
+    }
+)
+
+
+@router.post(
+    "/{product_id}",
+    response_model=ReferenceRegistration,
+    summary="Register a genuine reference image",
+    description="Add a known-genuine image of a product to the reference embedding index and keypoint store"
+)
+async def register_reference(
+    product_id: str = _product_id_param("Product id from the blockchain passport"),
+    file: UploadFile = File(..., description="Genuine reference image")
+) -> ReferenceRegistration:
+    """
+    Register a reference image for a product
+
+    Args:
+        product_id: Product id from the blockchain passport
+        file: Reference image
+
+    Returns:
+        ReferenceRegistration with the product's reference count
+    """
+    img = await validate_and_decode_image(file)
+    try:
+        count = await asyncio.to_thread(embedding_service.register_reference, product_id, img)
+        keypoints = await asyncio.to_thread(verification_service.register_reference, product_id, img)
+    except Exception as e:
+        logger.error("Error registering reference for %s: %s", product_id, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    return ReferenceRegistration(
+        product_id=product_id,
+        reference_count=count,
+        index_size=embedding_service.index.count,
+        keypoints=keypoints,
+        timestamp=datetime.now()
+    )
+
+
+@router.post(
+    "/{product_id}/similarity",
+    response_model=SimilarityResponse,
+    summary="Similarity to genuine references",
+    description="""
+    Compare an upload with the genuine references registered for a product.
+
+    Returns the best and mean similarity to the product's references, plus the
+    nearest products across the whole catalog from an approximate
+    nearest-neighbour search.
+    """
+)
+async def reference_similarity(
+    product_id: str = _product_id_param("Product the upload claims to be"),
+    file: UploadFile = File(..., description="Image to compare"),
+    k: int = Query(default=5, ge=1, le=50, description="Catalog neighbours to return")
+) -> SimilarityResponse:
+    """
+    Compare an upload with a product's references
+
+    Args:
+        product_id: Product the upload claims to be
+        file: Uploaded image
+        k: Number of catalog neighbours to return
+
+    Returns:
+        SimilarityResponse with similarity scores
+
+    Raises:
+        HTTPException: If the product has no references
+    """
+    img = await validate_and_decode_image(file)
+    if not embedding_service.index.product_rows(product_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"No references registered for product {product_id}"
+        )
+
+    start = time.perf_counter()
+    similarities, neighbours = await asyncio.to_thread(embedding_service.compare, product_id, img, k)
+    elapsed = time.perf_counter() - start
+    # Unit vectors can score a hair above 1.0 in float32
+    similarities = similarities.clip(-1.0, 1.0)
+
+    return SimilarityResponse(
+        product_id=product_id,
+        reference_count=len(similarities),
+        best_similarity=float(similarities.max()),
+        mean_similarity=float(similarities.mean()),
+        nearest_products=[
+            CatalogNeighbour(product_id=pid, similarity=min(1.0, score)) for pid, score in neighbours
+        ],
+        search_time_ms=elapsed * 1000,
+        timestamp=datetime.now()
+    )
+
+
+@router.post(
+    "/{product_id}/verify",
+    response_model=VerificationResponse,
+    summary="Keypoint verification against genuine references",
+    description="""
+    Geometrically verify logos and labels in an upload against the product's
+    genuine references.
+
+    Local features are matched against each reference and filtered with a
+    RANSAC homography; the authenticity score grows with the number of
+    geometrically consistent inliers.
+    """
+)
+async def verify_reference(
+    product_id: str = _product_id_param("Product the upload claims to be"),
+    file: UploadFile = File(..., description="Image to verify")
+) -> VerificationResponse:
+    """
+    Verify an upload against a product's references
+
+    Args:
+        product_id: Product the upload claims to be
+        file: Uploaded image
+
+    Returns:
+        VerificationResponse with the inlier-based authenticity score
+
+    Raises:
+        HTTPException: If the product has no stored keypoint references
+    """
+    img = await validate_and_decode_image(file)
+
+    start = time.perf_counter()
+    try:
+        result = await asyncio.to_thread(verification_service.verify, product_id, img)
+    except Exception as e:
+        logger.error("Error verifying %s: %s", product_id, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    elapsed = time.perf_counter() - start
+
+    if result is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No keypoint references stored for product {product_id}"
+        )
+
+    return VerificationResponse(
+        product_id=product_id,
+        verified=result.verified,
+        authenticity_score=result.authenticity_score,
+        inliers=result.inliers,
+        good_matches=result.good_matches,
+        query_keypoints=result.query_keypoints,
+        best_reference=result.best_reference,
+        reference_count=result.reference_count,
+        detector=verification_service.detector_name,
+        verification_time_ms=elapsed * 1000,
+        timestamp=datetime.now()
+    )
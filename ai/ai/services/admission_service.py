@@ -0,0 +1,345 @@
+"""
+Admission Control Service for BUCChain AI
+
+Tracks in-flight detection work and recent queue-wait latency, and decides per
+request whether to admit it, degrade it to a reduced input resolution, or shed
+it before any decoding or inference work is done.
+
+The latency SLO applies per image: the time an image waits for an inference
+slot (granted by the priority scheduler) plus the time it spends holding one.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Deque, Optional
+
+from fastapi import HTTPException
+
+from ai.models.analytics import AdmissionDecisionEntry, AdmissionStats
+from ai.services.scheduler_service import Lane, PriorityScheduler, priority_scheduler
+from ai.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Assumed full-resolution service time (seconds) before any image has completed
+DEFAULT_SERVICE_TIME = 0.1
+
+
+class AdmissionDecision(str, Enum):
+    """Outcome of an admission check"""
+    ADMIT = "admit"
+    DEGRADE = "degrade"
+    SHED = "shed"
+
+
+class AdmissionTicket:
+    """
+    Reservation for admitted work
+
+    Holds `cost` units of in-flight capacity until each image has been
+    processed in a slot, or until the ticket context exits.
+    """
+
+    def __init__(
+        self,
+        controller: "AdmissionController",
+        cost: int,
+        degraded: bool,
+        lane: Lane
+    ):
+        self.controller = controller
+        self.cost = cost
+        self.degraded = degraded
+        self.lane = lane
+        self._remaining = cost
+
+    @property
+    def input_size(self) -> Optional[int]:
+        """Longest-side input size to use, or None for full resolution"""
+        return self.controller.degraded_input_size if self.degraded else None
+
+    @asynccontextmanager
+    async def slot(self, images: int = 1) -> AsyncIterator[None]:
+        """
+        Wait for an inference slot and hold it while images are processed
+
+        Args:
+            images: Images processed in the slot; several images of one
+                request take a single slot when they share forward passes
+        """
+        controller = self.controller
+        async with controller.scheduler.slot(self.lane) as wait:
+            controller._queue_waits.append(wait)
+            started_at = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - started_at
+                for _ in range(images):
+                    controller._record_service_time(elapsed / images, self.degraded)
+                self._complete(images)
+
+    def _complete(self, count: int):
+        count = min(count, self._remaining)
+        self._remaining -= count
+        self.controller.in_flight -= count
+
+    async def __aenter__(self) -> "AdmissionTicket":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._complete(self._remaining)
+
+
+class AdmissionController:
+    """Latency-SLO based admission control for detection requests"""
+
+    def __init__(
+        self,
+        latency_slo_ms: Optional[float] = None,
+        scheduler: Optional[PriorityScheduler] = None,
+        max_queue_depth: Optional[int] = None,
+        degraded_input_size: Optional[int] = None,
+        window: Optional[int] = None
+    ):
+        """
+        Initialize admission controller
+
+        Args:
+            latency_slo_ms: Per-image latency objective in milliseconds
+            scheduler: Scheduler that grants inference slots
+            max_queue_depth: Maximum images waiting for a slot
+            degraded_input_size: Longest-side input size used when degrading
+            window: Number of recent samples used for latency estimates
+        """
+        self.latency_slo = (latency_slo_ms or settings.latency_slo_ms) / 1000
+        self.scheduler = scheduler or priority_scheduler
+        self.max_queue_depth = (
+            max_queue_depth if max_queue_depth is not None else settings.max_queue_depth
+        )
+        self.degraded_input_size = degraded_input_size or settings.degraded_input_size
+        # Turned off when the model cannot run at the degraded size (fixed-size
+        # export), since degrading would then cost as much as full resolution
+        self.degrade_enabled = True
+        window = window or settings.admission_window
+
+        self.in_flight = 0
+        # Set while the worker drains before a restart; new work is refused
+        self.closed_reason: Optional[str] = None
+
+        self._queue_waits: Deque[float] = deque(maxlen=window)
+        self._service_times: Deque[float] = deque(maxlen=window)
+        self._degraded_service_times: Deque[float] = deque(maxlen=window)
+
+        self.admitted = 0
+        self.degraded = 0
+        self.shed_queue_full = 0
+        self.shed_slo = 0
+        self.shed_draining = 0
+        self.recent_decisions: Deque[AdmissionDecisionEntry] = deque(maxlen=50)
+
+    @staticmethod
+    def _mean(values: Deque[float], default: float) -> float:
+        return sum(values) / len(values) if values else default
+
+    def _record_service_time(self, seconds: float, degraded: bool):
+        if degraded:
+            self._degraded_service_times.append(seconds)
+        else:
+            self._service_times.append(seconds)
+
+    def estimate_queue_wait(self, lane: Lane = Lane.INTERACTIVE) -> float:
+        """
+        Estimate how long a new image would wait for a slot
+
+        Args:
+            lane: Lane the image would be queued in
+
+        Returns:
+            Estimated wait in seconds
+        """
+        service_time = self._mean(self._service_times, DEFAULT_SERVICE_TIME)
+        return self.scheduler.estimate_wait(lane, service_time)
+
+    def estimate_latency(
+        self,
+        lane: Lane = Lane.INTERACTIVE,
+        degraded: bool = False
+    ) -> float:
+        """
+        Estimate per-image latency for a new request
+
+        Args:
+            lane: Lane the image would be queued in
+            degraded: Estimate for reduced input resolution
+
+        Returns:
+            Estimated queue wait plus service time in seconds
+        """
+        full = self._mean(self._service_times, DEFAULT_SERVICE_TIME)
+        # Degraded service time is optimistic (0) until it has been observed,
+        # so overload is first met by degrading, which then measures its cost
+        service_time = self._mean(self._degraded_service_times, 0.0) if degraded else full
+        return self.estimate_queue_wait(lane) + service_time
+
+    def _record_decision(
+        self,
+        decision: AdmissionDecision,
+        reason: str,
+        estimate: float,
+        cost: int,
+        lane: Lane
+    ):
+        if decision == AdmissionDecision.ADMIT:
+            self.admitted += 1
+            return
+        if decision == AdmissionDecision.DEGRADE:
+            self.degraded += 1
+        self.recent_decisions.append(AdmissionDecisionEntry(
+            timestamp=datetime.now(),
+            decision=decision.value,
+            reason=reason,
+            estimated_latency_ms=estimate * 1000,
+            cost=cost,
+            lane=lane.value
+        ))
+
+    def _shed(
+        self,
+        status_code: int,
+        reason: str,
+        estimate: float,
+        cost: int,
+        lane: Lane
+    ):
+        retry_after = max(1, math.ceil(self.estimate_queue_wait(lane)))
+        self._record_decision(AdmissionDecision.SHED, reason, estimate, cost, lane)
+        logger.warning(
+            "Shedding %s request (%s): cost=%s, "
+            "in_flight=%s, estimated=%.0fms",
+            lane.value, reason, cost, self.in_flight, estimate * 1000
+        )
+        raise HTTPException(
+            status_code=status_code,
+            detail=f"Service overloaded ({reason}), retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    def admit(
+        self,
+        cost: int = 1,
+        lane: Lane = Lane.INTERACTIVE,
+        allow_degrade: bool = True
+    ) -> AdmissionTicket:
+        """
+        Decide whether to accept a request
+
+        Args:
+            cost: Number of images in the request
+            lane: Priority lane the request's images are queued in
+            allow_degrade: Whether reduced input resolution is acceptable
+
+        Returns:
+            AdmissionTicket to be used as an async context manager
+
+        Raises:
+            HTTPException: 429 if the queue is full, 503 if the SLO would be
+                violated or the worker is draining
+        """
+        if self.closed_reason is not None:
+            self.shed_draining += 1
+            self._shed(503, self.closed_reason, self.estimate_latency(lane), cost, lane)
+
+        if self.in_flight + cost > self.scheduler.capacity + self.max_queue_depth:
+            self.shed_queue_full += 1
+            self._shed(429, "queue_full", self.estimate_latency(lane), cost, lane)
+
+        degraded = False
+        estimate = self.estimate_latency(lane)
+        if estimate <= self.latency_slo:
+            self._record_decision(AdmissionDecision.ADMIT, "within_slo", estimate, cost, lane)
+        else:
+            degraded_estimate = self.estimate_latency(lane, degraded=True)
+            if not self.degrade_enabled:
+                self.shed_slo += 1
+                self._shed(503, "slo_violation_fixed_input_size", estimate, cost, lane)
+            elif allow_degrade and degraded_estimate <= self.latency_slo:
+                degraded = True
+                self._record_decision(
+                    AdmissionDecision.DEGRADE, "slo_at_risk", degraded_estimate, cost, lane
+                )
+            else:
+                self.shed_slo += 1
+                self._shed(503, "slo_violation", estimate, cost, lane)
+
+        self.in_flight += cost
+        return AdmissionTicket(self, cost, degraded, lane)
+
+    def close(self, reason: str):
+        """
+        Stop admitting new work (in-flight work continues)
+
+        Args:
+            reason: Shed reason reported to refused requests
+        """
+        if self.closed_reason is None:
+            logger.warning("Admission closed (%s): %s images in flight", reason, self.in_flight)
+        self.closed_reason = reason
+
+    async def drain(self, timeout: float, poll_interval: float = 0.05) -> bool:
+        """
+        Wait for in-flight work to finish
+
+        Args:
+            timeout: Maximum seconds to wait
+            poll_interval: Seconds between checks
+
+        Returns:
+            True if nothing is in flight any more, False on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while self.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+        return self.in_flight <= 0
+
+    def get_stats(self) -> AdmissionStats:
+        """
+        Get admission control statistics
+
+        Returns:
+            AdmissionStats with current load and decision counters
+        """
+        waits = sorted(self._queue_waits)
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+
+        return AdmissionStats(
+            latency_slo_ms=self.latency_slo * 1000,
+            max_concurrent_inferences=self.scheduler.capacity,
+            max_queue_depth=self.max_queue_depth,
+            degrade_enabled=self.degrade_enabled,
+            in_flight=self.in_flight,
+            running=self.scheduler.running,
+            estimated_latency_ms=self.estimate_latency() * 1000,
+            average_queue_wait_ms=self._mean(self._queue_waits, 0.0) * 1000,
+            p95_queue_wait_ms=p95 * 1000,
+            average_service_time_ms=self._mean(self._service_times, 0.0) * 1000,
+            average_degraded_service_time_ms=self._mean(self._degraded_service_times, 0.0) * 1000,
+            admitted=self.admitted,
+            degraded=self.degraded,
+            shed_queue_full=self.shed_queue_full,
+            shed_slo=self.shed_slo,
+            shed_draining=self.shed_draining,
+            closed_reason=self.closed_reason,
+            recent_decisions=list(reversed(self.recent_decisions)),
+            timestamp=datetime.now()
+        )
+
+
+# Global admission controller instance
+admission_controller = AdmissionController()
@@ -5,15 +5,21 @@ Tracks and provides statistics about detection operations.
 """
 
 import logging
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from collections import deque
 
 from ai.models.analytics import (
     AnalyticsSummary,
     RecentDetection,
-    RecentDetectionsResponse
+    RecentDetectionsResponse,
+    QualityGateStats
 )
+from ai.models.predictions import ImageQuality
+from ai.services.rollup_service import DetectionTags, RollupStore
+from ai.services.spike_service import SpikeDetector
+from ai.utils.config import settings
+from ai.utils.image_formats import decode_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -34,15 +40,30 @@ class AnalyticsService:
         self.total_processing_time = 0.0
         self.total_confidence = 0.0
         
-        # Store recent detections using deque for efficient operations
-        self.recent_detections: deque[RecentDetection] = deque(maxlen=max_recent)
+        # Store recent detections using deque for efficient operations; as
+        # plain tuples, a quarter of the memory of RecentDetection instances
+        self.recent_detections: deque[Tuple[datetime, str, bool, float, float]] = deque(maxlen=max_recent)
+        
+        # Per-dimension rollups (supplier, product, client, model version, region)
+        self.rollups = RollupStore()
+        
+        # Counterfeit-spike and confidence-drift detection per supplier,
+        # product and region
+        self.spikes = SpikeDetector()
+        
+        # Quality gate counters
+        self.quality_checked = 0
+        self.quality_rejected = 0
+        self.quality_assessment_time = 0.0
+        self.quality_rejections_by_issue: Dict[str, int] = {}
     
     def record_detection(
         self,
         filename: str,
         is_counterfeit: bool,
         confidence: float,
-        processing_time: float
+        processing_time: float,
+        tags: Optional[DetectionTags] = None
     ):
         """
         Record a detection event
@@ -52,6 +73,8 @@ class AnalyticsService:
             is_counterfeit: Whether counterfeit was detected
             confidence: Detection confidence
             processing_time: Processing time in seconds
+            tags: Dimension values for the rollups (supplier, product,
+                client, model version, region)
         """
         self.total_detections += 1
         if is_counterfeit:
@@ -61,19 +84,53 @@ class AnalyticsService:
         self.total_confidence += confidence
         
         # Add to recent detections
-        detection = RecentDetection(
-            timestamp=datetime.now(),
-            filename=filename,
-            is_counterfeit=is_counterfeit,
-            confidence=confidence,
-            processing_time=processing_time
+        self.recent_detections.append(
+            (datetime.now(), filename, is_counterfeit, confidence, processing_time)
         )
-        self.recent_detections.append(detection)
+        
+        tags = tags or DetectionTags()
+        self.rollups.record(tags, is_counterfeit, confidence, processing_time)
+        self.spikes.record(tags, is_counterfeit, confidence)
         
         logger.debug(
-            f"Recorded detection: {filename}, "
-            f"counterfeit={is_counterfeit}, "
-            f"total_count={self.total_detections}"
+            "Recorded detection: %s, "
+            "counterfeit=%s, "
+            "total_count=%s",
+            filename, is_counterfeit, self.total_detections
+        )
+    
+    def record_quality(self, quality: ImageQuality):
+        """
+        Record the outcome of an image quality assessment
+        
+        Args:
+            quality: Quality assessment from the gate
+        """
+        self.quality_checked += 1
+        self.quality_assessment_time += quality.assessment_time_ms
+        if not quality.passed:
+            self.quality_rejected += 1
+            for issue in quality.issues:
+                self.quality_rejections_by_issue[issue] = (
+                    self.quality_rejections_by_issue.get(issue, 0) + 1
+                )
+    
+    def get_quality_stats(self) -> QualityGateStats:
+        """
+        Get image quality gate statistics
+        
+        Returns:
+            QualityGateStats with gate hit rates per failed check
+        """
+        checked = self.quality_checked
+        return QualityGateStats(
+            enabled=settings.quality_gate_enabled,
+            checked=checked,
+            rejected=self.quality_rejected,
+            rejection_rate=self.quality_rejected / checked if checked else 0.0,
+            rejections_by_issue=dict(self.quality_rejections_by_issue),
+            average_assessment_time_ms=self.quality_assessment_time / checked if checked else 0.0,
+            timestamp=datetime.now()
         )
     
     def get_summary(self) -> AnalyticsSummary:
@@ -128,7 +185,17 @@ class AnalyticsService:
         all_detections.reverse()
         
         # Apply pagination
-        paginated = all_detections[offset:offset + limit]
+        paginated = [
+            RecentDetection.model_construct(
+                timestamp=timestamp,
+                filename=filename,
+                is_counterfeit=is_counterfeit,
+                confidence=confidence,
+                processing_time=processing_time
+            )
+            for timestamp, filename, is_counterfeit, confidence, processing_time
+            in all_detections[offset:offset + limit]
+        ]
         
         return RecentDetectionsResponse(
             detections=paginated,
@@ -154,6 +221,13 @@ class AnalyticsService:
         self.total_processing_time = 0.0
         self.total_confidence = 0.0
         self.recent_detections.clear()
+        self.rollups.reset()
+        self.spikes.reset()
+        self.quality_checked = 0
+        self.quality_rejected = 0
+        self.quality_assessment_time = 0.0
+        self.quality_rejections_by_issue.clear()
+        decode_tracker.reset()
 
 
 # Global analytics service instance
@@ -0,0 +1,103 @@
+"""
+Inference micro-batching for BUCChain AI
+
+Images that arrive close together are collected for up to a short window
+(or until a batch is full) and run through the model together, in one
+forward pass when the export has a dynamic batch axis. Images are grouped
+by model input size, since only same-size inputs can share a pass; used by
+the model cascade for escalated images and by adaptive input resolution.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ai.models.predictions import DetectionResult
+
+logger = logging.getLogger(__name__)
+
+# Queued image: (image, confidence threshold, queued at, future)
+_Pending = Tuple[np.ndarray, float, float, asyncio.Future]
+
+
+class InferenceBatcher:
+    """Collects images and runs them through a model in same-size batches"""
+
+    def __init__(self, model, max_batch: int, window: float):
+        """
+        Args:
+            model: Model with predict_batch (OnnxDetector)
+            max_batch: Images per batch
+            window: Seconds to wait for a batch to fill
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.window = window
+        self.batches = 0
+        self.batched_images = 0
+        self._waits: Deque[float] = deque(maxlen=256)
+        self._pending: Dict[Optional[int], List[_Pending]] = {}
+        self._timers: Dict[Optional[int], asyncio.TimerHandle] = {}
+
+    async def predict(
+        self,
+        img: np.ndarray,
+        confidence_threshold: float,
+        input_size: Optional[int] = None
+    ) -> List[DetectionResult]:
+        """
+        Queue an image for the next batch of its size and wait for its detections
+
+        Args:
+            img: Preprocessed image
+            confidence_threshold: Minimum score to keep a detection
+            input_size: Model input size (None for the model's default)
+
+        Returns:
+            Detections of the model
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(input_size, [])
+        pending.append((img, confidence_threshold, time.perf_counter(), future))
+        if len(pending) >= self.max_batch:
+            self._flush(input_size)
+        elif input_size not in self._timers:
+            self._timers[input_size] = loop.call_later(self.window, self._flush, input_size)
+        return await future
+
+    def _flush(self, input_size: Optional[int]):
+        timer = self._timers.pop(input_size, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(input_size, None)
+        if batch:
+            asyncio.ensure_future(self._run(batch, input_size))
+
+    async def _run(self, batch: List[_Pending], input_size: Optional[int]):
+        started = time.perf_counter()
+        self._waits.extend(started - queued for _, _, queued, _ in batch)
+        threshold = min(t for _, t, _, _ in batch)
+        try:
+            results = await asyncio.to_thread(
+                self.model.predict_batch, [img for img, _, _, _ in batch], threshold, input_size
+            )
+        except Exception as e:
+            logger.error("Inference batch of %s images failed: %s", len(batch), e)
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_images += len(batch)
+        for (_, t, _, future), detections in zip(batch, results):
+            if not future.done():
+                future.set_result([d for d in detections if d.confidence >= t])
+
+    @property
+    def average_wait(self) -> float:
+        return sum(self._waits) / len(self._waits) if self._waits else 0.0
@@ -0,0 +1,149 @@
+"""
+Two-stage model cascade for BUCChain AI
+
+A small screening model (by default the served model at a reduced input
+size) looks at every image first. Its highest detection score decides the
+clear cases on its own: below CASCADE_BAND_LOW the item is genuine, at or
+above CASCADE_BAND_HIGH it is counterfeit. Images scoring inside the band
+are escalated to the full model (MODEL_PATH at MODEL_INPUT_SIZE).
+
+Escalated images are collected for up to CASCADE_BATCH_WINDOW_MS (or until
+CASCADE_BATCH_SIZE are waiting) and run through the full model together, in
+one forward pass when the export has a dynamic batch axis. With adaptive
+input resolution, escalated images are batched per input size.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+
+from ai.models.analytics import CascadeStageStats, CascadeStats
+from ai.models.predictions import DetectionResult
+from ai.services.batching_service import InferenceBatcher
+
+logger = logging.getLogger(__name__)
+
+SCREEN_STAGE = "screen"
+FULL_STAGE = "full"
+
+
+class _StageTimes:
+    """Image counts and a window of recent latencies for one stage"""
+
+    def __init__(self, window: int):
+        self.images = 0
+        self.decided = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def stats(self, stage: str, model) -> CascadeStageStats:
+        latencies = sorted(self.latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        return CascadeStageStats(
+            stage=stage,
+            model=model.model_path,
+            input_size=model.input_size,
+            images=self.images,
+            decided=self.decided,
+            average_latency_ms=sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            p95_latency_ms=p95 * 1000
+        )
+
+
+class ModelCascade:
+    """Screening model with escalation of uncertain images to the full model"""
+
+    def __init__(
+        self,
+        screen_model,
+        full_model,
+        band_low: float,
+        band_high: float,
+        batch_size: int,
+        batch_window: float,
+        window: int = 100
+    ):
+        """
+        Args:
+            screen_model: Small, fast model run on every image
+            full_model: Larger model for escalated images
+            band_low: Screening scores below this are decided as genuine
+            band_high: Screening scores at or above this are decided as counterfeit
+            batch_size: Escalated images per full-model batch
+            batch_window: Seconds to wait for an escalation batch to fill
+            window: Number of recent latencies kept per stage
+        """
+        self.screen_model = screen_model
+        self.full_model = full_model
+        self.band_low = band_low
+        self.band_high = band_high
+        self.batcher = InferenceBatcher(full_model, batch_size, batch_window)
+        self._screen = _StageTimes(window)
+        self._full = _StageTimes(window)
+
+    async def predict(
+        self,
+        img: np.ndarray,
+        confidence_threshold: float,
+        input_size: Optional[int] = None
+    ) -> Tuple[List[DetectionResult], str]:
+        """
+        Run the cascade on one image
+
+        Args:
+            img: Preprocessed image
+            confidence_threshold: Minimum score to keep a detection
+            input_size: Full-model input size if not its default (the
+                screening model always runs at its own size)
+
+        Returns:
+            (detections, stage that decided: "screen" or "full")
+        """
+        start = time.perf_counter()
+        # Screen with the band's lower edge so in-band scores are visible
+        screened = await asyncio.to_thread(
+            self.screen_model.predict, img, min(confidence_threshold, self.band_low)
+        )
+        self._screen.latencies.append(time.perf_counter() - start)
+        self._screen.images += 1
+
+        score = max((d.confidence for d in screened), default=0.0)
+        if score < self.band_low or score >= self.band_high:
+            self._screen.decided += 1
+            return [d for d in screened if d.confidence >= confidence_threshold], SCREEN_STAGE
+
+        start = time.perf_counter()
+        detections = await self.batcher.predict(img, confidence_threshold, input_size)
+        self._full.latencies.append(time.perf_counter() - start)
+        self._full.images += 1
+        self._full.decided += 1
+        return detections, FULL_STAGE
+
+    def get_stats(self) -> CascadeStats:
+        """
+        Get cascade statistics
+
+        Returns:
+            CascadeStats with escalation rate, batching and per-stage latency
+        """
+        screened = self._screen.images
+        batches = self.batcher.batches
+        return CascadeStats(
+            enabled=True,
+            band_low=self.band_low,
+            band_high=self.band_high,
+            escalated=self._full.images,
+            escalation_rate=self._full.images / screened if screened else 0.0,
+            batches=batches,
+            average_batch_size=self.batcher.batched_images / batches if batches else 0.0,
+            average_batch_wait_ms=self.batcher.average_wait * 1000,
+            stages=[
+                self._screen.stats(SCREEN_STAGE, self.screen_model),
+                self._full.stats(FULL_STAGE, self.full_model)
+            ],
+            timestamp=datetime.now()
+        )
@@ -0,0 +1,562 @@
+"""
+Embedding Service for BUCChain AI
+
+Compares uploads against known-genuine reference images registered for a
+product. Images are reduced to compact global descriptors and stored in an
+on-disk, memory-mapped vector index with an inverted-file (IVF) layer for
+approximate nearest-neighbour search across the whole catalog.
+
+Index directory layout:
+    meta.json          dimension, row count, capacity, IVF state
+    vectors.f32        float32 descriptors, shape (capacity, dim), memory-mapped
+    assignments.i32    IVF list of every row, shape (capacity,), memory-mapped
+    centroids.npy      IVF centroids, shape (nlist, dim)
+    product_ids.txt    product id of every row, one per line
+    index.lock         lock file serializing writers across processes
+
+Every worker process can register references. Writers append under an
+exclusive lock on index.lock after reloading meta.json, and readers pick up
+rows added by other processes when meta.json changes. Within a process each
+change builds a new view of the index that is swapped in whole, so searches
+never see a half-updated index.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ai.utils.config import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: threads of one process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Descriptor layout: 8x4x4 HSV color histogram + 4x4 cells x 8 gradient orientations
+COLOR_BINS = (8, 4, 4)
+GRID = 4
+ORIENTATIONS = 8
+DESCRIPTOR_SIZE = int(np.prod(COLOR_BINS)) + GRID * GRID * ORIENTATIONS
+DESCRIPTOR_IMAGE_SIZE = 128
+
+
+def compute_descriptor(img: np.ndarray) -> np.ndarray:
+    """
+    Compute a compact global image descriptor (CPU baseline)
+
+    Concatenates an HSV color histogram with a coarse grid of gradient
+    orientation histograms, square-root normalized (Hellinger kernel) and
+    L2-normalized so that a dot product is a cosine similarity.
+
+    Args:
+        img: Input image (BGR format)
+
+    Returns:
+        float32 vector of length DESCRIPTOR_SIZE with unit norm
+    """
+    small = cv2.resize(img, (DESCRIPTOR_IMAGE_SIZE, DESCRIPTOR_IMAGE_SIZE), interpolation=cv2.INTER_LINEAR)
+
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    color = cv2.calcHist([hsv], [0, 1, 2], None, list(COLOR_BINS), [0, 180, 0, 256, 0, 256]).ravel()
+
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude, angle = cv2.cartToPolar(gx, gy)
+    orientation = (angle * (ORIENTATIONS / (2 * np.pi))).astype(np.int32) % ORIENTATIONS
+    cell_size = DESCRIPTOR_IMAGE_SIZE // GRID
+    rows, cols = np.indices(gray.shape) // cell_size
+    bins = ((rows * GRID + cols) * ORIENTATIONS + orientation).ravel()
+    gradients = np.bincount(bins, weights=magnitude.ravel(), minlength=GRID * GRID * ORIENTATIONS)
+
+    parts = []
+    for hist in (color, gradients):
+        total = hist.sum()
+        parts.append(np.sqrt(hist / total) if total > 0 else hist)
+    descriptor = np.concatenate(parts).astype(np.float32)
+    norm = np.linalg.norm(descriptor)
+    return descriptor / norm if norm > 0 else descriptor
+
+
+class _IndexState:
+    """
+    View of the index at one row count
+
+    Never changed after it is built: writers build a new view and swap it in
+    with one assignment, so readers keep a consistent view without locking.
+    product_ids is append-only and shared between views (each view only
+    reads its first count entries).
+    """
+
+    __slots__ = (
+        "count", "capacity", "generation", "vectors", "assignments",
+        "product_ids", "rows_by_product", "centroids", "lists"
+    )
+
+    def __init__(self, count, capacity, generation, vectors, assignments,
+                 product_ids, rows_by_product, centroids, lists):
+        self.count = count
+        self.capacity = capacity
+        self.generation = generation
+        self.vectors = vectors
+        self.assignments = assignments
+        self.product_ids: List[str] = product_ids
+        self.rows_by_product: Dict[str, List[int]] = rows_by_product
+        self.centroids: Optional[np.ndarray] = centroids
+        self.lists: List[np.ndarray] = lists
+
+
+class VectorIndex:
+    """Append-only memory-mapped vector store with IVF search"""
+
+    def __init__(self, directory: str, dim: int = DESCRIPTOR_SIZE, initial_capacity: int = 1024):
+        """
+        Open or create an index
+
+        Args:
+            directory: Index directory
+            dim: Vector dimension (ignored for existing indexes)
+            initial_capacity: Rows allocated when creating a new index
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_file = open(self.directory / "index.lock", "a+b")
+        self._meta_path = self.directory / "meta.json"
+        self._ids_path = self.directory / "product_ids.txt"
+        self._ids_offset = 0
+
+        with self._process_lock(exclusive=True):
+            meta = self._read_meta()
+            if not meta:
+                meta = {"dim": dim, "count": 0, "capacity": initial_capacity, "nlist": 0, "generation": 0}
+                self.dim = dim
+                self._open_arrays(initial_capacity, create=True)
+                self._ids_path.touch()
+                self._write_meta(meta)
+            self.dim = meta["dim"]
+            count = self._recover(meta["count"])
+            if count != meta["count"]:
+                meta["count"] = count
+                self._write_meta(meta)
+            self._stamp = self._meta_stamp()
+            self._state = self._load(meta, None)
+
+    @contextmanager
+    def _process_lock(self, exclusive: bool):
+        """Serialize threads of this process and, with fcntl, other processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> dict:
+        return json.loads(self._meta_path.read_text()) if self._meta_path.exists() else {}
+
+    def _write_meta(self, meta: dict):
+        tmp = self.directory / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self._meta_path)
+
+    def _meta_stamp(self) -> Tuple[int, int]:
+        # meta.json is replaced, never rewritten, so a new inode means a change
+        stat = os.stat(self._meta_path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _open_arrays(self, capacity: int, create: bool = False):
+        mode = "w+" if create else "r+"
+        vectors = np.memmap(
+            self.directory / "vectors.f32", dtype=np.float32, mode=mode, shape=(capacity, self.dim)
+        )
+        assignments = np.memmap(
+            self.directory / "assignments.i32", dtype=np.int32, mode=mode, shape=(capacity,)
+        )
+        return vectors, assignments
+
+    def _recover(self, count: int) -> int:
+        """Drop rows past either record (interrupted mid-write); returns the row count"""
+        lines = self._ids_path.read_bytes().splitlines(keepends=True)
+        if len(lines) != count:
+            count = min(count, len(lines))
+            with open(self._ids_path, "r+b") as f:
+                f.truncate(sum(len(line) for line in lines[:count]))
+        return count
+
+    def _load(self, meta: dict, previous: Optional[_IndexState]) -> _IndexState:
+        """Build a view of the index as recorded in meta, reusing a previous view"""
+        count, capacity, generation = meta["count"], meta["capacity"], meta.get("generation", 0)
+        if previous is not None and previous.capacity == capacity:
+            vectors, assignments = previous.vectors, previous.assignments
+        else:
+            vectors, assignments = self._open_arrays(capacity)
+
+        start = previous.count if previous is not None else 0
+        product_ids = previous.product_ids if previous is not None else []
+        with open(self._ids_path, "rb") as f:
+            f.seek(self._ids_offset)
+            new_ids = [f.readline().decode("utf-8").rstrip("\n") for _ in range(count - start)]
+            self._ids_offset = f.tell()
+        product_ids.extend(new_ids)
+        rows_by_product = self._extend_rows(
+            previous.rows_by_product if previous is not None else {}, new_ids, start
+        )
+
+        if previous is not None and previous.generation == generation:
+            centroids = previous.centroids
+            lists = self._extend_lists(previous.lists, assignments[start:count], start) if centroids is not None else []
+        else:
+            centroids_path = self.directory / "centroids.npy"
+            centroids = np.load(centroids_path) if meta.get("nlist") and centroids_path.exists() else None
+            lists = self._build_lists(assignments, count, len(centroids)) if centroids is not None else []
+        return _IndexState(
+            count, capacity, generation, vectors, assignments, product_ids, rows_by_product, centroids, lists
+        )
+
+    def _refresh(self):
+        """Pick up rows and training done by other processes (lock held)"""
+        stamp = self._meta_stamp()
+        if stamp == self._stamp:
+            return
+        meta = self._read_meta()
+        state = self._state
+        if (meta["count"], meta["capacity"], meta.get("generation", 0)) != (
+            state.count, state.capacity, state.generation
+        ):
+            self._state = self._load(meta, state)
+        self._stamp = stamp
+
+    def _current(self) -> _IndexState:
+        """Latest view, reloaded when another process changed the index"""
+        if self._meta_stamp() != self._stamp:
+            with self._process_lock(exclusive=False):
+                self._refresh()
+        return self._state
+
+    @staticmethod
+    def _extend_rows(rows_by_product: Dict[str, List[int]], product_ids: List[str], start: int):
+        if not product_ids:
+            return rows_by_product
+        new_rows: Dict[str, List[int]] = {}
+        for row, product_id in enumerate(product_ids, start):
+            new_rows.setdefault(product_id, []).append(row)
+        rows_by_product = dict(rows_by_product)
+        for product_id, rows in new_rows.items():
+            rows_by_product[product_id] = rows_by_product.get(product_id, []) + rows
+        return rows_by_product
+
+    @staticmethod
+    def _extend_lists(lists: List[np.ndarray], list_ids: np.ndarray, start: int) -> List[np.ndarray]:
+        if len(list_ids) == 0:
+            return lists
+        lists = list(lists)
+        for row, list_id in enumerate(np.asarray(list_ids), start):
+            lists[list_id] = np.append(lists[list_id], row)
+        return lists
+
+    @staticmethod
+    def _build_lists(assignments: np.ndarray, count: int, nlist: int) -> List[np.ndarray]:
+        assignments = np.asarray(assignments[:count])
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        bounds = np.cumsum(np.bincount(assignments, minlength=nlist))
+        return np.split(order, bounds[:-1])
+
+    @staticmethod
+    def _nearest_centroids(centroids: np.ndarray, vectors: np.ndarray, count: int) -> np.ndarray:
+        scores = vectors @ centroids.T
+        if count >= scores.shape[1]:
+            return np.argsort(-scores, axis=1)
+        top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+    @property
+    def count(self) -> int:
+        """Number of stored vectors"""
+        return self._current().count
+
+    @property
+    def capacity(self) -> int:
+        """Rows allocated on disk"""
+        return self._current().capacity
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Memory-mapped vectors (rows past count are unused)"""
+        return self._current().vectors
+
+    @property
+    def product_ids(self) -> List[str]:
+        """Product id of every row"""
+        return self._current().product_ids
+
+    @property
+    def centroids(self) -> Optional[np.ndarray]:
+        """IVF centroids (None before training)"""
+        return self._current().centroids
+
+    @property
+    def trained(self) -> bool:
+        """Whether the IVF layer has been trained"""
+        return self.centroids is not None
+
+    def _state_meta(self, state: _IndexState) -> dict:
+        return {
+            "dim": self.dim,
+            "count": state.count,
+            "capacity": state.capacity,
+            "nlist": len(state.centroids) if state.centroids is not None else 0,
+            "generation": state.generation
+        }
+
+    def add(self, product_id: str, vector: np.ndarray) -> int:
+        """
+        Append a vector
+
+        Args:
+            product_id: Product the vector belongs to
+            vector: Unit-norm vector of length dim
+
+        Returns:
+            Row number of the new vector
+        """
+        return self.add_many([product_id], vector[None, :])[0]
+
+    def add_many(self, product_ids: List[str], vectors: np.ndarray) -> List[int]:
+        """
+        Append vectors in one write
+
+        Safe to call from several threads and processes: rows are appended
+        under an exclusive lock after reloading the row count.
+
+        Args:
+            product_ids: Product of each vector
+            vectors: Unit-norm vectors, shape (n, dim)
+
+        Returns:
+            Row numbers of the new vectors
+        """
+        with self._process_lock(exclusive=True):
+            self._refresh()
+            state = self._state
+            start, end = state.count, state.count + len(product_ids)
+            capacity = state.capacity
+            while end > capacity:
+                capacity *= 2
+            if capacity != state.capacity:
+                # Growing the files leaves existing mappings (and the views
+                # readers hold) valid
+                for name, itemsize in (("vectors.f32", 4 * self.dim), ("assignments.i32", 4)):
+                    with open(self.directory / name, "r+b") as f:
+                        f.truncate(capacity * itemsize)
+                stored, assignments = self._open_arrays(capacity)
+            else:
+                stored, assignments = state.vectors, state.assignments
+
+            stored[start:end] = vectors
+            lists = state.lists
+            if state.centroids is not None:
+                list_ids = self._nearest_centroids(state.centroids, vectors, 1)[:, 0]
+                assignments[start:end] = list_ids
+                lists = self._extend_lists(lists, list_ids, start)
+            stored.flush()
+            assignments.flush()
+
+            # Vectors first, then ids, then meta: a crash leaves rows that
+            # are dropped by the next writer rather than misaligned ones
+            cleaned = [p.replace("\n", " ") for p in product_ids]
+            with open(self._ids_path, "r+b") as f:
+                f.truncate(self._ids_offset)
+                f.seek(self._ids_offset)
+                f.write("".join(f"{p}\n" for p in cleaned).encode("utf-8"))
+                self._ids_offset = f.tell()
+            state.product_ids.extend(cleaned)
+
+            state = _IndexState(
+                end, capacity, state.generation, stored, assignments, state.product_ids,
+                self._extend_rows(state.rows_by_product, cleaned, start), state.centroids, lists
+            )
+            self._write_meta(self._state_meta(state))
+            self._state = state
+            self._stamp = self._meta_stamp()
+            return list(range(start, end))
+
+    def train(self, nlist: Optional[int] = None, sample_size: int = 50000):
+        """
+        Train IVF centroids with k-means and assign every stored vector
+
+        Args:
+            nlist: Number of inverted lists (default: ~sqrt of row count)
+            sample_size: Maximum vectors used for k-means
+        """
+        with self._process_lock(exclusive=True):
+            self._refresh()
+            state = self._state
+            count = state.count
+            if count == 0:
+                return
+            nlist = min(nlist or max(1, int(math.sqrt(count))), count)
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(count, min(sample_size, count), replace=False))
+            sample = np.ascontiguousarray(state.vectors[sample_rows])
+
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1e-4)
+            _, _, centroids = cv2.kmeans(sample, nlist, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids = (centroids / np.maximum(norms, 1e-12)).astype(np.float32)
+
+            # Views in use search their own lists, so the shared assignments
+            # can be rewritten in place
+            for start in range(0, count, 65536):
+                end = min(start + 65536, count)
+                block = np.asarray(state.vectors[start:end])
+                state.assignments[start:end] = self._nearest_centroids(centroids, block, 1)[:, 0]
+            state.assignments.flush()
+            tmp = self.directory / "centroids.npy.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, centroids)
+            os.replace(tmp, self.directory / "centroids.npy")
+
+            state = _IndexState(
+                count, state.capacity, state.generation + 1, state.vectors, state.assignments,
+                state.product_ids, state.rows_by_product, centroids,
+                self._build_lists(state.assignments, count, nlist)
+            )
+            self._write_meta(self._state_meta(state))
+            self._state = state
+            self._stamp = self._meta_stamp()
+            logger.info("Trained IVF index: %s vectors, %s lists", count, nlist)
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: int = 16) -> List[Tuple[int, float]]:
+        """
+        Approximate nearest-neighbour search by cosine similarity
+
+        Args:
+            query: Unit-norm query vector
+            k: Number of results
+            nprobe: Inverted lists scanned (ignored before training)
+
+        Returns:
+            List of (row, similarity), best first
+        """
+        state = self._current()
+        if state.count == 0:
+            return []
+        if state.centroids is not None:
+            probe = self._nearest_centroids(state.centroids, query[None, :], nprobe)[0]
+            candidates = np.sort(np.concatenate([state.lists[i] for i in probe]))
+            if len(candidates) == 0:
+                return []
+            scores = np.asarray(state.vectors[candidates]) @ query
+        else:
+            candidates = np.arange(state.count)
+            scores = np.asarray(state.vectors[:state.count]) @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def product_rows(self, product_id: str) -> List[int]:
+        """Rows registered for a product"""
+        return self._current().rows_by_product.get(product_id, [])
+
+    def similarities(self, product_id: str, query: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of a query to every reference of one product
+
+        Args:
+            product_id: Product to compare against
+            query: Unit-norm query vector
+
+        Returns:
+            Array of similarities (empty if the product has no references)
+        """
+        state = self._current()
+        rows = state.rows_by_product.get(product_id)
+        if not rows:
+            return np.empty(0, dtype=np.float32)
+        return np.asarray(state.vectors[rows]) @ query
+
+
+class EmbeddingService:
+    """Reference-catalog similarity search"""
+
+    def __init__(self, index_dir: Optional[str] = None):
+        self.index_dir = index_dir or settings.embedding_index_dir
+        self.nprobe = settings.embedding_nprobe
+        self.train_threshold = settings.embedding_train_threshold
+        self._index: Optional[VectorIndex] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> VectorIndex:
+        """Index, opened on first use"""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    index = VectorIndex(self.index_dir)
+                    logger.info("Embedding index opened: %s (%s vectors)", self.index_dir, index.count)
+                    self._index = index
+        return self._index
+
+    def register_reference(self, product_id: str, img: np.ndarray) -> int:
+        """
+        Register a known-genuine reference image
+
+        Args:
+            product_id: Product the reference belongs to
+            img: Reference image (BGR format)
+
+        Returns:
+            Number of references registered for the product
+        """
+        index = self.index
+        index.add(product_id, compute_descriptor(img))
+        if not index.trained and index.count >= self.train_threshold:
+            index.train()
+        return len(index.product_rows(product_id))
+
+    def compare(
+        self,
+        product_id: str,
+        img: np.ndarray,
+        k: int = 5
+    ) -> Tuple[np.ndarray, List[Tuple[str, float]]]:
+        """
+        Compare an upload with a product's references and the whole catalog
+
+        Args:
+            product_id: Product the upload claims to be
+            img: Uploaded image (BGR format)
+            k: Number of catalog neighbours to return
+
+        Returns:
+            Tuple of (similarities to the product's references,
+            [(product_id, similarity)] of the nearest catalog entries)
+        """
+        index = self.index
+        query = compute_descriptor(img)
+        similarities = index.similarities(product_id, query)
+        # Over-fetch so products with many references do not crowd out others
+        neighbours: Dict[str, float] = {}
+        for row, score in index.search(query, k=k * 4, nprobe=self.nprobe):
+            neighbours.setdefault(index.product_ids[row], score)
+        return similarities, list(neighbours.items())[:k]
+
+
+# Global embedding service instance
+embedding_service = EmbeddingService()
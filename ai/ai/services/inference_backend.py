@@ -0,0 +1,174 @@
+"""
+ONNX Runtime inference backend for BUCChain AI
+
+Runs YOLOv10 models exported to ONNX (`yolo export model=yolov10n.pt
+format=onnx`) at FP32, or their statically quantized INT8 counterparts built
+with `scripts/quantize_model.py`. YOLOv10 is NMS-free, so the raw output of
+shape (1, N, 6) - x1, y1, x2, y2, score, class - is used directly.
+"""
+
+import ast
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ai.models.predictions import BoundingBox, DetectionResult
+from ai.utils.helpers import to_model_input, validate_confidence
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxDetector:
+    """YOLOv10 detector backed by an ONNX Runtime session"""
+
+    def __init__(
+        self,
+        model_path: str,
+        input_size: int = 640,
+        intra_op_threads: Optional[int] = None
+    ):
+        """
+        Create an inference session
+
+        Args:
+            model_path: Path to an FP32 or INT8 ONNX model
+            input_size: Square model input size
+            intra_op_threads: Threads used inside each operator (None for default)
+
+        Raises:
+            ImportError: If onnxruntime is not installed
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+            options.inter_op_num_threads = 1
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Models exported with a fixed shape override the configured size;
+        # exports with dynamic height and width run at any requested size
+        static_size = model_input.shape[-1]
+        self.dynamic_size = not isinstance(static_size, int)
+        self.input_size = input_size if self.dynamic_size else static_size
+        # Exports with a dynamic batch axis can run several images per call
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        self.class_names = self._read_class_names()
+
+        logger.info(
+            "ONNX model loaded: %s "
+            "(input=%s%s, classes=%s)",
+            model_path, self.input_size, ", dynamic size" if self.dynamic_size else "", len(self.class_names)
+        )
+
+    def _read_class_names(self) -> Dict[int, str]:
+        """Read class names stored in the model metadata by the YOLO exporter"""
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        try:
+            return {int(k): str(v) for k, v in ast.literal_eval(metadata.get("names", "{}")).items()}
+        except (ValueError, SyntaxError, AttributeError):
+            return {}
+
+    def forward(self, tensor: np.ndarray) -> np.ndarray:
+        """
+        Run the raw model forward pass
+
+        Args:
+            tensor: Input tensor of shape (1, 3, size, size)
+
+        Returns:
+            Raw output of shape (N, 6)
+        """
+        return self.session.run(None, {self.input_name: tensor})[0][0]
+
+    def resolve_size(self, input_size: Optional[int]) -> int:
+        """Input size actually used for a requested size"""
+        return input_size if input_size and self.dynamic_size else self.input_size
+
+    def predict(
+        self,
+        img: np.ndarray,
+        confidence_threshold: float,
+        input_size: Optional[int] = None
+    ) -> List[DetectionResult]:
+        """
+        Detect objects in an image
+
+        Args:
+            img: Input image (BGR format)
+            confidence_threshold: Minimum score to keep a detection
+            input_size: Square input size for this image (ignored by models
+                with a fixed input shape)
+
+        Returns:
+            Detections in original-image coordinates
+        """
+        tensor, scale, pad = to_model_input(img, self.resolve_size(input_size))
+        return self._decode(self.forward(tensor), img.shape, scale, pad, confidence_threshold)
+
+    def predict_batch(
+        self,
+        imgs: Sequence[np.ndarray],
+        confidence_threshold: float,
+        input_size: Optional[int] = None
+    ) -> List[List[DetectionResult]]:
+        """
+        Detect objects in several images with one forward pass
+
+        Models exported with a fixed batch size of 1 run one pass per image.
+
+        Args:
+            imgs: Input images (BGR format)
+            confidence_threshold: Minimum score to keep a detection
+            input_size: Square input size of the batch (ignored by models
+                with a fixed input shape)
+
+        Returns:
+            Detections per image, in original-image coordinates
+        """
+        size = self.resolve_size(input_size)
+        inputs = [to_model_input(img, size) for img in imgs]
+        if self.dynamic_batch and len(inputs) > 1:
+            batch = np.concatenate([tensor for tensor, _, _ in inputs])
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            outputs = [self.forward(tensor) for tensor, _, _ in inputs]
+        return [
+            self._decode(output, img.shape, scale, pad, confidence_threshold)
+            for output, img, (_, scale, pad) in zip(outputs, imgs, inputs)
+        ]
+
+    def _decode(
+        self,
+        output: np.ndarray,
+        shape: Tuple[int, ...],
+        scale: float,
+        pad: Tuple[int, int],
+        confidence_threshold: float
+    ) -> List[DetectionResult]:
+        """Map raw (N, 6) output rows above the threshold to detections"""
+        height, width = shape[:2]
+        pad_x, pad_y = pad
+        keep = output[output[:, 4] >= confidence_threshold]
+        boxes = keep[:, :4].copy()
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / scale).clip(0, width)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / scale).clip(0, height)
+
+        detections = []
+        for (x1, y1, x2, y2), score, cls in zip(boxes.tolist(), keep[:, 4].tolist(), keep[:, 5].tolist()):
+            cls = int(cls)
+            detections.append(DetectionResult.model_construct(
+                class_name=self.class_names.get(cls, str(cls)),
+                confidence=validate_confidence(score),
+                bounding_box=BoundingBox.model_construct(x1=x1, y1=y1, x2=x2, y2=y2)
+            ))
+        return detections
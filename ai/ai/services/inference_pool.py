@@ -0,0 +1,168 @@
+"""
+Inference Worker Pool for BUCChain AI
+
+Runs model inference in separate processes so CPU-bound inference does not
+compete with the API process for the GIL. Images reach the workers through
+a SharedFrameRing: the API process writes each frame into a shared-memory
+slot and submits only its handle, and the worker reads the frame in place.
+Frames that do not fit (or arrive while every slot is busy) fall back to
+being pickled.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ai.models.predictions import DetectionResult
+from ai.utils.shared_frames import FrameHandle, FrameRingFull, SharedFrame, SharedFrameRing
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of a worker, set by _init_worker
+_worker_ring: Optional[SharedFrameRing] = None
+
+
+def _init_worker(ring_name: str):
+    """Set up logging, load the model and attach to the frame ring (runs in each worker)"""
+    global _worker_ring
+    from ai.services.ml_service import ml_service
+    from ai.utils.config import cpu_resources, settings
+    from ai.utils.logging_config import configure_logging
+    # Same format and log file as the API process, which owns rotation
+    configure_logging(settings, rotate=False)
+    cpu_resources.apply()
+    ml_service.inference_processes = 0
+    ml_service.cascade_enabled = False
+    ml_service.load_model()
+    _worker_ring = SharedFrameRing.attach(ring_name)
+
+
+def _worker_status() -> Dict:
+    """Report the worker's model state"""
+    from ai.services.ml_service import ml_service
+    return {
+        "model_loaded": ml_service.is_model_loaded,
+        "model_name": ml_service.model_name,
+        "dynamic_input": ml_service.dynamic_input,
+        "input_latency_ms": ml_service.resolution.calibrated_ms if ml_service.resolution else {}
+    }
+
+
+def _worker_predict(
+    frame,
+    confidence_threshold: float,
+    input_size: Optional[int] = None
+) -> List[DetectionResult]:
+    """Run inference on a FrameHandle (read in place) or a pickled array"""
+    from ai.services.ml_service import ml_service
+    img = _worker_ring.view(frame) if isinstance(frame, FrameHandle) else frame
+    return ml_service.predict(img, confidence_threshold, input_size)
+
+
+class InferencePool:
+    """Process pool fed through a shared-memory frame ring"""
+
+    def __init__(self, processes: int, slots: int, slot_bytes: int):
+        """
+        Args:
+            processes: Number of worker processes
+            slots: Frame ring slots (bounds frames in flight without pickling)
+            slot_bytes: Capacity of each slot in bytes
+        """
+        self.processes = processes
+        self.frames = SharedFrameRing(slots, slot_bytes)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.shared = 0
+        self.pickled = 0
+        self.restarts = 0
+
+    def start(self) -> Dict:
+        """
+        Start the workers and wait until they have loaded the model
+
+        Returns:
+            Model state reported by a worker
+        """
+        # spawn: forking the API process would copy its event loop and threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.frames.name,)
+        )
+        status = self.executor.submit(_worker_status).result()
+        logger.info("Inference pool started: %s processes, ring %s", self.processes, self.frames.name)
+        return status
+
+    async def predict(
+        self,
+        img: np.ndarray,
+        confidence_threshold: float,
+        input_size: Optional[int] = None
+    ) -> List[DetectionResult]:
+        """
+        Run inference on an image in a worker process
+
+        Args:
+            img: Preprocessed image; a SharedFrame is handed over without a copy
+            confidence_threshold: Minimum score to keep a detection
+            input_size: Optional model input size for this image
+
+        Returns:
+            List of detection results
+        """
+        frame = img if isinstance(img, SharedFrame) and img.handle is not None else None
+        if frame is not None:
+            frame.ring.retain(frame.handle)
+        else:
+            try:
+                frame = self.frames.put(img)
+            except FrameRingFull:
+                frame = None
+
+        payload = frame.handle if frame is not None else img
+        if frame is not None:
+            self.shared += 1
+        else:
+            self.pickled += 1
+
+        executor = self.executor
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, _worker_predict, payload, confidence_threshold, input_size)
+        except BrokenProcessPool:
+            # A worker died; the slot reference is still ours, so nothing leaks.
+            # Only the first request to see the failure restarts the pool.
+            if executor is self.executor:
+                logger.error("Inference worker crashed; restarting pool")
+                self.restarts += 1
+                executor.shutdown(wait=False, cancel_futures=True)
+                await asyncio.to_thread(self.start)
+            raise
+        finally:
+            if frame is not None:
+                frame.ring.release(frame.handle)
+
+    def get_stats(self) -> Dict:
+        """Frame handoff counters"""
+        return {
+            "processes": self.processes,
+            "slots": self.frames.slots,
+            "slots_in_use": self.frames.slots_in_use,
+            "shared": self.shared,
+            "pickled": self.pickled,
+            "restarts": self.restarts
+        }
+
+    def shutdown(self):
+        """Stop the workers and remove the frame ring"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self.frames.unlink()
+
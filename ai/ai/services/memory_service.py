@@ -0,0 +1,363 @@
+"""
+Memory watchdog for BUCChain AI
+
+Long-running workers grow in RSS: OpenCV and glibc keep freed buffers of
+large decoded images around, and Python objects accumulate. The watchdog
+samples the process RSS every MEMORY_CHECK_INTERVAL_S (a read of
+/proc/self/statm). Past MEMORY_SOFT_LIMIT_MB it first runs the garbage
+collector and malloc_trim; if that does not bring RSS back under the limit,
+the worker recycles: admission control stops taking new work, in-flight
+images drain, and the process shuts itself down gracefully with SIGTERM so
+that its supervisor (the pre-fork master, `uvicorn --workers`, systemd or
+the container runtime) starts a fresh one, instead of the OOM killer taking
+the worker mid-request.
+
+tracemalloc is off by default (it slows allocation-heavy code down). It is
+started on demand by the allocation dump endpoint, or at startup with
+MEMORY_TRACE_AT_STARTUP.
+"""
+
+import asyncio
+import ctypes
+import gc
+import logging
+import os
+import signal
+import sys
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Optional, Tuple
+
+from ai.models.analytics import AllocationReport, AllocationSite, MemoryStats, MemoryStatus
+from ai.services.admission_service import AdmissionController, admission_controller
+from ai.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+STATE_OK = "ok"
+STATE_DRAINING = "draining"
+
+# Reason reported to requests refused while the worker drains
+RECYCLE_SHED_REASON = "memory_recycle"
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Only report growth once the samples span this long
+MIN_GROWTH_SPAN = 60.0
+
+# Leave the tracer's and the dump's own bookkeeping and import machinery out
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>")
+)
+
+
+def read_rss() -> int:
+    """
+    Current resident set size of this process
+
+    Returns:
+        RSS in bytes (the peak RSS where /proc is not available)
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _load_malloc_trim():
+    """glibc's malloc_trim, which returns free heap pages to the OS"""
+    try:
+        return ctypes.CDLL("libc.so.6").malloc_trim
+    except (OSError, AttributeError):
+        return None
+
+
+class MemoryWatchdog:
+    """Samples RSS and recycles the worker past a soft limit"""
+
+    def __init__(
+        self,
+        soft_limit_mb: Optional[float] = None,
+        check_interval: Optional[float] = None,
+        drain_timeout: Optional[float] = None,
+        admission: Optional[AdmissionController] = None,
+        window: int = 120
+    ):
+        """
+        Initialize memory watchdog
+
+        Args:
+            soft_limit_mb: RSS in MB at which the worker recycles (0 never)
+            check_interval: Seconds between RSS samples
+            drain_timeout: Maximum seconds to wait for in-flight work
+            admission: Admission controller to close while draining
+            window: Number of recent samples used for the growth rate
+        """
+        soft_limit_mb = soft_limit_mb if soft_limit_mb is not None else settings.memory_soft_limit_mb
+        self.soft_limit: Optional[int] = int(soft_limit_mb * MB) if soft_limit_mb > 0 else None
+        self.check_interval = check_interval or settings.memory_check_interval_s
+        self.drain_timeout = drain_timeout if drain_timeout is not None else settings.memory_drain_timeout_s
+        self.admission = admission or admission_controller
+
+        self.state = STATE_OK
+        self.rss = read_rss()
+        self.peak_rss = self.rss
+        self.samples = 0
+        self._history: Deque[Tuple[float, int]] = deque(maxlen=window)
+
+        self.reclaims = 0
+        self.reclaimed = 0
+        self.recycle_reason: Optional[str] = None
+        self.draining_since: Optional[datetime] = None
+
+        self.tracing_since: Optional[datetime] = None
+        self._last_sites: Dict[str, int] = {}
+        self._malloc_trim = _load_malloc_trim()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start sampling in the background (call from the running event loop)"""
+        if settings.memory_trace_at_startup:
+            self.start_tracing()
+        if self.soft_limit and self.rss >= self.soft_limit:
+            logger.warning(
+                "RSS %.0f MB is already over MEMORY_SOFT_LIMIT_MB at startup; the worker will recycle continuously",
+                self.rss / MB
+            )
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                "Memory watchdog started: rss=%.0f MB, soft_limit=%s",
+                self.rss / MB,
+                f"{self.soft_limit / MB:.0f} MB" if self.soft_limit else "none"
+            )
+
+    async def stop(self):
+        """Stop sampling"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                if await self.check():
+                    return
+            except Exception as e:
+                logger.error("Memory check failed: %s", e, exc_info=True)
+
+    def sample(self, record: bool = True) -> int:
+        """
+        Take an RSS sample
+
+        Args:
+            record: Add the sample to the growth window (off for samples
+                taken on request, which would skew the spacing)
+
+        Returns:
+            RSS in bytes
+        """
+        self.rss = read_rss()
+        self.peak_rss = max(self.peak_rss, self.rss)
+        if record:
+            self.samples += 1
+            self._history.append((time.monotonic(), self.rss))
+        return self.rss
+
+    async def check(self) -> bool:
+        """
+        Sample RSS and recycle the worker if it stays over the soft limit
+
+        Returns:
+            True if the worker is recycling
+        """
+        rss = self.sample()
+        if self.soft_limit is None or self.state != STATE_OK or rss < self.soft_limit:
+            return False
+
+        rss = await asyncio.to_thread(self.reclaim)
+        if rss < self.soft_limit:
+            return False
+
+        await self.recycle(f"rss {rss / MB:.0f} MB over soft limit {self.soft_limit / MB:.0f} MB")
+        return True
+
+    def reclaim(self) -> int:
+        """
+        Collect garbage and return free heap pages to the OS
+
+        Returns:
+            RSS in bytes afterwards
+        """
+        before = read_rss()
+        gc.collect()
+        if self._malloc_trim is not None:
+            self._malloc_trim(0)
+        after = self.sample(record=False)
+        self.reclaims += 1
+        self.reclaimed += max(0, before - after)
+        logger.info("Memory reclaim: rss %.0f MB -> %.0f MB", before / MB, after / MB)
+        return after
+
+    async def recycle(self, reason: str):
+        """
+        Stop admitting work, drain in-flight images and shut the worker down
+
+        Args:
+            reason: Why the worker recycles (logged and reported)
+        """
+        self.state = STATE_DRAINING
+        self.recycle_reason = reason
+        self.draining_since = datetime.now()
+        logger.warning("Recycling worker %s: %s", os.getpid(), reason)
+
+        self.admission.close(RECYCLE_SHED_REASON)
+        if not await self.admission.drain(self.drain_timeout):
+            logger.warning(
+                "Drain timed out after %.0fs with %s images in flight",
+                self.drain_timeout, self.admission.in_flight
+            )
+        # uvicorn shuts down gracefully on SIGTERM: open connections finish
+        # and the shutdown handlers run before the process exits
+        logger.warning("Worker %s drained; exiting for restart", os.getpid())
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def start_tracing(self, frames: Optional[int] = None):
+        """
+        Start tracing Python allocations with tracemalloc
+
+        Args:
+            frames: Stack frames kept per allocation (more frames cost more)
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or settings.memory_trace_frames)
+            self.tracing_since = datetime.now()
+            self._last_sites = {}
+            logger.info("tracemalloc started (%s frames)", tracemalloc.get_traceback_limit())
+
+    def stop_tracing(self):
+        """Stop tracing and free the tracer's memory"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+        self.tracing_since = None
+        self._last_sites = {}
+
+    def top_allocations(self, limit: int = 20) -> AllocationReport:
+        """
+        Dump the largest live allocation sites
+
+        Starts tracing if it is off; the first dump is then empty.
+
+        Args:
+            limit: Number of sites to return
+
+        Returns:
+            AllocationReport with sizes and the change since the last dump
+        """
+        if not tracemalloc.is_tracing():
+            self.start_tracing()
+            return AllocationReport(
+                pid=os.getpid(),
+                tracing=True,
+                tracing_since=self.tracing_since,
+                rss_mb=self.sample(record=False) / MB,
+                note="tracemalloc started now; allocations made from here on appear in the next dump",
+                timestamp=datetime.now()
+            )
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        group = "traceback" if tracemalloc.get_traceback_limit() > 1 else "lineno"
+        stats = snapshot.statistics(group)
+        sites = {
+            " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in reversed(stat.traceback)): stat
+            for stat in stats
+        }
+        previous = self._last_sites
+        self._last_sites = {location: stat.size for location, stat in sites.items()}
+
+        return AllocationReport(
+            pid=os.getpid(),
+            tracing=True,
+            tracing_since=self.tracing_since,
+            traced_mb=tracemalloc.get_traced_memory()[0] / MB,
+            rss_mb=self.sample(record=False) / MB,
+            sites=[
+                AllocationSite(
+                    location=location,
+                    size_kb=stat.size / 1024,
+                    count=stat.count,
+                    size_diff_kb=(stat.size - previous.get(location, 0)) / 1024 if previous else None
+                )
+                for location, stat in list(sites.items())[:limit]
+            ],
+            timestamp=datetime.now()
+        )
+
+    def status(self) -> MemoryStatus:
+        """
+        Get the memory state reported by /health
+
+        Returns:
+            MemoryStatus with current and peak RSS
+        """
+        return MemoryStatus(
+            rss_mb=self.rss / MB,
+            peak_rss_mb=self.peak_rss / MB,
+            soft_limit_mb=self.soft_limit / MB if self.soft_limit else None,
+            state=self.state
+        )
+
+    def get_stats(self) -> MemoryStats:
+        """
+        Get memory watchdog statistics
+
+        Returns:
+            MemoryStats with RSS, growth rate, reclaim and tracing state
+        """
+        self.sample(record=False)
+        growth = None
+        if len(self._history) > 1:
+            (start, first), (end, last) = self._history[0], self._history[-1]
+            if end - start >= MIN_GROWTH_SPAN:
+                growth = (last - first) / MB / (end - start) * 3600
+        traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+
+        return MemoryStats(
+            pid=os.getpid(),
+            state=self.state,
+            rss_mb=self.rss / MB,
+            peak_rss_mb=self.peak_rss / MB,
+            soft_limit_mb=self.soft_limit / MB if self.soft_limit else None,
+            growth_mb_per_hour=growth,
+            samples=self.samples,
+            check_interval_seconds=self.check_interval,
+            reclaims=self.reclaims,
+            reclaimed_mb=self.reclaimed / MB,
+            recycle_reason=self.recycle_reason,
+            draining_since=self.draining_since,
+            tracing=traced is not None,
+            traced_mb=traced[0] / MB if traced else None,
+            traced_peak_mb=traced[1] / MB if traced else None,
+            timestamp=datetime.now()
+        )
+
+
+# Global memory watchdog instance
+memory_watchdog = MemoryWatchdog()
@@ -4,16 +4,36 @@ Machine Learning Service for BUCChain AI
 Handles model loading, inference, and result post-processing.
 """
 
+import asyncio
 import numpy as np
 import cv2
 import time
 import logging
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 
-from ai.models.predictions import DetectionResult, DetectionResponse, ImageMetadata, BoundingBox
-from ai.utils.config import settings
-from ai.utils.helpers import preprocess_image, format_image_metadata
+from ai.models.analytics import ResolutionStats
+from ai.models.predictions import (
+    DetectionResult,
+    DetectionResponse,
+    ImageMetadata,
+    ImageQuality,
+    BoundingBox
+)
+from ai.services.cascade_service import SCREEN_STAGE
+from ai.utils.config import settings, cpu_resources
+from ai.utils.logging_config import SAMPLED
+from ai.utils.quality import assess_image_quality
+from ai.utils.resolution import ResolutionSelector
+from ai.utils.helpers import (
+    preprocess_image,
+    format_image_metadata,
+    fit_within,
+    find_salient_region,
+    StageTimer
+)
+from ai.utils.image_formats import source_size
+from ai.utils.shared_frames import FrameRingFull, SharedFrameRing, release_frame
 
 logger = logging.getLogger(__name__)
 
@@ -24,19 +44,74 @@ class MLService:
     def __init__(self):
         self.model = None
         self.model_name = settings.model_name
-        self.model_path = settings.model_path
+        self.model_path = settings.active_model_path
         self.confidence_threshold = settings.confidence_threshold
+        self.roi_crop_enabled = settings.roi_crop_enabled
+        self.quality_gate_enabled = settings.quality_gate_enabled
+        self.inference_processes = settings.inference_processes
+        self.intra_op_threads: Optional[int] = cpu_resources.threads
+        self.cascade_enabled = settings.cascade_enabled
+        self.adaptive_resolution_enabled = settings.adaptive_resolution_enabled
+        self.pool = None
+        self.cascade = None
+        self.resolution: Optional[ResolutionSelector] = None
+        self.batcher = None
+        # Whether the model runs at a requested input size (dynamic-shape
+        # ONNX export); fixed-size exports letterbox every image to their size
+        self.dynamic_input = False
         self._model_loaded = False
         
     def load_model(self):
         """
         Load the ML model (YOLOv10)
         
-        Note: Currently a placeholder until model weights are available.
-        When ready, uncomment the ultralytics import and model loading.
+        ONNX exports (FP32, or INT8 when MODEL_PRECISION=int8) are served
+        with ONNX Runtime. PyTorch weights are still a placeholder: when
+        ready, uncomment the ultralytics import and model loading.
+        
+        With INFERENCE_PROCESSES > 0 the model is loaded in worker
+        processes instead, fed through a shared-memory frame ring.
+        
+        With CASCADE_ENABLED a screening model is loaded next to the ONNX
+        model, which then only sees images the screen is unsure about.
+        
+        With ADAPTIVE_RESOLUTION_ENABLED and an ONNX export with dynamic
+        height and width, each image runs at an input size picked from
+        its content; the sizes are timed once here.
         """
         try:
-            if settings.model_exists:
+            if self.inference_processes > 0:
+                if self.cascade_enabled:
+                    logger.warning("Model cascade is not available with INFERENCE_PROCESSES > 0; disabled")
+                from ai.services.inference_pool import InferencePool
+                self.pool = InferencePool(
+                    self.inference_processes,
+                    settings.frame_ring_slots,
+                    settings.frame_slot_mb * 1024 * 1024
+                )
+                status = self.pool.start()
+                self._model_loaded = status["model_loaded"]
+                self.model_name = status["model_name"]
+                self.dynamic_input = status["dynamic_input"]
+                if status.get("input_latency_ms"):
+                    # Workers picked up the sizes and timed them
+                    self.resolution = self._resolution_selector()
+                    self.resolution.calibrated_ms = status["input_latency_ms"]
+                return
+            
+            if settings.model_exists and self.model_path.endswith(".onnx"):
+                from ai.services.inference_backend import OnnxDetector
+                self.model = OnnxDetector(self.model_path, settings.model_input_size, self.intra_op_threads)
+                self._model_loaded = True
+                self.dynamic_input = self.model.dynamic_size
+                if settings.model_precision.lower() == "int8":
+                    self.model_name = f"{settings.model_name}-int8"
+                logger.info("Model loaded successfully: %s", self.model_name)
+                if self.cascade_enabled:
+                    self._load_cascade()
+                if self.adaptive_resolution_enabled:
+                    self._load_adaptive_resolution()
+            elif settings.model_exists:
                 # TODO: Uncomment when model weights are available
                 # from ultralytics import YOLO
                 # self.model = YOLO(self.model_path)
@@ -44,28 +119,115 @@ class MLService:
                 # logger.info(f"Model loaded successfully: {self.model_name}")
                 
                 logger.warning(
-                    f"Model file found at {self.model_path} but loading is disabled. "
-                    "Using mock inference."
+                    "Model file found at %s but loading is disabled. "
+                    "Using mock inference.",
+                    self.model_path
                 )
             else:
                 logger.warning(
-                    f"Model weights not found at {self.model_path}. "
+                    "Model weights not found at %s. "
                     "Using mock inference. To enable real detection, "
-                    "download YOLOv10 weights to the models/weights directory."
+                    "download YOLOv10 weights to the models/weights directory.",
+                    self.model_path
                 )
+            if self.cascade_enabled and self.model is None:
+                logger.warning("Model cascade needs an ONNX model; disabled")
+            if self.adaptive_resolution_enabled and self.model is None:
+                logger.warning("Adaptive input resolution needs an ONNX model; disabled")
         except Exception as e:
-            logger.error(f"Error loading model: {e}")
+            logger.error("Error loading model: %s", e)
             logger.warning("Falling back to mock inference")
+            if self.pool is not None:
+                self.shutdown()
+    
+    def _load_cascade(self):
+        """Load the screening model and put it in front of the loaded model"""
+        from ai.services.cascade_service import ModelCascade
+        from ai.services.inference_backend import OnnxDetector
+        screen_path = settings.cascade_screen_model_path or self.model_path
+        try:
+            screen = OnnxDetector(screen_path, settings.cascade_screen_input_size, self.intra_op_threads)
+        except Exception as e:
+            logger.error("Error loading screening model %s: %s; cascade disabled", screen_path, e)
+            return
+        self.cascade = ModelCascade(
+            screen,
+            self.model,
+            settings.cascade_band_low,
+            settings.cascade_band_high,
+            settings.cascade_batch_size,
+            settings.cascade_batch_window_ms / 1000
+        )
+        logger.info(
+            "Model cascade enabled: %s at %s px screens, band [%.2f, %.2f)",
+            screen_path, screen.input_size, settings.cascade_band_low, settings.cascade_band_high
+        )
+    
+    def _resolution_selector(self) -> ResolutionSelector:
+        return ResolutionSelector(settings.adaptive_sizes, settings.adaptive_thresholds)
+    
+    def _load_adaptive_resolution(self):
+        """Time the supported input sizes and start picking them per image"""
+        from ai.services.batching_service import InferenceBatcher
+        if not self.model.dynamic_size:
+            logger.warning(
+                "Adaptive input resolution needs an ONNX export with dynamic height and width "
+                "(yolo export ... dynamic=True); %s has a fixed %s px input, disabled",
+                self.model_path, self.model.input_size
+            )
+            return
+        try:
+            selector = self._resolution_selector()
+        except ValueError as e:
+            logger.error("Invalid adaptive resolution settings: %s; disabled", e)
+            return
+        selector.calibrate(lambda img, size: self.model.predict(img, 1.0, size))
+        self.resolution = selector
+        if self.cascade is None:
+            # The cascade batches its escalations per size on its own
+            self.batcher = InferenceBatcher(
+                self.model,
+                settings.adaptive_batch_size,
+                settings.adaptive_batch_window_ms / 1000
+            )
+        logger.info(
+            "Adaptive input resolution enabled: %s",
+            ", ".join(f"{size} px {ms:.1f} ms" for size, ms in selector.calibrated_ms.items())
+        )
     
     @property
     def is_model_loaded(self) -> bool:
         """Check if model is loaded"""
         return self._model_loaded
     
+    @property
+    def reduced_input_supported(self) -> bool:
+        """
+        Whether a smaller input size cuts inference work
+        
+        True for dynamic-shape exports and for mock inference; a fixed-size
+        export letterboxes a degraded image back up to its input size.
+        """
+        return self.dynamic_input or not self._model_loaded
+    
+    @property
+    def frames(self) -> Optional[SharedFrameRing]:
+        """Shared-memory frame ring of the inference workers, if any"""
+        return self.pool.frames if self.pool is not None else None
+    
+    def shutdown(self):
+        """Stop inference worker processes"""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+    
     async def detect(
         self,
         img: np.ndarray,
-        filename: str
+        filename: str,
+        input_size: Optional[int] = None,
+        timings: Optional[Dict[str, float]] = None,
+        batcher=None
     ) -> DetectionResponse:
         """
         Perform counterfeit detection on an image
@@ -73,22 +235,105 @@ class MLService:
         Args:
             img: Input image (BGR format)
             filename: Original filename
+            input_size: Optional longest-side size to downscale to before
+                inference (used by admission control to degrade under load)
+            timings: Optional dict that receives seconds spent per stage
+                (quality, roi, preprocess, inference, postprocess)
+            batcher: Optional InferenceBatcher shared with other images of
+                the same request (see detect_many)
             
         Returns:
-            DetectionResponse with results and metadata
+            DetectionResponse with results and metadata, or a retake_photo
+            response if the image failed the quality gate
         """
         start_time = time.time()
+        timer = StageTimer(timings)
         
         try:
-            # Preprocess image
-            processed_img = preprocess_image(img)
+            # Fail fast on images that would only give unreliable verdicts
+            quality = None
+            if self.quality_gate_enabled:
+                quality = assess_image_quality(img)
+                timer.mark("quality")
+                if not quality.passed:
+                    return self._retake_response(img, filename, quality, start_time)
             
-            if self._model_loaded and self.model is not None:
-                # Real inference
-                detections = await self._run_inference(processed_img)
-            else:
-                # Mock inference
-                detections = self._mock_inference(processed_img)
+            # Crop to the salient product region so the model input is
+            # spent on the item rather than the background
+            model_img, offset = img, (0, 0)
+            if self.roi_crop_enabled:
+                region = find_salient_region(
+                    img,
+                    margin=settings.roi_margin,
+                    min_area_ratio=settings.roi_min_area_ratio
+                )
+                if region:
+                    x, y, w, h = region
+                    model_img, offset = img[y:y + h, x:x + w], (x, y)
+                timer.mark("roi")
+            
+            # Pick the model input size from the image content (never above
+            # the degraded size)
+            model_size, density = None, 0.0
+            if self.resolution is not None:
+                model_size, density = self.resolution.select(model_img, input_size)
+            elif input_size is not None and self.dynamic_input:
+                # Degraded images run the model at the reduced size
+                model_size = input_size
+            
+            # Preprocess image (straight into a shared-memory slot when
+            # inference runs in worker processes)
+            target_size = fit_within(model_img, input_size)
+            degraded = target_size is not None
+            if model_size is not None:
+                target_size = fit_within(model_img, model_size) or target_size
+            slot = self._frame_slot(model_img, target_size)
+            try:
+                processed_img = preprocess_image(model_img, target_size, out=slot)
+                timer.mark("preprocess")
+                
+                stage = None
+                inference_started = time.perf_counter()
+                if self.cascade is not None:
+                    # Screening model first, uncertain images go to the full model
+                    detections, stage = await self.cascade.predict(
+                        processed_img, self.confidence_threshold, model_size
+                    )
+                elif self.pool is not None:
+                    # Inference worker processes read the frame in place
+                    detections = await self.pool.predict(processed_img, self.confidence_threshold, model_size)
+                elif (batcher or self.batcher) is not None:
+                    # Images of the same input size share forward passes
+                    detections = await (batcher or self.batcher).predict(
+                        processed_img, self.confidence_threshold, model_size
+                    )
+                elif self._model_loaded and self.model is not None:
+                    # Real inference
+                    detections = await self._run_inference(processed_img, model_size)
+                else:
+                    # Mock inference (off the event loop so admission control
+                    # can keep making decisions while images are processed)
+                    detections = await asyncio.to_thread(self._mock_inference, processed_img)
+            finally:
+                # Free the slot even when preprocessing or inference failed
+                if slot is not None:
+                    release_frame(slot)
+            if self.resolution is not None and stage != SCREEN_STAGE:
+                self.resolution.record(model_size, density, time.perf_counter() - inference_started)
+            timer.mark("inference")
+            
+            if target_size or offset != (0, 0):
+                scale_x = model_img.shape[1] / target_size[0] if target_size else 1.0
+                scale_y = model_img.shape[0] / target_size[1] if target_size else 1.0
+                detections = self._rescale_detections(detections, scale_x, scale_y, offset)
+            
+            # Images decoded from an embedded preview report boxes in
+            # full-resolution pixels
+            width, height = source_size(img)
+            if (width, height) != (img.shape[1], img.shape[0]):
+                detections = self._rescale_detections(
+                    detections, width / img.shape[1], height / img.shape[0]
+                )
             
             # Calculate overall confidence and counterfeit status
             is_counterfeit = len(detections) > 0
@@ -96,64 +341,175 @@ class MLService:
             
             # Get image metadata
             metadata_dict = format_image_metadata(img, filename)
-            image_metadata = ImageMetadata(**metadata_dict)
+            image_metadata = ImageMetadata.model_construct(**metadata_dict)
             
             processing_time = time.time() - start_time
             
-            response = DetectionResponse(
+            # Results are built from trusted values, so skip re-validation
+            response = DetectionResponse.model_construct(
                 is_counterfeit=is_counterfeit,
                 confidence=confidence,
                 detections=detections,
                 image_metadata=image_metadata,
                 processing_time_seconds=processing_time,
                 timestamp=datetime.now(),
-                model_version=self.model_name
+                model_version=self.model_name,
+                degraded=degraded,
+                status="completed",
+                quality=quality,
+                stage=stage
             )
+            timer.mark("postprocess")
             
             logger.info(
-                f"Detection completed: {filename}, "
-                f"counterfeit={is_counterfeit}, "
-                f"confidence={confidence:.2f}, "
-                f"time={processing_time:.2f}s"
+                "Detection completed: %s, "
+                "counterfeit=%s, "
+                "confidence=%.2f, "
+                "time=%.2fs",
+                filename, is_counterfeit, confidence, processing_time,
+                extra=SAMPLED
             )
             
             return response
             
         except Exception as e:
-            logger.error(f"Error during detection: {e}", exc_info=True)
+            logger.error("Error during detection: %s", e, exc_info=True)
             raise
     
-    async def _run_inference(self, img: np.ndarray) -> List[DetectionResult]:
+    def _retake_response(
+        self,
+        img: np.ndarray,
+        filename: str,
+        quality: ImageQuality,
+        start_time: float
+    ) -> DetectionResponse:
+        """
+        Build the response for an image rejected by the quality gate
+        
+        Args:
+            img: Decoded image
+            filename: Original filename
+            quality: Failed quality assessment
+            start_time: Request start time
+            
+        Returns:
+            DetectionResponse with status retake_photo and no verdict
+        """
+        logger.info("Quality gate rejected %s: %s", filename, quality.issues, extra=SAMPLED)
+        return DetectionResponse.model_construct(
+            is_counterfeit=False,
+            confidence=0.0,
+            detections=[],
+            image_metadata=ImageMetadata.model_construct(**format_image_metadata(img, filename)),
+            processing_time_seconds=time.time() - start_time,
+            timestamp=datetime.now(),
+            model_version=self.model_name,
+            degraded=False,
+            status="retake_photo",
+            quality=quality,
+            stage=None
+        )
+    
+    def _frame_slot(
+        self,
+        img: np.ndarray,
+        target_size: Optional[Tuple[int, int]]
+    ) -> Optional[np.ndarray]:
+        """
+        Reserve a shared-memory slot for the resized model input
+        
+        Args:
+            img: Image about to be resized
+            target_size: Resize target (width, height), or None
+            
+        Returns:
+            Slot-backed array, or None if there is no worker pool, no resize,
+            or no free slot
+        """
+        if self.pool is None or not target_size:
+            return None
+        try:
+            return self.pool.frames.allocate((target_size[1], target_size[0]) + img.shape[2:], img.dtype)
+        except FrameRingFull:
+            return None
+    
+    def predict(
+        self,
+        img: np.ndarray,
+        confidence_threshold: float,
+        input_size: Optional[int] = None
+    ) -> List[DetectionResult]:
+        """
+        Run inference synchronously (entry point of inference workers)
+        
+        Args:
+            img: Preprocessed image
+            confidence_threshold: Minimum score to keep a detection
+            input_size: Optional model input size for this image
+            
+        Returns:
+            List of detection results
+        """
+        if self._model_loaded and self.model is not None:
+            return self.model.predict(img, confidence_threshold, input_size)
+        return self._mock_inference(img)
+    
+    async def _run_inference(
+        self,
+        img: np.ndarray,
+        input_size: Optional[int] = None
+    ) -> List[DetectionResult]:
         """
         Run actual model inference
         
         Args:
             img: Preprocessed image
+            input_size: Model input size (None for the model's default;
+                only honoured by dynamic-shape exports)
             
         Returns:
             List of detection results
         """
-        # TODO: Implement when model is loaded
-        # results = self.model(img, conf=self.confidence_threshold)
-        # detections = []
-        # for r in results:
-        #     boxes = r.boxes
-        #     for box in boxes:
-        #         x1, y1, x2, y2 = box.xyxy[0].tolist()
-        #         conf = float(box.conf[0])
-        #         cls = int(box.cls[0])
-        #         class_name = self.model.names[cls]
-        #         
-        #         detection = DetectionResult(
-        #             class_name=class_name,
-        #             confidence=conf,
-        #             bounding_box=BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2)
-        #         )
-        #         detections.append(detection)
-        # 
-        # return detections
+        return await asyncio.to_thread(
+            self.model.predict, img, self.confidence_threshold, input_size
+        )
+    
+    @staticmethod
+    def _rescale_detections(
+        detections: List[DetectionResult],
+        scale_x: float,
+        scale_y: float,
+        offset: Tuple[int, int] = (0, 0)
+    ) -> List[DetectionResult]:
+        """
+        Map bounding boxes from the model input back to the original image
         
-        return []
+        Args:
+            detections: Detections in model-input coordinates
+            scale_x: Cropped width / resized width
+            scale_y: Cropped height / resized height
+            offset: (x, y) of the crop within the original image
+            
+        Returns:
+            Detections in original-image coordinates
+        """
+        offset_x, offset_y = offset
+        rescaled = []
+        for d in detections:
+            box = d.bounding_box
+            if box is not None:
+                box = BoundingBox.model_construct(
+                    x1=box.x1 * scale_x + offset_x,
+                    y1=box.y1 * scale_y + offset_y,
+                    x2=box.x2 * scale_x + offset_x,
+                    y2=box.y2 * scale_y + offset_y
+                )
+            rescaled.append(DetectionResult.model_construct(
+                class_name=d.class_name,
+                confidence=d.confidence,
+                bounding_box=box
+            ))
+        return rescaled
     
     def _mock_inference(self, img: np.ndarray) -> List[DetectionResult]:
         """
@@ -191,6 +547,87 @@ class MLService:
             results.append(result)
         
         return results
+    
+    async def detect_many(
+        self,
+        images: List[Tuple[np.ndarray, str]],
+        input_size: Optional[int] = None
+    ) -> List[DetectionResponse]:
+        """
+        Detect several images of one request together
+        
+        The images are submitted at once, so same-size model inputs share
+        forward passes (predict_batch) instead of running one after another.
+        Used for the keyframes of a clip or photo burst.
+        
+        Args:
+            images: List of (image, filename) tuples
+            input_size: Optional longest-side size to downscale to before
+                inference (used by admission control to degrade under load)
+            
+        Returns:
+            Detection responses in the order of the images
+        """
+        batcher = None
+        if (
+            len(images) > 1 and self.batcher is None and self.cascade is None
+            and self.pool is None and self._model_loaded and self.model is not None
+        ):
+            from ai.services.batching_service import InferenceBatcher
+            # Images rejected by the quality gate never reach the batcher;
+            # the window flushes a batch left short by them
+            batcher = InferenceBatcher(
+                self.model,
+                len(images),
+                settings.adaptive_batch_window_ms / 1000
+            )
+        return list(await asyncio.gather(*(
+            self.detect(img, filename, input_size=input_size, batcher=batcher)
+            for img, filename in images
+        )))
+    
+    def get_resolution_stats(self) -> ResolutionStats:
+        """
+        Get adaptive input resolution statistics
+        
+        Returns:
+            ResolutionStats (enabled=False when adaptive resolution is not active)
+        """
+        if self.resolution is None:
+            return ResolutionStats(enabled=False)
+        stats = self.resolution.get_stats(dynamic_input=True)
+        if self.batcher is not None and self.batcher.batches:
+            stats.batches = self.batcher.batches
+            stats.average_batch_size = self.batcher.batched_images / self.batcher.batches
+        return stats
+    
+    @staticmethod
+    def fuse_results(results: List[DetectionResponse]) -> Tuple[bool, float, int]:
+        """
+        Fuse per-frame detections of the same item into one verdict
+        
+        Each completed frame contributes its probability of the item being
+        counterfeit (its confidence, or one minus it for an authentic
+        verdict); the fused verdict is counterfeit when the mean is at
+        least 0.5. Frames rejected by the quality gate are ignored.
+        
+        Args:
+            results: Detection results of the frames
+            
+        Returns:
+            (is_counterfeit, confidence, counterfeit_votes); confidence is
+            0.0 when no frame was completed
+        """
+        completed = [r for r in results if r.status == "completed"]
+        if not completed:
+            return False, 0.0, 0
+        votes = sum(1 for r in completed if r.is_counterfeit)
+        p_counterfeit = sum(
+            r.confidence if r.is_counterfeit else 1.0 - r.confidence for r in completed
+        ) / len(completed)
+        is_counterfeit = p_counterfeit >= 0.5
+        confidence = p_counterfeit if is_counterfeit else 1.0 - p_counterfeit
+        return is_counterfeit, confidence, votes
 
 
 # Global service instance
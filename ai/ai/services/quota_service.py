@@ -0,0 +1,460 @@
+"""
+Per-client quotas for BUCChain AI
+
+Every detection request is attributed to a client: the digest of its
+X-API-Key header, else the QUOTA_CLIENT_HEADER header (X-Client-Id), else
+its IP address. Quotas are off by default: behind a proxy (the NestJS
+backend) every request comes from the same IP, so they are only useful
+once the proxy forwards one of those headers. Each client has a token bucket (QUOTA_RATE images per
+second, up to QUOTA_BURST) and a cap of QUOTA_MAX_CONCURRENT requests in
+flight; QUOTA_CLIENT_LIMITS overrides them per client.
+
+The limits are enforced by an ASGI middleware before the request body is
+read, so a throttled client's uploads are never received, decoded or
+queued. Buckets, in-flight leases and usage counters live in a SQLite
+database (in /dev/shm by default) shared by all uvicorn workers of the
+host; each check is one short write transaction. The store is called from
+worker threads, off the event loop; it waits at most QUOTA_BUSY_TIMEOUT_MS
+for the database lock and otherwise lets the request through. Leases are held per worker
+process; leases of processes that died are dropped when a worker starts
+and periodically afterwards, and leases that could not be returned while
+the database was busy are returned with the process's next check.
+
+A request costs one token when it arrives. Once admitted, the batch
+endpoint charges the rest of its images and the burst endpoint the rest of
+the keyframes it runs; the bucket may go negative, which delays the
+client's next requests accordingly.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from ai.models.analytics import ClientUsage, ClientUsageResponse
+from ai.utils.config import settings
+from ai.utils.logging_config import SAMPLED
+
+logger = logging.getLogger(__name__)
+
+# Throttle reasons
+REASON_RATE = "rate"
+REASON_CONCURRENCY = "concurrency"
+
+# Clients not seen for this long are removed from the store
+IDLE_CLIENT_SECONDS = 24 * 3600
+
+# Checks between removals of idle clients (per process)
+PRUNE_INTERVAL = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clients (
+    client TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    images INTEGER NOT NULL DEFAULT 0,
+    throttled_rate INTEGER NOT NULL DEFAULT 0,
+    throttled_concurrency INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    client TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (client, pid)
+);
+"""
+
+
+class ClientLimits(NamedTuple):
+    """Quota of one client"""
+    rate: float
+    burst: float
+    max_concurrent: int
+
+
+class QuotaDecision(NamedTuple):
+    """Outcome of a quota check"""
+    allowed: bool
+    reason: Optional[str] = None
+    retry_after: float = 0.0
+
+
+def default_db_path() -> str:
+    """Database file shared by the workers of this port"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"bucchain-quota-{settings.port}.sqlite3")
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _drop_dead_leases(db: sqlite3.Connection):
+    """Drop the leases of worker processes that died holding them"""
+    pids = [row[0] for row in db.execute("SELECT DISTINCT pid FROM leases")]
+    dead = [pid for pid in pids if pid != os.getpid() and not _process_alive(pid)]
+    if dead:
+        db.executemany("DELETE FROM leases WHERE pid = ?", [(pid,) for pid in dead])
+        logger.info("Dropped quota leases of %s dead processes", len(dead))
+
+
+class QuotaStore:
+    """Token buckets and concurrency leases in a SQLite database shared by workers"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_concurrent: Optional[int] = None,
+        client_limits: Optional[Dict[str, Dict[str, float]]] = None
+    ):
+        """
+        Initialize quota store
+
+        Args:
+            path: SQLite database file (created if missing)
+            rate: Tokens (images) per second per client
+            burst: Bucket size
+            max_concurrent: Requests in flight per client
+            client_limits: Per-client overrides of rate, burst and
+                max_concurrent
+        """
+        self.path = path or settings.quota_db_path or default_db_path()
+        self.defaults = ClientLimits(
+            rate or settings.quota_rate,
+            burst or settings.quota_burst,
+            max_concurrent or settings.quota_max_concurrent
+        )
+        self.client_limits = client_limits if client_limits is not None else settings.quota_client_limits
+        self._db: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._checks = 0
+        # Leases to return with the next check (release found the store busy)
+        self._unreleased: Dict[str, int] = {}
+        # Calls come from worker threads and share the process's connection
+        self._lock = threading.Lock()
+
+    def limits(self, client: str) -> ClientLimits:
+        """Quota of a client (its override, else the defaults)"""
+        override = self.client_limits.get(client)
+        if not override:
+            return self.defaults
+        return ClientLimits(
+            float(override.get("rate", self.defaults.rate)),
+            float(override.get("burst", self.defaults.burst)),
+            int(override.get("max_concurrent", self.defaults.max_concurrent))
+        )
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """
+        Connection of this process (connections do not survive fork)
+
+        Shared by the threads of the process; callers hold self._lock.
+        """
+        if self._db is None or self._pid != os.getpid():
+            # Wait briefly for the database lock, then fail open
+            db = sqlite3.connect(
+                self.path,
+                timeout=settings.quota_busy_timeout_ms / 1000,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            db.executescript(_SCHEMA)
+            _drop_dead_leases(db)
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def acquire(self, client: str, cost: int = 1, now: Optional[float] = None) -> QuotaDecision:
+        """
+        Take tokens and a concurrency lease for a request
+
+        Args:
+            client: Client id
+            cost: Tokens to take
+            now: Current time (defaults to time.time())
+
+        Returns:
+            QuotaDecision; when allowed, release() must follow
+
+        Raises:
+            sqlite3.Error: If the store is unavailable or stays locked for
+                QUOTA_BUSY_TIMEOUT_MS
+        """
+        now = time.time() if now is None else now
+        limits = self.limits(client)
+        with self._lock:
+            return self._acquire(client, cost, now, limits)
+
+    def _acquire(self, client: str, cost: int, now: float, limits: ClientLimits) -> QuotaDecision:
+        db = self.db
+        self._checks += 1
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if self._unreleased:
+                db.executemany(
+                    "UPDATE leases SET count = MAX(count - ?, 0) WHERE client = ? AND pid = ?",
+                    [(count, lease_client, self._pid) for lease_client, count in self._unreleased.items()]
+                )
+            row = db.execute("SELECT tokens, updated FROM clients WHERE client = ?", (client,)).fetchone()
+            tokens = limits.burst if row is None else min(
+                limits.burst, row[0] + max(0.0, now - row[1]) * limits.rate
+            )
+            in_flight = db.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM leases WHERE client = ?", (client,)
+            ).fetchone()[0]
+
+            if in_flight >= limits.max_concurrent:
+                decision = QuotaDecision(False, REASON_CONCURRENCY, 1.0)
+            elif tokens < min(cost, limits.burst):
+                decision = QuotaDecision(False, REASON_RATE, (min(cost, limits.burst) - tokens) / limits.rate)
+            else:
+                decision = QuotaDecision(True)
+                tokens -= cost
+                db.execute(
+                    "INSERT INTO leases (client, pid, count) VALUES (?, ?, 1) "
+                    "ON CONFLICT (client, pid) DO UPDATE SET count = count + 1",
+                    (client, self._pid)
+                )
+
+            db.execute(
+                "INSERT INTO clients (client, tokens, updated, requests, images, throttled_rate, "
+                "throttled_concurrency, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (client) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, "
+                "requests = requests + excluded.requests, images = images + excluded.images, "
+                "throttled_rate = throttled_rate + excluded.throttled_rate, "
+                "throttled_concurrency = throttled_concurrency + excluded.throttled_concurrency, "
+                "last_seen = excluded.last_seen",
+                (
+                    client, tokens, now,
+                    int(decision.allowed), cost if decision.allowed else 0,
+                    int(decision.reason == REASON_RATE), int(decision.reason == REASON_CONCURRENCY),
+                    now
+                )
+            )
+            if self._checks % PRUNE_INTERVAL == 0:
+                db.execute(
+                    "DELETE FROM clients WHERE last_seen < ? "
+                    "AND client NOT IN (SELECT client FROM leases WHERE count > 0)",
+                    (now - IDLE_CLIENT_SECONDS,)
+                )
+                _drop_dead_leases(db)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._unreleased.clear()
+        return decision
+
+    def charge(self, client: str, cost: int):
+        """
+        Take extra tokens for work found once the request was parsed
+
+        The bucket may go negative; the client then waits longer for its
+        next request.
+
+        Args:
+            client: Client id
+            cost: Tokens to take
+
+        Raises:
+            sqlite3.Error: If the store is unavailable or busy
+        """
+        if cost <= 0:
+            return
+        with self._lock:
+            self.db.execute(
+                "UPDATE clients SET tokens = tokens - ?, images = images + ? WHERE client = ?",
+                (cost, cost, client)
+            )
+
+    def release(self, client: str):
+        """
+        Return a concurrency lease
+
+        If the store is busy the lease is returned with the next check.
+
+        Args:
+            client: Client id
+        """
+        with self._lock:
+            try:
+                self.db.execute(
+                    "UPDATE leases SET count = count - 1 WHERE client = ? AND pid = ? AND count > 0",
+                    (client, self._pid)
+                )
+            except sqlite3.OperationalError as e:
+                logger.warning("Quota store busy, deferring lease release of %s: %s", client, e)
+                self._unreleased[client] = self._unreleased.get(client, 0) + 1
+
+    def get_usage(self, limit: int = 50) -> ClientUsageResponse:
+        """
+        Get usage and throttling counters of all workers
+
+        Args:
+            limit: Maximum clients returned, most requests first
+
+        Returns:
+            ClientUsageResponse with per-client counters and current state
+        """
+        now = time.time()
+        with self._lock:
+            db = self.db
+            leases = dict(db.execute("SELECT client, SUM(count) FROM leases GROUP BY client").fetchall())
+            totals = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(requests), 0), COALESCE(SUM(throttled_rate), 0), "
+                "COALESCE(SUM(throttled_concurrency), 0) FROM clients"
+            ).fetchone()
+            rows = db.execute(
+                "SELECT client, tokens, updated, requests, images, throttled_rate, throttled_concurrency, last_seen "
+                "FROM clients ORDER BY requests + throttled_rate + throttled_concurrency DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+        clients = []
+        for client, tokens, updated, requests, images, throttled_rate, throttled_concurrency, last_seen in rows:
+            limits = self.limits(client)
+            clients.append(ClientUsage(
+                client=client,
+                requests=requests,
+                images=images,
+                throttled_rate=throttled_rate,
+                throttled_concurrency=throttled_concurrency,
+                in_flight=leases.get(client, 0),
+                tokens=min(limits.burst, tokens + max(0.0, now - updated) * limits.rate),
+                rate=limits.rate,
+                burst=limits.burst,
+                max_concurrent=limits.max_concurrent,
+                last_seen=datetime.fromtimestamp(last_seen)
+            ))
+
+        return ClientUsageResponse(
+            enabled=settings.quota_enabled,
+            clients_tracked=totals[0],
+            requests=totals[1],
+            throttled_rate=totals[2],
+            throttled_concurrency=totals[3],
+            clients=clients,
+            default_rate=self.defaults.rate,
+            default_burst=self.defaults.burst,
+            default_max_concurrent=self.defaults.max_concurrent,
+            timestamp=datetime.now()
+        )
+
+
+def client_id(headers: Dict[str, str], client_address: Optional[str]) -> str:
+    """
+    Identify the client of a request
+
+    Args:
+        headers: Lower-case request headers
+        client_address: Peer IP address
+
+    Returns:
+        "key:<digest>" for an API key (the key itself is never stored),
+        "client:<id>" for the client header, else "ip:<address>"
+    """
+    api_key = headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    client = headers.get(settings.quota_client_header.lower(), "").strip()[:128]
+    if client:
+        return "client:" + client
+    return "ip:" + (client_address or "unknown")
+
+
+class QuotaMiddleware:
+    """
+    ASGI middleware enforcing client quotas on detection requests
+
+    Runs before routing, so throttled requests are answered with 429 before
+    their body is read. Store calls run in worker threads so a busy database
+    never blocks the event loop. The client id is left in the request state
+    (`request.state.quota_client`) for routes that charge extra work.
+    """
+
+    def __init__(self, app, store: Optional[QuotaStore] = None, path_prefix: Optional[str] = None):
+        """
+        Args:
+            app: Wrapped ASGI application
+            store: Quota store (defaults to the global one)
+            path_prefix: Paths the quotas apply to
+        """
+        self.app = app
+        self.store = store or quota_store
+        self.path_prefix = path_prefix or f"{settings.api_v1_prefix}/detect"
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        client = client_id(headers, scope["client"][0] if scope.get("client") else None)
+        try:
+            decision = await asyncio.to_thread(self.store.acquire, client)
+        except sqlite3.Error as e:
+            # Never turn a broken or busy quota store into an outage
+            logger.error("Quota check failed, admitting request: %s", e)
+            await self.app(scope, receive, send)
+            return
+
+        if not decision.allowed:
+            logger.info("Throttling %s (%s)", client, decision.reason, extra=SAMPLED)
+            await self._reject(send, decision)
+            return
+
+        scope.setdefault("state", {})["quota_client"] = client
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Shielded so a cancelled request (client disconnect) still
+            # returns its lease
+            await asyncio.shield(asyncio.to_thread(self._release, client))
+
+    def _release(self, client: str):
+        try:
+            self.store.release(client)
+        except sqlite3.Error as e:
+            logger.error("Failed to release quota lease of %s: %s", client, e)
+
+    @staticmethod
+    async def _reject(send, decision: QuotaDecision):
+        body = json.dumps({"detail": f"Client quota exceeded ({decision.reason}), retry later"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(1, math.ceil(decision.retry_after))).encode("latin-1"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Global quota store instance
+quota_store = QuotaStore()
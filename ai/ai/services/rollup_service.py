@@ -0,0 +1,309 @@
+"""
+Dimensional analytics rollups for BUCChain AI
+
+Detections are pre-aggregated per dimension (supplier, product, client,
+model version, region) into time buckets of ROLLUP_BUCKET_MINUTES, kept for
+ROLLUP_RETENTION_HOURS. Each bucket holds, per dimension, a Space-Saving
+table of the ROLLUP_TOP_KEYS heaviest keys with their counts and metric
+sums. Once a dimension has more distinct keys than that in a bucket, a
+count-min sketch is added so any key, evicted or not, can still be
+estimated. Memory is bounded by buckets x dimensions x (table + sketch),
+whatever the number of suppliers or products.
+
+Group-by queries merge the tables of the buckets in the window, so they
+cost O(buckets x top keys) and not O(detections).
+"""
+
+import heapq
+import math
+import time
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, NamedTuple, Optional
+
+from ai.models.analytics import RollupEstimate, RollupGroup, RollupResponse
+from ai.utils.config import settings
+from ai.utils.sketches import CountMinSketch, GroupCounts, SpaceSaving
+
+# Key recorded for detections sent without a tag
+UNTAGGED = "unknown"
+
+# Longer tag values are truncated to keep the tables' memory bounded
+MAX_KEY_LENGTH = 128
+
+
+class Dimension(str, Enum):
+    """Dimensions detections are rolled up by"""
+    SUPPLIER = "supplier"
+    PRODUCT = "product"
+    CLIENT = "client"
+    MODEL_VERSION = "model_version"
+    REGION = "region"
+
+
+class RollupOrder(str, Enum):
+    """Sort orders of group-by results"""
+    DETECTIONS = "detections"
+    COUNTERFEIT = "counterfeit"
+    COUNTERFEIT_RATE = "counterfeit_rate"
+
+
+# Sort key of a (key, GroupCounts) row per order
+_SORT_KEYS = {
+    RollupOrder.DETECTIONS: lambda row: row[1].count,
+    RollupOrder.COUNTERFEIT: lambda row: (row[1].counterfeit, row[1].count),
+    RollupOrder.COUNTERFEIT_RATE: lambda row: (row[1].counterfeit / row[1].observed, row[1].count)
+}
+
+
+class DetectionTags(NamedTuple):
+    """Dimension values of a detection"""
+    supplier: Optional[str] = None
+    product: Optional[str] = None
+    client: Optional[str] = None
+    model_version: Optional[str] = None
+    region: Optional[str] = None
+
+
+def clean_tag(value: Optional[str]) -> Optional[str]:
+    """Strip and truncate a tag value from a request; None if empty"""
+    if value is None:
+        return None
+    value = value.strip()[:MAX_KEY_LENGTH]
+    return value or None
+
+
+class _DimensionRollup:
+    """Top-key table, optional sketch and totals of one dimension in one bucket"""
+
+    __slots__ = ("top", "sketch", "detections", "counterfeit")
+
+    def __init__(self, top_keys: int):
+        self.top = SpaceSaving(top_keys)
+        self.sketch: Optional[CountMinSketch] = None
+        self.detections = 0
+        self.counterfeit = 0
+
+    def add(
+        self,
+        key: str,
+        counterfeit: bool,
+        confidence: float,
+        seconds: float,
+        sketch_width: int,
+        sketch_depth: int
+    ):
+        self.detections += 1
+        self.counterfeit += counterfeit
+        top = self.top
+        if self.sketch is None and key not in top.entries and len(top.entries) >= top.capacity:
+            # First eviction: until now the table held every key exactly
+            self.sketch = CountMinSketch(sketch_width, sketch_depth, counters=2)
+            for existing, counts in top.entries.items():
+                self.sketch.add(existing, (counts.count, counts.counterfeit))
+        top.add(key, counterfeit, confidence, seconds)
+        if self.sketch is not None:
+            self.sketch.add(key, (1, int(counterfeit)))
+
+
+class _Bucket:
+    """Rollups of all dimensions for one time bucket"""
+
+    __slots__ = ("start", "dimensions")
+
+    def __init__(self, start: float, top_keys: int):
+        self.start = start
+        self.dimensions: Dict[Dimension, _DimensionRollup] = {
+            dimension: _DimensionRollup(top_keys) for dimension in Dimension
+        }
+
+
+class RollupStore:
+    """Time-bucketed, bounded-cardinality rollups of detections"""
+
+    def __init__(
+        self,
+        bucket_seconds: Optional[float] = None,
+        retention_seconds: Optional[float] = None,
+        top_keys: Optional[int] = None,
+        sketch_width: Optional[int] = None,
+        sketch_depth: Optional[int] = None
+    ):
+        """
+        Initialize rollup store
+
+        Args:
+            bucket_seconds: Length of a time bucket
+            retention_seconds: How long buckets are kept
+            top_keys: Keys tracked exactly per dimension and bucket
+            sketch_width: Count-min sketch columns
+            sketch_depth: Count-min sketch rows
+        """
+        self.bucket_seconds = bucket_seconds or settings.rollup_bucket_minutes * 60
+        retention_seconds = retention_seconds or settings.rollup_retention_hours * 3600
+        self.max_buckets = max(1, math.ceil(retention_seconds / self.bucket_seconds))
+        self.top_keys = top_keys or settings.rollup_top_keys
+        self.sketch_width = sketch_width or settings.rollup_sketch_width
+        self.sketch_depth = sketch_depth or settings.rollup_sketch_depth
+        self._buckets: List[_Bucket] = []
+
+    def _bucket_start(self, now: float) -> float:
+        return now - now % self.bucket_seconds
+
+    def _current(self, now: float) -> _Bucket:
+        start = self._bucket_start(now)
+        if not self._buckets or self._buckets[-1].start < start:
+            self._buckets.append(_Bucket(start, self.top_keys))
+            del self._buckets[:-self.max_buckets]
+        return self._buckets[-1]
+
+    def record(
+        self,
+        tags: DetectionTags,
+        is_counterfeit: bool,
+        confidence: float,
+        processing_time: float,
+        now: Optional[float] = None
+    ):
+        """
+        Add a detection to the current bucket of every dimension
+
+        Args:
+            tags: Dimension values (missing ones are counted as "unknown")
+            is_counterfeit: Whether counterfeit was detected
+            confidence: Detection confidence
+            processing_time: Processing time in seconds
+            now: Event time (defaults to the current time)
+        """
+        bucket = self._current(time.time() if now is None else now)
+        for dimension, key in zip(Dimension, tags):
+            bucket.dimensions[dimension].add(
+                key or UNTAGGED,
+                is_counterfeit,
+                confidence,
+                processing_time,
+                self.sketch_width,
+                self.sketch_depth
+            )
+
+    def _window(self, hours: float, now: float):
+        """Buckets overlapping the last `hours`, and the window start"""
+        count = max(1, math.ceil(hours * 3600 / self.bucket_seconds))
+        start = self._bucket_start(now) - (count - 1) * self.bucket_seconds
+        return [b for b in self._buckets if b.start >= start], start
+
+    def group_by(
+        self,
+        dimension: Dimension,
+        hours: float = 24,
+        limit: int = 20,
+        order: RollupOrder = RollupOrder.DETECTIONS,
+        min_detections: int = 1
+    ) -> RollupResponse:
+        """
+        Group the detections of a time window by one dimension
+
+        Args:
+            dimension: Dimension to group by
+            hours: Window length, ending now
+            limit: Maximum groups returned
+            order: Sort order of the groups
+            min_detections: Leave out groups with fewer tracked detections
+
+        Returns:
+            RollupResponse with the top groups and the window totals
+        """
+        now = time.time()
+        buckets, start = self._window(hours, now)
+
+        merged: Dict[str, GroupCounts] = {}
+        detections = counterfeit = 0
+        approximate = False
+        for bucket in buckets:
+            rollup = bucket.dimensions[dimension]
+            detections += rollup.detections
+            counterfeit += rollup.counterfeit
+            approximate = approximate or rollup.top.evictions > 0
+            for key, counts in rollup.top.entries.items():
+                total = merged.get(key)
+                if total is None:
+                    total = merged[key] = GroupCounts()
+                total.count += counts.count
+                total.error += counts.error
+                total.counterfeit += counts.counterfeit
+                total.confidence += counts.confidence
+                total.seconds += counts.seconds
+
+        rows = [(key, counts) for key, counts in merged.items() if counts.observed >= max(1, min_detections)]
+        # Only the returned groups become response models
+        rows = heapq.nlargest(limit, rows, key=_SORT_KEYS[order])
+        groups = [
+            RollupGroup(
+                key=key,
+                detections=counts.count,
+                error=counts.error,
+                counterfeit=counts.counterfeit,
+                counterfeit_rate=counts.counterfeit / counts.observed,
+                average_confidence=counts.confidence / counts.observed,
+                average_processing_time_ms=counts.seconds / counts.observed * 1000
+            )
+            for key, counts in rows
+        ]
+
+        return RollupResponse(
+            dimension=dimension.value,
+            window_start=datetime.fromtimestamp(start),
+            window_end=datetime.fromtimestamp(now),
+            detections=detections,
+            counterfeit=counterfeit,
+            groups=groups,
+            tracked_groups=len(merged),
+            other_detections=max(0, detections - sum(g.detections - g.error for g in groups)),
+            approximate=approximate
+        )
+
+    def estimate(self, dimension: Dimension, key: str, hours: float = 24) -> RollupEstimate:
+        """
+        Estimate the detections of one key over a time window
+
+        Buckets without evictions answer exactly from their tables; the
+        others from their count-min sketches, which never undercount.
+
+        Args:
+            dimension: Dimension of the key
+            key: Dimension value
+            hours: Window length, ending now
+
+        Returns:
+            RollupEstimate for the key
+        """
+        buckets, start = self._window(hours, time.time())
+        detections = counterfeit = 0
+        sketches = []
+        for bucket in buckets:
+            rollup = bucket.dimensions[dimension]
+            if rollup.sketch is not None:
+                sketches.append(rollup.sketch)
+                continue
+            counts = rollup.top.entries.get(key)
+            if counts is not None:
+                detections += counts.count
+                counterfeit += counts.counterfeit
+        sketched = CountMinSketch.merged_estimate(sketches, key)
+        if sketched is not None:
+            detections += sketched[0]
+            counterfeit += sketched[1]
+
+        return RollupEstimate(
+            dimension=dimension.value,
+            key=key,
+            window_start=datetime.fromtimestamp(start),
+            detections=detections,
+            counterfeit=counterfeit,
+            counterfeit_rate=counterfeit / detections if detections else None,
+            approximate=bool(sketches)
+        )
+
+    def reset(self):
+        """Drop all buckets"""
+        self._buckets.clear()
@@ -0,0 +1,255 @@
+"""
+Priority Scheduler for BUCChain AI
+
+Weighted-fair scheduling of inference slots between request lanes. Latency
+critical traffic (mobile QR-scan verification) goes to the interactive lane,
+supplier batch uploads go to the bulk lane. Batch requests acquire a slot per
+image, so every image boundary in a batch is a point where queued interactive
+requests can take the freed slot.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from ai.models.analytics import LaneStats, SchedulerStats
+from ai.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Lane(str, Enum):
+    """Request priority classes"""
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+def resolve_lane(header_value: Optional[str], default: Lane) -> Lane:
+    """
+    Pick the lane for a request
+
+    Args:
+        header_value: Value of the X-Priority header, if any
+        default: Lane implied by the endpoint
+
+    Returns:
+        Lane requested via header, or the endpoint default
+    """
+    if header_value:
+        try:
+            return Lane(header_value.strip().lower())
+        except ValueError:
+            logger.debug("Ignoring unknown priority: %s", header_value)
+    return default
+
+
+class _LaneState:
+    """Queue and metrics for a single lane"""
+
+    def __init__(self, weight: int, window: int):
+        self.weight = max(1, weight)
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.finish_tag = 0.0
+        self.running = 0
+        self.served = 0
+        self.max_queue_depth = 0
+        self.waits: Deque[float] = deque(maxlen=window)
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+
+class PriorityScheduler:
+    """Weighted-fair queueing of a fixed number of inference slots"""
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        weights: Optional[Dict[Lane, int]] = None,
+        window: Optional[int] = None
+    ):
+        """
+        Initialize scheduler
+
+        Args:
+            capacity: Number of images processed concurrently
+            weights: Relative share of slots per lane under contention
+            window: Number of recent samples kept per lane
+        """
+        self.capacity = capacity or settings.max_concurrent_inferences
+        weights = weights or {
+            Lane.INTERACTIVE: settings.interactive_lane_weight,
+            Lane.BULK: settings.bulk_lane_weight
+        }
+        window = window or settings.admission_window
+
+        self.running = 0
+        self._virtual_time = 0.0
+        self._lanes: Dict[Lane, _LaneState] = {
+            lane: _LaneState(weights.get(lane, 1), window) for lane in Lane
+        }
+
+    def queue_depth(self, lane: Optional[Lane] = None) -> int:
+        """
+        Number of images waiting for a slot
+
+        Args:
+            lane: Lane to count, or None for all lanes
+        """
+        if lane is not None:
+            return len(self._lanes[lane].waiters)
+        return sum(len(state.waiters) for state in self._lanes.values())
+
+    def _next_lane(self) -> Optional[_LaneState]:
+        """Non-empty lane with the smallest virtual finish tag"""
+        candidates = [state for state in self._lanes.values() if state.waiters]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda state: state.finish_tag + 1.0 / state.weight)
+
+    def _dispatch(self) -> bool:
+        """Hand a free slot to the next waiter; return False if none is waiting"""
+        while True:
+            state = self._next_lane()
+            if state is None:
+                return False
+            future = state.waiters.popleft()
+            if future.cancelled():
+                continue
+            state.finish_tag += 1.0 / state.weight
+            self._virtual_time = state.finish_tag
+            future.set_result(None)
+            return True
+
+    async def acquire(self, lane: Lane):
+        """
+        Wait until an inference slot is granted to this lane
+
+        Args:
+            lane: Lane of the request
+        """
+        state = self._lanes[lane]
+        if self.running < self.capacity and self.queue_depth() == 0:
+            self.running += 1
+            # Virtual time follows uncontended grants too, so a lane that was
+            # idle meanwhile does not come back with a backlog of credit
+            self._virtual_time = max(state.finish_tag, self._virtual_time)
+            state.finish_tag = self._virtual_time + 1.0 / state.weight
+            return
+
+        if not state.waiters:
+            # A lane returning from idle must not claim credit for the time it was idle
+            state.finish_tag = max(state.finish_tag, self._virtual_time)
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
+        state.max_queue_depth = max(state.max_queue_depth, len(state.waiters))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if future in state.waiters:
+                    state.waiters.remove(future)
+            else:
+                # Slot was granted just before cancellation; pass it on
+                self.release()
+            raise
+
+    def release(self):
+        """Return a slot, handing it directly to the next waiter if any"""
+        if not self._dispatch():
+            self.running -= 1
+
+    @asynccontextmanager
+    async def slot(self, lane: Lane) -> AsyncIterator[float]:
+        """
+        Hold an inference slot for one image
+
+        Args:
+            lane: Lane of the request
+
+        Yields:
+            Time spent waiting for the slot, in seconds
+        """
+        state = self._lanes[lane]
+        queued_at = time.perf_counter()
+        await self.acquire(lane)
+        started_at = time.perf_counter()
+        wait = started_at - queued_at
+        state.waits.append(wait)
+        state.running += 1
+        try:
+            yield wait
+        finally:
+            state.running -= 1
+            state.served += 1
+            state.latencies.append(time.perf_counter() - queued_at)
+            self.release()
+
+    def average_wait(self, lane: Lane) -> float:
+        """Mean recent queue wait for a lane in seconds"""
+        waits = self._lanes[lane].waits
+        return sum(waits) / len(waits) if waits else 0.0
+
+    def estimate_wait(self, lane: Lane, service_time: float) -> float:
+        """
+        Estimate how long a new image in `lane` would wait for a slot
+
+        Under contention each lane receives a share of released slots
+        proportional to its weight among lanes that have work queued.
+
+        Args:
+            lane: Lane of the new image
+            service_time: Expected time an image holds a slot
+
+        Returns:
+            Estimated wait in seconds
+        """
+        if self.running < self.capacity and self.queue_depth() == 0:
+            return 0.0
+        state = self._lanes[lane]
+        active_weight = sum(
+            s.weight for s in self._lanes.values() if s.waiters or s is state
+        )
+        share = state.weight / active_weight
+        ahead = len(state.waiters) + 1
+        backlog_wait = ahead / share / self.capacity * service_time
+        if not state.waiters:
+            return backlog_wait
+        # Observed waits catch cases the backlog model misses (e.g. slow images)
+        return max(backlog_wait, self.average_wait(lane))
+
+    def get_stats(self) -> SchedulerStats:
+        """
+        Get per-lane scheduling statistics
+
+        Returns:
+            SchedulerStats with queue depth and latency per lane
+        """
+        lanes = []
+        for lane, state in self._lanes.items():
+            latencies = sorted(state.latencies)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+            lanes.append(LaneStats(
+                lane=lane.value,
+                weight=state.weight,
+                queue_depth=len(state.waiters),
+                max_queue_depth=state.max_queue_depth,
+                running=state.running,
+                served=state.served,
+                average_wait_ms=self.average_wait(lane) * 1000,
+                average_latency_ms=(sum(latencies) / len(latencies) * 1000) if latencies else 0.0,
+                p95_latency_ms=p95 * 1000
+            ))
+        return SchedulerStats(
+            capacity=self.capacity,
+            running=self.running,
+            lanes=lanes,
+            timestamp=datetime.now()
+        )
+
+
+# Global scheduler instance
+priority_scheduler = PriorityScheduler()
@@ -0,0 +1,379 @@
+"""
+Streaming counterfeit-spike detection for BUCChain AI
+
+Every recorded detection updates, for its supplier, product and region
+(SPIKE_DIMENSIONS), a handful of running statistics:
+
+    baseline        EWMA of the counterfeit rate and of the verdict
+                    confidence (mean and variance) over about
+                    SPIKE_BASELINE_EVENTS detections of the key
+    rate CUSUM      Bernoulli log-likelihood-ratio CUSUM of the verdicts,
+                    baseline rate p0 against p0 + SPIKE_RATE_DELTA; it climbs
+                    while the rate runs above the baseline and alerts past
+                    SPIKE_RATE_THRESHOLD
+    confidence      Two-sided CUSUM of the standardized confidence, alerting
+    CUSUM           past SPIKE_CONFIDENCE_THRESHOLD standard deviations
+
+With the default thresholds (12 and 15) a key raises about one false
+alert per 10^5 (rate) and 10^7 (confidence) of its detections; a rate
+jump of 0.1 is caught after roughly 200 detections of the key, a
+one-sigma confidence shift after 30.
+
+An update is a few float operations per dimension, O(1) and allocation
+free. Keys are held in a least-recently-seen dictionary of at most
+SPIKE_MAX_KEYS per dimension, so memory is bounded. Alerts are rare: they
+are kept for /analytics/spikes and handed to a background thread that
+appends them to SPIKE_ALERT_FILE and posts them to SPIKE_WEBHOOK_URL, so
+the request never waits on disk or network I/O.
+"""
+
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from ai.models.analytics import SpikeAlert, SpikeReport
+from ai.services.rollup_service import DetectionTags, Dimension
+from ai.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+KIND_COUNTERFEIT_RATE = "counterfeit_rate"
+KIND_CONFIDENCE_DRIFT = "confidence_drift"
+
+# Bounds of the baseline rate in the likelihood ratio (keeps logs finite)
+MIN_RATE = 0.001
+MAX_RATE = 0.999
+
+# Allowance of the confidence CUSUM in standard deviations (detects shifts
+# of about twice that)
+CONFIDENCE_ALLOWANCE = 0.5
+
+# Floor of the confidence standard deviation; keeps near-constant
+# confidences from turning tiny wobbles into alerts
+MIN_CONFIDENCE_STD = 0.02
+
+
+class _KeyState:
+    """Running statistics of one key"""
+
+    __slots__ = (
+        "events", "rate", "recent_rate", "confidence", "confidence_var", "recent_confidence",
+        "rate_cusum", "confidence_up", "confidence_down", "last_alert"
+    )
+
+    def __init__(self):
+        self.events = 0
+        self.rate = 0.0
+        self.recent_rate = 0.0
+        self.confidence = 0.0
+        self.confidence_var = 0.0
+        self.recent_confidence = 0.0
+        self.rate_cusum = 0.0
+        self.confidence_up = 0.0
+        self.confidence_down = 0.0
+        self.last_alert = -math.inf
+
+
+class AlertSink:
+    """Writes alerts to a JSON-lines file and a webhook from a background thread"""
+
+    def __init__(self, path: Optional[str] = None, webhook_url: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Initialize alert sink
+
+        Args:
+            path: File alerts are appended to, one JSON object per line
+                (empty disables)
+            webhook_url: URL alerts are POSTed to as JSON (empty disables)
+            timeout: Webhook timeout in seconds
+        """
+        self.path = path if path is not None else settings.spike_alert_file
+        self.webhook_url = webhook_url if webhook_url is not None else settings.spike_webhook_url
+        self.timeout = timeout or settings.spike_webhook_timeout_s
+        self.errors = 0
+        self._queue: "queue.SimpleQueue[Optional[SpikeAlert]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.webhook_url)
+
+    def emit(self, alert: SpikeAlert):
+        """Queue an alert; the thread is started on first use (after any fork)"""
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="spike-alerts", daemon=True)
+            self._thread.start()
+        self._queue.put(alert)
+
+    def _run(self):
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+            body = alert.model_dump_json()
+            if self.path:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(body + "\n")
+                except OSError as e:
+                    self.errors += 1
+                    logger.error("Failed to write spike alert to %s: %s", self.path, e)
+            if self.webhook_url:
+                request = urllib.request.Request(
+                    self.webhook_url,
+                    data=body.encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST"
+                )
+                try:
+                    with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                        response.read()
+                except Exception as e:
+                    self.errors += 1
+                    logger.error("Failed to post spike alert to %s: %s", self.webhook_url, e)
+
+    def stop(self, timeout: float = 5.0):
+        """Write out queued alerts and stop the thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def parse_dimensions(value: str) -> List[Dimension]:
+    """Dimensions named in a comma-separated setting; unknown names are skipped"""
+    dimensions = []
+    for name in value.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            dimensions.append(Dimension(name))
+        except ValueError:
+            logger.warning("Ignoring unknown spike detection dimension %r", name)
+    return dimensions
+
+
+class SpikeDetector:
+    """EWMA/CUSUM change detection of counterfeit rate and confidence per key"""
+
+    def __init__(
+        self,
+        dimensions: Optional[List[Dimension]] = None,
+        max_keys: Optional[int] = None,
+        baseline_events: Optional[int] = None,
+        min_events: Optional[int] = None,
+        rate_delta: Optional[float] = None,
+        rate_threshold: Optional[float] = None,
+        confidence_threshold: Optional[float] = None,
+        cooldown: Optional[float] = None,
+        sink: Optional[AlertSink] = None,
+        max_alerts: int = 100
+    ):
+        """
+        Initialize spike detector
+
+        Args:
+            dimensions: Dimensions monitored
+            max_keys: Keys tracked per dimension (least recently seen dropped)
+            baseline_events: EWMA span of the baseline, in detections
+            min_events: Detections of a key before it can alert; also the
+                EWMA span of the reported recent values
+            rate_delta: Counterfeit-rate increase to detect (absolute)
+            rate_threshold: Rate CUSUM threshold (log-likelihood ratio)
+            confidence_threshold: Confidence CUSUM threshold, in standard
+                deviations
+            cooldown: Minimum seconds between alerts of one key
+            sink: File and webhook sink
+            max_alerts: Recent alerts kept for the endpoint
+        """
+        self.enabled = settings.spike_detection_enabled
+        self.dimensions = dimensions if dimensions is not None else parse_dimensions(settings.spike_dimensions)
+        self.max_keys = max_keys or settings.spike_max_keys
+        self.baseline_alpha = 1.0 / (baseline_events or settings.spike_baseline_events)
+        self.min_events = min_events or settings.spike_min_events
+        self.recent_alpha = 1.0 / self.min_events
+        self.rate_delta = rate_delta or settings.spike_rate_delta
+        self.rate_threshold = rate_threshold or settings.spike_rate_threshold
+        self.confidence_threshold = confidence_threshold or settings.spike_confidence_threshold
+        self.cooldown = cooldown if cooldown is not None else settings.spike_cooldown_s
+        self.sink = sink or AlertSink()
+
+        # Tag positions of the monitored dimensions
+        self._fields: List[Tuple[int, Dimension]] = [
+            (list(Dimension).index(dimension), dimension) for dimension in self.dimensions
+        ]
+        self._keys: Dict[Dimension, "OrderedDict[str, _KeyState]"] = {
+            dimension: OrderedDict() for dimension in self.dimensions
+        }
+        self.events = 0
+        self.alerts_total = 0
+        self.alerts: Deque[SpikeAlert] = deque(maxlen=max_alerts)
+
+    def record(
+        self,
+        tags: DetectionTags,
+        is_counterfeit: bool,
+        confidence: float,
+        now: Optional[float] = None
+    ):
+        """
+        Update the statistics of the detection's keys and raise alerts
+
+        Args:
+            tags: Dimension values (untagged dimensions are skipped)
+            is_counterfeit: Whether counterfeit was detected
+            confidence: Verdict confidence
+            now: Event time (defaults to the current time)
+        """
+        if not self.enabled:
+            return
+        self.events += 1
+        x = 1.0 if is_counterfeit else 0.0
+        for index, dimension in self._fields:
+            key = tags[index]
+            if key is None:
+                continue
+            keys = self._keys[dimension]
+            state = keys.get(key)
+            if state is None:
+                state = keys[key] = _KeyState()
+                if len(keys) > self.max_keys:
+                    keys.popitem(last=False)
+            else:
+                keys.move_to_end(key)
+
+            state.events += 1
+            if state.events == 1:
+                state.rate = state.recent_rate = x
+                state.confidence = state.recent_confidence = confidence
+                continue
+
+            warm = state.events > self.min_events
+            if warm:
+                # Deviations are scored against the baseline before it
+                # absorbs this event
+                p0 = min(max(state.rate, MIN_RATE), MAX_RATE - self.rate_delta)
+                p1 = p0 + self.rate_delta
+                if is_counterfeit:
+                    llr = math.log(p1 / p0)
+                else:
+                    llr = math.log((1 - p1) / (1 - p0))
+                state.rate_cusum = max(0.0, state.rate_cusum + llr)
+                z = (confidence - state.confidence) / max(math.sqrt(state.confidence_var), MIN_CONFIDENCE_STD)
+                state.confidence_up = max(0.0, state.confidence_up + z - CONFIDENCE_ALLOWANCE)
+                state.confidence_down = max(0.0, state.confidence_down - z - CONFIDENCE_ALLOWANCE)
+
+            # Cumulative mean while warming up, EWMA afterwards
+            alpha = max(self.baseline_alpha, 1.0 / state.events)
+            state.rate += alpha * (x - state.rate)
+            delta = confidence - state.confidence
+            state.confidence += alpha * delta
+            state.confidence_var = (1 - alpha) * (state.confidence_var + alpha * delta * delta)
+            recent = max(self.recent_alpha, 1.0 / state.events)
+            state.recent_rate += recent * (x - state.recent_rate)
+            state.recent_confidence += recent * (confidence - state.recent_confidence)
+
+            if warm and (
+                state.rate_cusum >= self.rate_threshold
+                or state.confidence_up >= self.confidence_threshold
+                or state.confidence_down >= self.confidence_threshold
+            ):
+                self._alarm(dimension, key, state, time.time() if now is None else now)
+
+    def _alarm(self, dimension: Dimension, key: str, state: _KeyState, now: float):
+        """Raise the alerts of a key whose CUSUM crossed its threshold, then restart it"""
+        alerts = []
+        if now - state.last_alert >= self.cooldown:
+            if state.rate_cusum >= self.rate_threshold:
+                alerts.append(self._alert(
+                    KIND_COUNTERFEIT_RATE, "up", dimension, key, state,
+                    state.rate, state.recent_rate, state.rate_cusum, self.rate_threshold, now
+                ))
+            for direction, cusum in (("up", state.confidence_up), ("down", state.confidence_down)):
+                if cusum >= self.confidence_threshold:
+                    alerts.append(self._alert(
+                        KIND_CONFIDENCE_DRIFT, direction, dimension, key, state,
+                        state.confidence, state.recent_confidence, cusum, self.confidence_threshold, now
+                    ))
+            state.last_alert = now
+        # Restart accumulating either way, so a wave that lasts past the
+        # cooldown alerts again instead of being reported from stale sums
+        state.rate_cusum = state.confidence_up = state.confidence_down = 0.0
+
+        for alert in alerts:
+            self.alerts_total += 1
+            self.alerts.append(alert)
+            logger.warning(
+                "Spike alert: %s %s for %s %s: baseline %.3f, recent %.3f after %s detections",
+                alert.kind, alert.direction, dimension.value, key,
+                alert.baseline, alert.recent, alert.detections
+            )
+            self.sink.emit(alert)
+
+    def _alert(
+        self,
+        kind: str,
+        direction: str,
+        dimension: Dimension,
+        key: str,
+        state: _KeyState,
+        baseline: float,
+        recent: float,
+        cusum: float,
+        threshold: float,
+        now: float
+    ) -> SpikeAlert:
+        return SpikeAlert(
+            kind=kind,
+            direction=direction,
+            dimension=dimension.value,
+            key=key,
+            baseline=baseline,
+            recent=recent,
+            cusum=cusum,
+            threshold=threshold,
+            detections=state.events,
+            timestamp=datetime.fromtimestamp(now)
+        )
+
+    def get_report(self, limit: int = 20) -> SpikeReport:
+        """
+        Get recent alerts and detector state
+
+        Args:
+            limit: Maximum alerts returned, newest first
+
+        Returns:
+            SpikeReport with alerts and tracked keys per dimension
+        """
+        return SpikeReport(
+            enabled=self.enabled,
+            dimensions=[dimension.value for dimension in self.dimensions],
+            events=self.events,
+            tracked_keys={dimension.value: len(keys) for dimension, keys in self._keys.items()},
+            alerts_total=self.alerts_total,
+            alerts=list(self.alerts)[::-1][:limit],
+            alert_file=self.sink.path or None,
+            webhook=bool(self.sink.webhook_url),
+            sink_errors=self.sink.errors,
+            timestamp=datetime.now()
+        )
+
+    def reset(self):
+        """Drop all key statistics and alerts"""
+        for keys in self._keys.values():
+            keys.clear()
+        self.events = 0
+        self.alerts_total = 0
+        self.alerts.clear()
@@ -0,0 +1,339 @@
+"""
+Keypoint Verification Service for BUCChain AI
+
+Geometric verification of logos and labels against known-genuine reference
+images. Local features (ORB or AKAZE, both binary) are matched with a FLANN
+LSH index and filtered with a RANSAC homography; the number of geometrically
+consistent inliers gives the authenticity score.
+
+Reference features are extracted once at registration time and stored on
+disk, one compressed file per reference image:
+
+    <store>/<key>/<id>.npz   keypoint coordinates, descriptors, detector
+
+where <key> is a digest of the exact product id (the id the embedding index
+stores), so distinct ids never share a directory.
+
+They are loaded lazily per product and kept in an LRU cache together with
+their trained FLANN matchers, so a request only pays for extracting the
+query features and matching. Cache entries remember the product
+directory's modification time and are reloaded when it changes, so
+references registered by other worker processes are picked up.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ai.utils.config import settings
+from ai.utils.helpers import fit_within
+
+logger = logging.getLogger(__name__)
+
+# FLANN LSH parameters for binary descriptors (ORB 32 bytes, AKAZE 61 bytes)
+FLANN_INDEX_LSH = 6
+LSH_PARAMS = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+SEARCH_PARAMS = dict(checks=50)
+
+RANSAC_REPROJECTION_THRESHOLD = 5.0
+
+# Product ids that the earlier layout stored verbatim as directory names
+LEGACY_ID = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
+def product_key(product_id: str) -> str:
+    """
+    Filesystem-safe key of a product id
+
+    Args:
+        product_id: Exact product id
+
+    Returns:
+        Hex digest; distinct ids get distinct keys
+    """
+    return hashlib.blake2b(product_id.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def create_detector(name: str, max_features: int):
+    """
+    Create an OpenCV feature detector
+
+    Args:
+        name: "orb" or "akaze"
+        max_features: Maximum keypoints kept (ORB only; AKAZE is threshold based)
+
+    Returns:
+        cv2.Feature2D instance
+
+    Raises:
+        ValueError: If the detector name is unknown
+    """
+    if name == "orb":
+        return cv2.ORB_create(nfeatures=max_features)
+    if name == "akaze":
+        return cv2.AKAZE_create()
+    raise ValueError(f"Unknown keypoint detector: {name}")
+
+
+@dataclass
+class ReferenceFeatures:
+    """Cached features of one reference image"""
+    name: str
+    points: np.ndarray
+    matcher: cv2.FlannBasedMatcher
+
+
+@dataclass
+class ProductReferences:
+    """All cached references of one product"""
+    references: List[ReferenceFeatures]
+    # Modification time of the product directory when it was loaded
+    stamp: int = 0
+    # FLANN search is read-only, but serialize per product to stay safe
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class VerificationResult:
+    """Outcome of verifying an image against a product's references"""
+    verified: bool
+    authenticity_score: float
+    inliers: int
+    good_matches: int
+    query_keypoints: int
+    best_reference: Optional[str]
+    reference_count: int
+
+
+def _build_matcher(descriptors: np.ndarray) -> cv2.FlannBasedMatcher:
+    """Train a FLANN LSH matcher on reference descriptors"""
+    matcher = cv2.FlannBasedMatcher(LSH_PARAMS, SEARCH_PARAMS)
+    matcher.add([descriptors])
+    matcher.train()
+    return matcher
+
+
+class VerificationService:
+    """Keypoint matching against genuine references"""
+
+    def __init__(self, store_dir: Optional[str] = None):
+        self.store_dir = Path(store_dir or settings.keypoint_store_dir)
+        self.detector_name = settings.keypoint_detector.lower()
+        self.max_features = settings.keypoint_max_features
+        self.image_size = settings.keypoint_image_size
+        self.cache_size = settings.keypoint_cache_size
+        self.ratio = settings.keypoint_ratio
+        self.min_inliers = settings.keypoint_min_inliers
+        self.inlier_target = settings.keypoint_inlier_target
+        self._cache: "OrderedDict[str, ProductReferences]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def detector(self):
+        """Per-thread feature detector (cv2 detectors are not thread-safe)"""
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = create_detector(self.detector_name, self.max_features)
+            self._local.detector = detector
+        return detector
+
+    def _product_dir(self, product_id: str) -> Path:
+        """Store directory of a product, named by a digest of its id"""
+        directory = self.store_dir / product_key(product_id)
+        if not directory.exists():
+            self._migrate_legacy_dir(product_id, directory)
+        return directory
+
+    def _migrate_legacy_dir(self, product_id: str, directory: Path):
+        """Move references stored under the id itself (earlier layout) to the digest directory"""
+        # Only ids that were stored unaltered can be attributed unambiguously
+        if not LEGACY_ID.match(product_id) or product_id in (".", ".."):
+            return
+        legacy = self.store_dir / product_id
+        if legacy.is_dir():
+            try:
+                os.rename(legacy, directory)
+                logger.info("Moved keypoint references of %s to %s", product_id, directory.name)
+            except OSError:
+                # Another worker moved it first
+                pass
+
+    def extract(self, img: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Extract keypoints and binary descriptors
+
+        Images are downscaled to KEYPOINT_IMAGE_SIZE first; the homography
+        check does not depend on absolute scale.
+
+        Args:
+            img: Input image (BGR format)
+
+        Returns:
+            Tuple of (keypoint coordinates (N, 2) float32, descriptors or None)
+        """
+        target_size = fit_within(img, self.image_size)
+        if target_size is not None:
+            img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        keypoints, descriptors = self.detector.detectAndCompute(gray, None)
+        points = np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2)
+        return points, descriptors
+
+    def register_reference(self, product_id: str, img: np.ndarray) -> int:
+        """
+        Extract and store the features of a genuine reference image
+
+        Args:
+            product_id: Product the reference belongs to
+            img: Reference image (BGR format)
+
+        Returns:
+            Number of keypoints stored (0 if the image has too few features)
+        """
+        points, descriptors = self.extract(img)
+        if descriptors is None or len(points) < self.min_inliers:
+            logger.warning("Reference for %s has too few keypoints (%s); not stored", product_id, len(points))
+            return 0
+
+        product_dir = self._product_dir(product_id)
+        product_dir.mkdir(parents=True, exist_ok=True)
+        # Unique per reference, so concurrent registrations never overwrite each other
+        name = f"{uuid.uuid4().hex}.npz"
+        tmp_path = product_dir / f".{name}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, points=points, descriptors=descriptors, detector=self.detector_name)
+        os.replace(tmp_path, product_dir / name)
+
+        with self._cache_lock:
+            self._cache.pop(product_id, None)
+        return len(points)
+
+    def _load(self, product_id: str, stamp: int) -> Optional[ProductReferences]:
+        """Load a product's references from disk and train their matchers"""
+        references = []
+        for path in sorted(self._product_dir(product_id).glob("*.npz")):
+            with np.load(path) as data:
+                if str(data["detector"]) != self.detector_name:
+                    logger.warning("Skipping %s: extracted with %s, not %s", path, data['detector'], self.detector_name)
+                    continue
+                references.append(ReferenceFeatures(
+                    name=path.stem,
+                    points=data["points"],
+                    matcher=_build_matcher(data["descriptors"])
+                ))
+        return ProductReferences(references, stamp) if references else None
+
+    def get_references(self, product_id: str) -> Optional[ProductReferences]:
+        """
+        References of a product, loaded on first use and LRU-cached
+
+        Args:
+            product_id: Product id
+
+        Returns:
+            ProductReferences, or None if the product has no stored references
+        """
+        # Adding a reference (in any worker) changes the directory's mtime
+        try:
+            stamp = os.stat(self._product_dir(product_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._cache_lock:
+            entry = self._cache.get(product_id)
+            if entry is not None and entry.stamp == stamp:
+                self._cache.move_to_end(product_id)
+                self.cache_hits += 1
+                return entry
+            self.cache_misses += 1
+
+        entry = self._load(product_id, stamp)
+        if entry is None:
+            return None
+
+        with self._cache_lock:
+            self._cache[product_id] = entry
+            self._cache.move_to_end(product_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _count_inliers(
+        self,
+        reference: ReferenceFeatures,
+        points: np.ndarray,
+        descriptors: np.ndarray
+    ) -> Tuple[int, int]:
+        """Ratio-test matches and RANSAC homography inliers against one reference"""
+        good = []
+        for pair in reference.matcher.knnMatch(descriptors, k=2):
+            # LSH can return fewer than two candidates
+            if len(pair) == 2 and pair[0].distance < self.ratio * pair[1].distance:
+                good.append(pair[0])
+        if len(good) < 4:
+            return 0, len(good)
+
+        src = points[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+        dst = reference.points[[m.trainIdx for m in good]].reshape(-1, 1, 2)
+        homography, mask = cv2.findHomography(src, dst, cv2.RANSAC, RANSAC_REPROJECTION_THRESHOLD)
+        if homography is None or mask is None:
+            return 0, len(good)
+        # Reject degenerate or mirrored transforms
+        det = homography[0, 0] * homography[1, 1] - homography[0, 1] * homography[1, 0]
+        if not 0.01 < det < 100:
+            return 0, len(good)
+        return int(mask.sum()), len(good)
+
+    def verify(self, product_id: str, img: np.ndarray) -> Optional[VerificationResult]:
+        """
+        Verify an image against a product's genuine references
+
+        The authenticity score is the best reference's inlier count divided
+        by KEYPOINT_INLIER_TARGET, capped at 1.0.
+
+        Args:
+            product_id: Product the upload claims to be
+            img: Uploaded image (BGR format)
+
+        Returns:
+            VerificationResult, or None if the product has no stored references
+        """
+        entry = self.get_references(product_id)
+        if entry is None:
+            return None
+
+        points, descriptors = self.extract(img)
+        best_inliers, best_matches, best_reference = 0, 0, None
+        if descriptors is not None and len(points) >= 4:
+            with entry.lock:
+                for reference in entry.references:
+                    inliers, matches = self._count_inliers(reference, points, descriptors)
+                    if inliers > best_inliers or best_reference is None:
+                        best_inliers, best_matches, best_reference = inliers, matches, reference.name
+
+        return VerificationResult(
+            verified=best_inliers >= self.min_inliers,
+            authenticity_score=min(1.0, best_inliers / self.inlier_target),
+            inliers=best_inliers,
+            good_matches=best_matches,
+            query_keypoints=len(points),
+            best_reference=best_reference,
+            reference_count=len(entry.references)
+        )
+
+
+# Global verification service instance
+verification_service = VerificationService()
@@ -1,11 +1,13 @@
 """
 Configuration management for BUCChain AI Service
 
-Uses Pydantic settings for type-safe environment variable handling.
+Uses Pydantic settings for type-safe environment variable handling, and
+splits the machine's cores between the service's processes so OpenCV, BLAS
+and the inference runtime do not each start one thread per core.
 """
 
 import os
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -21,6 +23,12 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8002
     reload: bool = False
+    workers: int = 1
+    prefork_model: bool = True  # load the model once before forking workers
+    
+    # CPU Threads (0 = cores / processes, computed by CpuResources)
+    cpu_threads_per_process: int = 0
+    cpu_affinity: bool = False  # pin each worker to its own block of cores
     
     # CORS Settings
     allowed_origins: str = "http://localhost:8000,http://localhost:3000"
@@ -29,13 +37,140 @@ class Settings(BaseSettings):
     model_name: str = "yolov10n"
     model_path: str = "./models/weights/yolov10n.pt"
     confidence_threshold: float = 0.5
+    model_input_size: int = 640
+    
+    # Inference Precision (int8 serves the statically quantized ONNX model)
+    model_precision: str = "fp32"
+    int8_model_path: str = "./models/weights/yolov10n.int8.onnx"
+    
+    # Model Cascade (a screening model decides clear cases, images scoring
+    # inside the band are escalated to MODEL_PATH)
+    cascade_enabled: bool = False
+    cascade_screen_model_path: str = ""  # defaults to the served model
+    cascade_screen_input_size: int = 320
+    cascade_band_low: float = 0.2
+    cascade_band_high: float = 0.7
+    cascade_batch_size: int = 8
+    cascade_batch_window_ms: float = 10.0
+    
+    # Region-of-interest pre-crop
+    roi_crop_enabled: bool = False
+    roi_margin: float = 0.05
+    roi_min_area_ratio: float = 0.05
+    
+    # Adaptive Input Resolution (input size per image from its edge density;
+    # needs an ONNX export with dynamic height and width)
+    adaptive_resolution_enabled: bool = False
+    adaptive_input_sizes: str = "320,480,640,960"
+    adaptive_edge_thresholds: str = "0.04,0.08,0.12"  # densities separating the sizes
+    adaptive_batch_size: int = 8
+    adaptive_batch_window_ms: float = 5.0
+    
+    # HEIC / AVIF Decoding (embedded previews at least this large on their
+    # longest side are decoded instead of the full image; 0 = never)
+    image_preview_min_side: int = 640
+    
+    # Image Quality Gate (checked on a downscaled view before inference)
+    quality_gate_enabled: bool = True
+    quality_min_width: int = 224
+    quality_min_height: int = 224
+    quality_blur_threshold: float = 50.0
+    quality_dark_threshold: float = 35.0
+    quality_bright_threshold: float = 225.0
+    quality_clipped_fraction: float = 0.5
+    quality_uniform_std: float = 6.0
+    
+    # Multi-frame Detection (short clips and photo bursts)
+    burst_max_keyframes: int = 5
+    burst_max_frames: int = 300  # frames examined per clip
+    burst_frame_stride: int = 2  # examine every Nth frame at most
+    burst_min_difference: float = 12.0  # mean gray-level difference of distinct views
+    burst_keyframe_max_side: int = 1280  # keyframes are stored downscaled to this
+    burst_max_images: int = 20
+    burst_max_video_mb: int = 50
+    
+    # Reference Embedding Index
+    embedding_index_dir: str = "./data/embedding_index"
+    embedding_nprobe: int = 16
+    embedding_train_threshold: int = 10000
+    
+    # Keypoint Verification
+    keypoint_store_dir: str = "./data/keypoints"
+    keypoint_detector: str = "orb"  # orb or akaze
+    keypoint_max_features: int = 1000
+    keypoint_image_size: int = 800
+    keypoint_cache_size: int = 64
+    keypoint_ratio: float = 0.75
+    keypoint_min_inliers: int = 15
+    keypoint_inlier_target: int = 60
+    
+    # Inference Worker Processes (0 runs inference in threads of the API process)
+    inference_processes: int = 0
+    frame_ring_slots: int = 8
+    frame_slot_mb: int = 40
     
     # API Configuration
     api_v1_prefix: str = "/api/v1"
     
+    # Admission Control
+    latency_slo_ms: float = 1000.0
+    max_concurrent_inferences: int = 4
+    max_queue_depth: int = 64
+    degraded_input_size: int = 320
+    admission_window: int = 100
+    
+    # Priority Lanes (weighted-fair share of inference slots)
+    interactive_lane_weight: int = 4
+    bulk_lane_weight: int = 1
+    
+    # Client Quotas (token bucket and concurrency cap per client, shared by
+    # all workers through a SQLite database in /dev/shm)
+    quota_enabled: bool = False  # needs per-client headers behind a proxy
+    quota_rate: float = 20.0  # images per second
+    quota_burst: float = 100.0
+    quota_max_concurrent: int = 8  # requests in flight
+    quota_client_header: str = "X-Client-Id"  # used when no X-API-Key is sent
+    quota_client_limits: Dict[str, Dict[str, float]] = {}  # per-client overrides (JSON)
+    quota_db_path: str = ""  # defaults to /dev/shm/bucchain-quota-<port>.sqlite3
+    quota_busy_timeout_ms: int = 20  # wait for the database lock, then admit
+    
+    # Analytics Rollups (per-dimension time buckets; the top keys are kept
+    # exactly, the rest in a count-min sketch)
+    rollup_bucket_minutes: int = 60
+    rollup_retention_hours: int = 24
+    rollup_top_keys: int = 200
+    rollup_sketch_width: int = 2048
+    rollup_sketch_depth: int = 4
+    
+    # Spike Detection (CUSUM of counterfeit rate and confidence per key;
+    # alerts go to /analytics/spikes, the alert file and the webhook)
+    spike_detection_enabled: bool = True
+    spike_dimensions: str = "supplier,product,region"
+    spike_max_keys: int = 5000  # per dimension, least recently seen dropped
+    spike_baseline_events: int = 500
+    spike_min_events: int = 50
+    spike_rate_delta: float = 0.1
+    spike_rate_threshold: float = 12.0  # log-likelihood ratio
+    spike_confidence_threshold: float = 15.0  # standard deviations
+    spike_cooldown_s: float = 900.0
+    spike_alert_file: str = ""  # JSON-lines file, e.g. ./data/spike_alerts.jsonl (empty: none)
+    spike_webhook_url: str = ""
+    spike_webhook_timeout_s: float = 2.0
+    
+    # Memory Watchdog (soft limit 0 = monitor only, never recycle)
+    memory_soft_limit_mb: int = 0
+    memory_check_interval_s: float = 5.0
+    memory_drain_timeout_s: float = 30.0
+    memory_trace_frames: int = 1  # tracemalloc frames kept per allocation
+    memory_trace_at_startup: bool = False
+    
     # Logging
     log_level: str = "INFO"
     log_file: str = "ai_service.log"
+    log_queue: bool = True  # write logs from a background thread
+    log_max_bytes: int = 10 * 1024 * 1024  # rotate ai_service.log at this size
+    log_backup_count: int = 5
+    log_sample_rate: float = 10.0  # per-request INFO messages per second (0 = all)
     
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -48,11 +183,122 @@ class Settings(BaseSettings):
         """Parse CORS origins from comma-separated string"""
         return [origin.strip() for origin in self.allowed_origins.split(",")]
     
+    @property
+    def adaptive_sizes(self) -> List[int]:
+        """Parse adaptive input sizes from comma-separated string"""
+        return [int(size) for size in self.adaptive_input_sizes.split(",") if size.strip()]
+    
+    @property
+    def adaptive_thresholds(self) -> List[float]:
+        """Parse adaptive edge-density thresholds from comma-separated string"""
+        return [float(value) for value in self.adaptive_edge_thresholds.split(",") if value.strip()]
+    
+    @property
+    def active_model_path(self) -> str:
+        """Model weights to serve for the configured precision"""
+        if self.model_precision.lower() == "int8":
+            return self.int8_model_path
+        return self.model_path
+    
     @property
     def model_exists(self) -> bool:
         """Check if model weights file exists"""
-        return os.path.exists(self.model_path)
+        return os.path.exists(self.active_model_path)
+
+
+# Environment variables read by BLAS / OpenMP libraries when they load
+BLAS_THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS"
+)
+
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on (respects cgroup / taskset limits)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CpuResources:
+    """
+    Per-process CPU thread budget
+    
+    Every API worker (and, with INFERENCE_PROCESSES, every inference process
+    it owns) gets cores / processes threads, applied to OpenCV, BLAS and
+    ONNX Runtime alike. With CPU_AFFINITY each API worker is also pinned to
+    its own block of cores; inference processes inherit the block.
+    """
+    
+    def __init__(self, config: Settings):
+        self.cpus = available_cpus()
+        self.cores = len(self.cpus)
+        self.workers = max(1, config.workers)
+        self.processes = self.workers * max(1, config.inference_processes)
+        self.threads = config.cpu_threads_per_process or max(1, self.cores // self.processes)
+        self.pin = config.cpu_affinity
+        self.worker_index: Optional[int] = None
+    
+    def export_env(self):
+        """
+        Set the BLAS thread variables (explicit environment values win)
+        
+        Must run before numpy is imported; child processes inherit them.
+        """
+        for name in BLAS_THREAD_VARIABLES:
+            os.environ.setdefault(name, str(self.threads))
+    
+    def worker_cpus(self, worker_index: int) -> List[int]:
+        """Block of cores for one API worker"""
+        width = max(1, self.cores // self.workers)
+        start = (worker_index * width) % self.cores
+        return self.cpus[start:start + width]
+    
+    def apply(self, worker_index: Optional[int] = None):
+        """
+        Apply the budget to the current process
+        
+        Args:
+            worker_index: Index of this API worker; with CPU_AFFINITY the
+                process is pinned to that worker's block of cores
+        """
+        import cv2
+        cv2.setNumThreads(self.threads)
+        if self.pin and worker_index is not None and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.worker_cpus(worker_index))
+            self.worker_index = worker_index
+    
+    def layout(self, intra_op_threads: Optional[int] = None) -> Dict:
+        """
+        Effective thread layout of the current process
+        
+        Args:
+            intra_op_threads: Threads of the inference runtime session
+            
+        Returns:
+            Dictionary for the /health response
+        """
+        import cv2
+        return {
+            "pid": os.getpid(),
+            "cores": self.cores,
+            "workers": self.workers,
+            "processes": self.processes,
+            "threads_per_process": self.threads,
+            "opencv_threads": cv2.getNumThreads(),
+            "blas_threads": int(os.environ.get("OPENBLAS_NUM_THREADS") or os.environ.get("OMP_NUM_THREADS") or 0),
+            "intra_op_threads": intra_op_threads,
+            "affinity": available_cpus() if self.pin else None,
+            "worker_index": self.worker_index
+        }
 
 
 # Global settings instance
 settings = Settings()
+
+# Global CPU budget; BLAS variables are exported on import, before numpy loads
+cpu_resources = CpuResources(settings)
+cpu_resources.export_env()
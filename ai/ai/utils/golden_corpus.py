@@ -0,0 +1,389 @@
+"""
+Golden-corpus regression harness for BUCChain AI
+
+Runs a local, versioned corpus of labelled product images through the full
+detection pipeline (decode_image_bytes, then MLService.detect with the
+configured quality gate, ROI crop, preprocessing and inference backend) and
+records per image the verdict, boxes, per-stage timings and peak memory.
+The results are compared with a stored baseline: verdict changes, box IoU
+agreement, accuracy against the labels, stage latency and memory, each
+against a tolerance. Runs offline on the CPU.
+
+Corpus layout:
+
+    <corpus>/labels.json    {"<file>": true | false, ...} (is_counterfeit, as
+                            for scripts/quantize_model.py), or
+                            {"<file>": {"counterfeit": true, "boxes": [[x1, y1, x2, y2]]}}
+    <corpus>/VERSION        optional corpus version, recorded in the results
+    <corpus>/<file>         the images
+
+Every image is also fingerprinted, so only images that are identical in the
+baseline and the current run are compared.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from ai.utils.config import settings, cpu_resources
+from ai.utils.helpers import decode_image_bytes, mean_matched_iou
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages timed per image, in order ("total" spans all of them)
+STAGES = ("decode", "quality", "roi", "preprocess", "inference", "postprocess", "total")
+
+VERDICT_COUNTERFEIT = "counterfeit"
+VERDICT_AUTHENTIC = "authentic"
+VERDICT_RETAKE = "retake_photo"
+
+MB = 1024 * 1024
+
+
+class Tolerances(NamedTuple):
+    """Allowed differences between a run and its baseline"""
+    max_verdict_changes: int = 0
+    min_box_iou: float = 0.9
+    max_accuracy_drop: float = 0.0
+    latency: float = 0.15  # relative increase of a stage's median
+    latency_slack_ms: float = 1.0  # absolute increase always allowed
+    memory: float = 0.10  # relative increase of peak memory
+    memory_slack_mb: float = 2.0
+
+
+def _fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def load_corpus(corpus_dir: str) -> Dict:
+    """
+    Read a corpus' labels and version
+
+    Args:
+        corpus_dir: Corpus folder with labels.json
+
+    Returns:
+        Dict with the version and one entry (file, counterfeit, boxes) per
+        labelled image
+
+    Raises:
+        FileNotFoundError: If labels.json is missing
+    """
+    root = Path(corpus_dir)
+    labels = json.loads((root / "labels.json").read_text())
+    version_file = root / "VERSION"
+    images = []
+    for filename, label in sorted(labels.items()):
+        if isinstance(label, dict):
+            images.append({
+                "file": filename,
+                "counterfeit": bool(label.get("counterfeit")),
+                "boxes": label.get("boxes")
+            })
+        else:
+            images.append({"file": filename, "counterfeit": bool(label), "boxes": None})
+    return {
+        "path": str(root),
+        "version": version_file.read_text().strip() if version_file.exists() else None,
+        "images": images
+    }
+
+
+def _environment(ml_service) -> Dict:
+    """Software, hardware and pipeline settings the timings depend on"""
+    try:
+        import onnxruntime
+        onnxruntime_version = onnxruntime.__version__
+    except ImportError:
+        onnxruntime_version = None
+    model_path = Path(ml_service.model_path)
+    model_digest = None
+    if ml_service.is_model_loaded and model_path.is_file():
+        model_digest = _fingerprint(model_path.read_bytes())
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "onnxruntime": onnxruntime_version,
+        "machine": platform.machine(),
+        "processor": platform.processor() or None,
+        "cores": os.cpu_count(),
+        "threads_per_process": cpu_resources.threads,
+        "model_name": ml_service.model_name,
+        "model_loaded": ml_service.is_model_loaded,
+        "model_digest": model_digest,
+        "model_input_size": settings.model_input_size,
+        "model_precision": settings.model_precision,
+        "inference_processes": ml_service.inference_processes,
+        "cascade": ml_service.cascade is not None,
+        "quality_gate": ml_service.quality_gate_enabled,
+        "roi_crop": ml_service.roi_crop_enabled,
+        "adaptive_input_sizes": ml_service.resolution.sizes if ml_service.resolution else None,
+        "confidence_threshold": ml_service.confidence_threshold
+    }
+
+
+async def _detect(ml_service, data: bytes, filename: str, timings: Optional[Dict[str, float]]):
+    """Decode and detect one image as an upload would be"""
+    start = time.perf_counter()
+    img = decode_image_bytes(data, filename, max_size=len(data))
+    if timings is not None:
+        timings["decode"] = time.perf_counter() - start
+    result = await ml_service.detect(img, filename, timings=timings)
+    if timings is not None:
+        timings["total"] = time.perf_counter() - start
+    return result
+
+
+async def run_corpus(
+    corpus_dir: str,
+    ml_service,
+    repeat: int = 3,
+    warmup: int = 1,
+    memory_pass: bool = True
+) -> Dict:
+    """
+    Run every corpus image through the detection pipeline
+
+    Args:
+        corpus_dir: Corpus folder
+        ml_service: MLService with its model loaded
+        repeat: Timed runs per image; timings are their medians
+        warmup: Untimed runs per image before the timed ones
+        memory_pass: Run the corpus once more under tracemalloc for the peak
+            Python/NumPy allocation per image (kept out of the timed runs,
+            tracing slows allocation down)
+
+    Returns:
+        Results dict with the corpus, environment, per-image results and a
+        summary
+
+    Raises:
+        ValueError: If no labelled image could be read
+    """
+    corpus = load_corpus(corpus_dir)
+    root = Path(corpus_dir)
+    images = []
+    for entry in corpus["images"]:
+        path = root / entry["file"]
+        if not path.is_file():
+            logger.warning("Skipping missing image: %s", entry["file"])
+            continue
+        data = path.read_bytes()
+
+        for _ in range(warmup):
+            await _detect(ml_service, data, entry["file"], None)
+        runs: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        for _ in range(max(1, repeat)):
+            timings: Dict[str, float] = {}
+            result = await _detect(ml_service, data, entry["file"], timings)
+            for stage in STAGES:
+                runs[stage].append(timings.get(stage, 0.0))
+
+        if result.status != "completed":
+            verdict = VERDICT_RETAKE
+        else:
+            verdict = VERDICT_COUNTERFEIT if result.is_counterfeit else VERDICT_AUTHENTIC
+        boxes = [
+            [round(v, 2) for v in (d.bounding_box.x1, d.bounding_box.y1, d.bounding_box.x2, d.bounding_box.y2)]
+            for d in result.detections if d.bounding_box is not None
+        ]
+        images.append({
+            "file": entry["file"],
+            "fingerprint": _fingerprint(data),
+            "label": VERDICT_COUNTERFEIT if entry["counterfeit"] else VERDICT_AUTHENTIC,
+            "verdict": verdict,
+            "confidence": round(result.confidence, 4),
+            "boxes": boxes,
+            "label_box_iou": mean_matched_iou(entry["boxes"], boxes) if entry["boxes"] is not None else None,
+            "timings_ms": {stage: float(np.median(values)) * 1000 for stage, values in runs.items()},
+            "peak_traced_mb": None
+        })
+
+    if not images:
+        raise ValueError(f"No labelled images could be read from {corpus_dir}")
+
+    if memory_pass:
+        tracemalloc.start()
+        try:
+            for image in images:
+                data = (root / image["file"]).read_bytes()
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                await _detect(ml_service, data, image["file"], None)
+                image["peak_traced_mb"] = (tracemalloc.get_traced_memory()[1] - base) / MB
+        finally:
+            tracemalloc.stop()
+
+    summary = summarize(images)
+    summary["peak_rss_mb"] = _peak_rss()
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus": {"path": corpus["path"], "version": corpus["version"], "images": len(images)},
+        "environment": _environment(ml_service),
+        "settings": {"repeat": repeat, "warmup": warmup, "memory_pass": memory_pass},
+        "summary": summary,
+        "images": images
+    }
+
+
+def _peak_rss() -> float:
+    """Peak RSS of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(images: List[Dict]) -> Dict:
+    """
+    Aggregate per-image results
+
+    Args:
+        images: Per-image results of run_corpus
+
+    Returns:
+        Accuracy, verdict counts, label IoU, stage latency percentiles and
+        peak traced memory
+    """
+    completed = [i for i in images if i["verdict"] != VERDICT_RETAKE]
+    correct = sum(i["verdict"] == i["label"] for i in completed)
+    positives = [i for i in completed if i["label"] == VERDICT_COUNTERFEIT]
+    flagged = [i for i in completed if i["verdict"] == VERDICT_COUNTERFEIT]
+    label_ious = [i["label_box_iou"] for i in images if i["label_box_iou"] is not None]
+    traced = [i["peak_traced_mb"] for i in images if i["peak_traced_mb"] is not None]
+    totals = [i["timings_ms"]["total"] for i in images]
+
+    return {
+        "images": len(images),
+        "retakes": len(images) - len(completed),
+        "accuracy": correct / len(completed) if completed else None,
+        "recall": sum(i["label"] == VERDICT_COUNTERFEIT for i in flagged) / len(positives) if positives else None,
+        "precision": sum(i["label"] == VERDICT_COUNTERFEIT for i in flagged) / len(flagged) if flagged else None,
+        "mean_label_box_iou": float(np.mean(label_ious)) if label_ious else None,
+        "stage_p50_ms": {
+            stage: float(np.median([i["timings_ms"][stage] for i in images])) for stage in STAGES
+        },
+        "total_p95_ms": float(np.percentile(totals, 95)),
+        "throughput_images_per_second": 1000 / float(np.mean(totals)) if np.mean(totals) > 0 else None,
+        "peak_traced_mb": max(traced) if traced else None
+    }
+
+
+def _increase(current: float, baseline: float, relative: float, slack: float) -> bool:
+    """Whether current exceeds baseline by more than the tolerance"""
+    return current > baseline * (1 + relative) + slack
+
+
+def compare_results(results: Dict, baseline: Dict, tolerances: Tolerances = Tolerances()) -> Dict:
+    """
+    Diff a run against a baseline
+
+    Args:
+        results: Results of run_corpus
+        baseline: Stored baseline results
+        tolerances: Allowed differences
+
+    Returns:
+        Report with passed, failures, warnings and the compared metrics
+    """
+    failures: List[str] = []
+    warnings: List[str] = []
+
+    for key in ("cores", "processor", "threads_per_process", "inference_processes", "onnxruntime"):
+        if results["environment"].get(key) != baseline["environment"].get(key):
+            warnings.append(
+                f"environment differs: {key} {baseline['environment'].get(key)} -> {results['environment'].get(key)}; "
+                "latency is only comparable on the same machine and settings"
+            )
+    if results["environment"].get("model_digest") != baseline["environment"].get("model_digest"):
+        warnings.append("the model changed since the baseline")
+    if results["corpus"].get("version") != baseline["corpus"].get("version"):
+        warnings.append(
+            f"corpus version {baseline['corpus'].get('version')} -> {results['corpus'].get('version')}"
+        )
+
+    # Per-image comparison of images identical in both runs
+    previous = {(i["file"], i["fingerprint"]): i for i in baseline["images"]}
+    pairs = [(previous[(i["file"], i["fingerprint"])], i) for i in results["images"]
+             if (i["file"], i["fingerprint"]) in previous]
+    if len(pairs) < len(results["images"]) or len(pairs) < len(baseline["images"]):
+        warnings.append(
+            f"{len(pairs)} images compared; {len(results['images']) - len(pairs)} new or changed, "
+            f"{len(baseline['images']) - len(pairs)} missing from this run"
+        )
+    if not pairs:
+        failures.append("no image of the baseline was found in this run")
+        return {"passed": False, "failures": failures, "warnings": warnings, "images_compared": 0}
+
+    verdict_changes = [
+        {"file": new["file"], "baseline": old["verdict"], "current": new["verdict"], "label": new["label"]}
+        for old, new in pairs if old["verdict"] != new["verdict"]
+    ]
+    if len(verdict_changes) > tolerances.max_verdict_changes:
+        failures.append(f"{len(verdict_changes)} verdicts changed (allowed {tolerances.max_verdict_changes})")
+
+    ious = [(mean_matched_iou(old["boxes"], new["boxes"]), new["file"]) for old, new in pairs]
+    box_iou = float(np.mean([iou for iou, _ in ious]))
+    if box_iou < tolerances.min_box_iou:
+        failures.append(f"box IoU agreement {box_iou:.3f} below {tolerances.min_box_iou}")
+
+    old_images = [old for old, _ in pairs]
+    new_images = [new for _, new in pairs]
+    old_summary = summarize(old_images)
+    new_summary = summarize(new_images)
+    if old_summary["accuracy"] is not None and new_summary["accuracy"] is not None:
+        drop = old_summary["accuracy"] - new_summary["accuracy"]
+        if drop > tolerances.max_accuracy_drop + 1e-9:
+            failures.append(
+                f"accuracy dropped {old_summary['accuracy']:.3f} -> {new_summary['accuracy']:.3f}"
+            )
+
+    stages = {}
+    for stage in STAGES:
+        before = old_summary["stage_p50_ms"][stage]
+        after = new_summary["stage_p50_ms"][stage]
+        stages[stage] = {"baseline_ms": before, "current_ms": after}
+        if _increase(after, before, tolerances.latency, tolerances.latency_slack_ms):
+            failures.append(f"{stage} median latency {before:.1f} -> {after:.1f} ms")
+    before, after = old_summary["total_p95_ms"], new_summary["total_p95_ms"]
+    if _increase(after, before, tolerances.latency, tolerances.latency_slack_ms):
+        failures.append(f"total p95 latency {before:.1f} -> {after:.1f} ms")
+
+    memory = {}
+    for key, old_value, new_value in (
+        ("peak_traced_mb", old_summary["peak_traced_mb"], new_summary["peak_traced_mb"]),
+        ("peak_rss_mb", baseline["summary"].get("peak_rss_mb"), results["summary"].get("peak_rss_mb"))
+    ):
+        memory[key] = {"baseline": old_value, "current": new_value}
+        if old_value is not None and new_value is not None and _increase(
+            new_value, old_value, tolerances.memory, tolerances.memory_slack_mb
+        ):
+            failures.append(f"{key} {old_value:.1f} -> {new_value:.1f} MB")
+
+    return {
+        "passed": not failures,
+        "failures": failures,
+        "warnings": warnings,
+        "images_compared": len(pairs),
+        "verdict_changes": verdict_changes,
+        "box_iou": box_iou,
+        "lowest_box_iou": [
+            {"file": name, "iou": iou} for iou, name in sorted(ious)[:5] if iou < 1.0
+        ],
+        "accuracy": {"baseline": old_summary["accuracy"], "current": new_summary["accuracy"]},
+        "stage_p50_ms": stages,
+        "total_p95_ms": {"baseline": before, "current": after},
+        "memory": memory,
+        "tolerances": tolerances._asdict()
+    }
+
@@ -2,12 +2,28 @@
 Utility helper functions for BUCChain AI Service
 """
 
+import os
+import tempfile
+import time
 import numpy as np
 import cv2
-from typing import Optional, Tuple
-from fastapi import UploadFile, HTTPException
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi import UploadFile, HTTPException, Request
 import logging
 
+from ai.utils.image_formats import (
+    CONTAINER_IMAGE_TYPES,
+    FORMAT_AVIF,
+    FORMAT_HEIC,
+    PreviewImage,
+    decode_container_image,
+    decode_tracker,
+    sniff_image_format,
+    source_size
+)
+from ai.utils.logging_config import SAMPLED
+from ai.utils.shared_frames import FrameRingFull, SharedFrame, SharedFrameRing
+
 logger = logging.getLogger(__name__)
 
 # Supported image MIME types
@@ -17,15 +33,28 @@ SUPPORTED_IMAGE_TYPES = {
     'image/png',
     'image/webp',
     'image/bmp'
+} | CONTAINER_IMAGE_TYPES
+
+# Supported video MIME types (decoded by OpenCV's FFmpeg backend)
+SUPPORTED_VIDEO_TYPES = {
+    'video/mp4',
+    'video/quicktime',
+    'video/webm',
+    'video/x-msvideo',
+    'video/x-matroska'
 }
 
 # Maximum file size (10MB)
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
+# Chunk size used when copying uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 async def validate_and_decode_image(
     file: UploadFile,
-    max_size: int = MAX_FILE_SIZE
+    max_size: int = MAX_FILE_SIZE,
+    frames: Optional[SharedFrameRing] = None
 ) -> np.ndarray:
     """
     Validate and decode uploaded image file
@@ -33,6 +62,9 @@ async def validate_and_decode_image(
     Args:
         file: Uploaded file from FastAPI
         max_size: Maximum allowed file size in bytes
+        frames: Optional shared-memory frame ring; the decoded image is
+            stored in a slot so inference workers can read it in place.
+            Release it with release_frame() when done.
         
     Returns:
         Decoded image as numpy array (BGR format)
@@ -50,7 +82,33 @@ async def validate_and_decode_image(
     
     # Read file contents
     contents = await file.read()
+    return decode_image_bytes(contents, file.filename, max_size, frames)
+
+
+def decode_image_bytes(
+    contents: bytes,
+    filename: Optional[str],
+    max_size: int = MAX_FILE_SIZE,
+    frames: Optional[SharedFrameRing] = None
+) -> np.ndarray:
+    """
+    Validate and decode encoded image bytes
     
+    Args:
+        contents: Encoded image (JPEG, PNG, WebP or BMP; HEIC and AVIF when
+            a decoder is installed, from an embedded preview when it is
+            at least IMAGE_PREVIEW_MIN_SIDE large)
+        filename: Original filename (for logging)
+        max_size: Maximum allowed size in bytes
+        frames: Optional shared-memory frame ring (see validate_and_decode_image)
+        
+    Returns:
+        Decoded image as numpy array (BGR format); a preview carries the
+        full-resolution size (see image_formats.source_size)
+        
+    Raises:
+        HTTPException: If validation fails
+    """
     # Validate file size
     if len(contents) == 0:
         raise HTTPException(
@@ -66,26 +124,145 @@ async def validate_and_decode_image(
     
     # Decode image
     try:
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        started = time.perf_counter()
+        image_format = sniff_image_format(contents)
+        preview = False
+        if image_format in (FORMAT_HEIC, FORMAT_AVIF):
+            img, preview, full_size = decode_container_image(contents, image_format)
+        else:
+            nparr = np.frombuffer(contents, np.uint8)
+            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
         if img is None:
             raise ValueError("Failed to decode image")
         
-        logger.info(f"Successfully decoded image: {file.filename}, shape: {img.shape}")
+        decode_tracker.record(
+            image_format,
+            preview,
+            (time.perf_counter() - started) * 1000,
+            img.nbytes,
+            full_size[0] * full_size[1] * 3 if preview else img.nbytes
+        )
+        logger.info(
+            "Successfully decoded image: %s, format: %s%s, shape: %s",
+            filename, image_format, " (preview)" if preview else "", img.shape, extra=SAMPLED
+        )
+        
+        if frames is not None:
+            try:
+                img = frames.put(img)
+            except FrameRingFull:
+                # Oversized frame or every slot busy: it will be pickled instead
+                pass
+        if preview:
+            # Detections and metadata are reported in full-resolution pixels
+            if not isinstance(img, SharedFrame):
+                img = img.view(PreviewImage)
+            img.source_size = full_size
         return img
         
     except Exception as e:
-        logger.error(f"Error decoding image: {e}")
+        logger.error("Error decoding image: %s", e)
         raise HTTPException(
             status_code=400,
             detail=f"Invalid image data: {str(e)}"
         )
 
 
+async def read_raw_image(request: Request, max_size: int = MAX_FILE_SIZE) -> bytes:
+    """
+    Read an image sent as the raw request body
+    
+    The content type comes from the Content-Type header; a declared
+    Content-Length over the limit is rejected before the body is read.
+    
+    Args:
+        request: Incoming request
+        max_size: Maximum allowed size in bytes
+        
+    Returns:
+        Encoded image bytes
+        
+    Raises:
+        HTTPException: If the content type or size is invalid
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in SUPPORTED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Invalid content type: {content_type or 'none'}. "
+                   f"Supported types: {', '.join(SUPPORTED_IMAGE_TYPES)}"
+        )
+    
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size: {max_size / (1024 * 1024):.1f}MB"
+    )
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_size:
+        raise too_large
+    
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_size:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def save_video_upload(file: UploadFile, max_size: int) -> str:
+    """
+    Validate an uploaded video and copy it to a temporary file
+
+    The upload is copied in fixed-size chunks, so memory use does not depend
+    on the clip size. OpenCV reads videos from paths, not buffers.
+
+    Args:
+        file: Uploaded file from FastAPI
+        max_size: Maximum allowed file size in bytes
+
+    Returns:
+        Path of the temporary file; the caller deletes it
+
+    Raises:
+        HTTPException: If the content type or size is invalid
+    """
+    if not file.content_type or file.content_type not in SUPPORTED_VIDEO_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type: {file.content_type}. "
+                   f"Supported types: {', '.join(sorted(SUPPORTED_IMAGE_TYPES | SUPPORTED_VIDEO_TYPES))}"
+        )
+
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    fd, path = tempfile.mkstemp(prefix="bucchain_clip_", suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"File too large. Maximum size: {max_size / (1024 * 1024):.1f}MB"
+                    )
+                out.write(chunk)
+        if size == 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Empty file uploaded"
+            )
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
 def preprocess_image(
     img: np.ndarray,
-    target_size: Optional[Tuple[int, int]] = None
+    target_size: Optional[Tuple[int, int]] = None,
+    out: Optional[np.ndarray] = None
 ) -> np.ndarray:
     """
     Preprocess image for model inference
@@ -93,12 +270,16 @@ def preprocess_image(
     Args:
         img: Input image (BGR format)
         target_size: Optional target size (width, height)
+        out: Optional preallocated array to resize into (e.g. a shared-memory
+            frame slot)
         
     Returns:
         Preprocessed image
     """
     if target_size:
-        img = cv2.resize(img, target_size)
+        resized = cv2.resize(img, target_size, dst=out)
+        # cv2 writes into out in place but returns a new array object
+        img = out if out is not None else resized
     
     # Additional preprocessing can be added here
     # e.g., normalization, color space conversion, etc.
@@ -106,6 +287,216 @@ def preprocess_image(
     return img
 
 
+def find_salient_region(
+    img: np.ndarray,
+    margin: float = 0.05,
+    min_area_ratio: float = 0.05,
+    max_area_ratio: float = 0.9,
+    analysis_size: int = 256
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Locate the main product region with a cheap edge/contour pass
+    
+    Runs Canny on a downscaled grayscale copy, closes the edge map so the
+    product outline forms connected blobs, and takes the bounding box of the
+    contours that make up most of the edge mass.
+    
+    Args:
+        img: Input image (BGR format)
+        margin: Padding added around the region, as a fraction of its size
+        min_area_ratio: Ignore regions smaller than this fraction of the frame
+        max_area_ratio: Skip cropping if the region covers more than this
+        analysis_size: Longest side of the downscaled analysis image
+        
+    Returns:
+        Region (x, y, width, height) in original coordinates, or None when
+        no useful crop was found
+    """
+    height, width = img.shape[:2]
+    scale = min(1.0, analysis_size / max(height, width))
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR) if scale < 1.0 else img
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    
+    # Thresholds relative to the median intensity adapt to exposure
+    median = float(np.median(gray))
+    edges = cv2.Canny(gray, int(max(0, 0.66 * median)), int(min(255, 1.33 * median)))
+    edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, np.ones((7, 7), np.uint8))
+    
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    
+    # Keep the largest contours until they cover 90% of the total contour area
+    areas = np.array([cv2.contourArea(c) for c in contours])
+    order = np.argsort(areas)[::-1]
+    cumulative = np.cumsum(areas[order])
+    keep = order[:int(np.searchsorted(cumulative, 0.9 * cumulative[-1])) + 1]
+    x, y, w, h = cv2.boundingRect(np.vstack([contours[i] for i in keep]))
+    
+    frame_area = small.shape[0] * small.shape[1]
+    if not min_area_ratio * frame_area <= w * h <= max_area_ratio * frame_area:
+        return None
+    
+    pad_x, pad_y = w * margin, h * margin
+    x1 = max(0, int((x - pad_x) / scale))
+    y1 = max(0, int((y - pad_y) / scale))
+    x2 = min(width, int(np.ceil((x + w + pad_x) / scale)))
+    y2 = min(height, int(np.ceil((y + h + pad_y) / scale)))
+    return x1, y1, x2 - x1, y2 - y1
+
+
+def fit_within(
+    img: np.ndarray,
+    max_side: Optional[int]
+) -> Optional[Tuple[int, int]]:
+    """
+    Compute a downscaled size that keeps the aspect ratio
+    
+    Args:
+        img: Input image
+        max_side: Maximum length of the longest side (None for no limit)
+        
+    Returns:
+        Target size (width, height), or None if no resize is needed
+    """
+    height, width = img.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return None
+    scale = max_side / max(height, width)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def letterbox(
+    img: np.ndarray,
+    size: int,
+    pad_value: int = 114
+) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Resize keeping aspect ratio and pad to a square model input
+    
+    Args:
+        img: Input image (BGR format)
+        size: Side length of the square output
+        pad_value: Gray level used for padding
+        
+    Returns:
+        Tuple of (padded image, scale factor, (pad_x, pad_y) offsets)
+    """
+    height, width = img.shape[:2]
+    scale = min(size / height, size / width)
+    new_w, new_h = round(width * scale), round(height * scale)
+    if (new_w, new_h) != (width, height):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    padded = cv2.copyMakeBorder(
+        img,
+        pad_y, size - new_h - pad_y,
+        pad_x, size - new_w - pad_x,
+        cv2.BORDER_CONSTANT,
+        value=(pad_value, pad_value, pad_value)
+    )
+    return padded, scale, (pad_x, pad_y)
+
+
+def to_model_input(
+    img: np.ndarray,
+    size: int
+) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Convert a BGR image to a normalized NCHW float32 RGB tensor
+    
+    Args:
+        img: Input image (BGR format)
+        size: Square model input size
+        
+    Returns:
+        Tuple of (tensor of shape (1, 3, size, size), scale, (pad_x, pad_y))
+    """
+    padded, scale, pad = letterbox(img, size)
+    tensor = cv2.dnn.blobFromImage(padded, scalefactor=1 / 255.0, swapRB=True)
+    return tensor, scale, pad
+
+
+def box_iou(a: Sequence[float], b: Sequence[float]) -> float:
+    """
+    Intersection over union of two (x1, y1, x2, y2) boxes
+    
+    Args:
+        a: First box
+        b: Second box
+        
+    Returns:
+        IoU between 0 and 1
+    """
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def mean_matched_iou(
+    reference: List[Sequence[float]],
+    candidate: List[Sequence[float]]
+) -> float:
+    """
+    Greedily match two box sets and average their IoU
+    
+    Unmatched boxes on either side count as IoU 0, so the score reflects both
+    localization drift and missing/extra detections. Two empty sets agree
+    perfectly.
+    
+    Args:
+        reference: Reference boxes (x1, y1, x2, y2)
+        candidate: Candidate boxes (x1, y1, x2, y2)
+        
+    Returns:
+        Mean IoU between 0 and 1
+    """
+    if not reference and not candidate:
+        return 1.0
+    pairs = sorted(
+        ((box_iou(r, c), i, j) for i, r in enumerate(reference) for j, c in enumerate(candidate)),
+        reverse=True
+    )
+    used_ref, used_cand, total = set(), set(), 0.0
+    for iou, i, j in pairs:
+        if iou <= 0 or i in used_ref or j in used_cand:
+            continue
+        used_ref.add(i)
+        used_cand.add(j)
+        total += iou
+    return total / max(len(reference), len(candidate))
+
+
+class StageTimer:
+    """
+    Times consecutive pipeline stages
+    
+    Each mark() adds the time since the previous mark to the named stage. The
+    clock always runs (a perf_counter call per mark), but durations are only
+    stored when a dict is given, so callers that do not ask pay nothing else.
+    """
+    
+    __slots__ = ("stages", "_last")
+    
+    def __init__(self, stages: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            stages: Dict receiving seconds per stage name, or None
+        """
+        self.stages = stages
+        self._last = time.perf_counter()
+    
+    def mark(self, stage: str):
+        """End the current stage and start the next one"""
+        now = time.perf_counter()
+        if self.stages is not None:
+            self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
 def validate_confidence(confidence: float) -> float:
     """
     Validate and clamp confidence value
@@ -130,7 +521,8 @@ def format_image_metadata(img: np.ndarray, filename: str) -> dict:
     Returns:
         Dictionary with image metadata
     """
-    height, width = img.shape[:2]
+    # A preview reports the size of the full-resolution image
+    width, height = source_size(img)
     channels = img.shape[2] if len(img.shape) == 3 else 1
     
     return {
@@ -138,6 +530,6 @@ def format_image_metadata(img: np.ndarray, filename: str) -> dict:
         "width": width,
         "height": height,
         "channels": channels,
-        "size": img.size,
+        "size": width * height * channels,
         "dtype": str(img.dtype)
     }
@@ -0,0 +1,308 @@
+"""
+HEIC / AVIF decoding and decode statistics for BUCChain AI
+
+OpenCV decodes JPEG, PNG, WebP and BMP. HEIC (the iPhone camera format) is
+decoded with pillow-heif and AVIF with Pillow's AVIF plugin (or pillow-heif
+when its libheif has an AV1 decoder); both are optional dependencies and the
+formats are only accepted when a decoder is installed.
+
+HEIF containers often carry embedded thumbnails. When one is at least
+IMAGE_PREVIEW_MIN_SIDE on its longest side it is decoded instead of the
+full image: the model sees MODEL_INPUT_SIZE pixels anyway, and decoding a
+1024 px preview of a 12 MP photo is several times faster and needs a
+fraction of the memory. Previews are only used when they are a scaled copy
+of the image (same aspect ratio and pixel layout), and are handed on as
+PreviewImage arrays that carry the full-resolution size, so detections and
+image metadata are still reported in full-resolution pixels.
+
+Decode time and decoded-buffer size are tracked per format and decode path,
+so the gain over full-resolution decoding shows up in /analytics/decode.
+"""
+
+import io
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ai.models.analytics import DecodeFormatStats, ImageDecodeStats
+from ai.utils.config import settings
+
+try:
+    import pillow_heif
+except ImportError:  # pragma: no cover - optional dependency
+    pillow_heif = None
+
+try:
+    from PIL import Image, ImageOps, features as pil_features
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+# Formats told apart by their leading bytes
+FORMAT_JPEG = "jpeg"
+FORMAT_PNG = "png"
+FORMAT_WEBP = "webp"
+FORMAT_BMP = "bmp"
+FORMAT_HEIC = "heic"
+FORMAT_AVIF = "avif"
+FORMAT_OTHER = "other"
+
+# Decode paths
+DECODE_FULL = "full"
+DECODE_PREVIEW = "preview"
+
+# ISO-BMFF brands (ftyp box) of HEIC and AVIF files, and of HEIF files in
+# general (codec left to the decoder)
+HEIC_BRANDS = {b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"hevm", b"hevs"}
+AVIF_BRANDS = {b"avif", b"avis"}
+HEIF_BRANDS = {b"mif1", b"msf1"}
+
+# libheif decoder plugins that handle AV1
+AV1_DECODERS = ("dav1d", "aom", "libaom")
+
+MB = 1024 * 1024
+
+
+def _heif_decodes_av1() -> bool:
+    if pillow_heif is None:
+        return False
+    decoders = pillow_heif.libheif_info().get("decoders") or {}
+    return any(name in decoders for name in AV1_DECODERS)
+
+
+def _pillow_decodes_avif() -> bool:
+    if Image is None:
+        return False
+    try:
+        return bool(pil_features.check("avif"))
+    except ValueError:  # Pillow older than 11.3
+        return False
+
+
+HEIC_SUPPORTED = pillow_heif is not None
+AVIF_VIA_HEIF = _heif_decodes_av1()
+AVIF_SUPPORTED = AVIF_VIA_HEIF or _pillow_decodes_avif()
+
+# MIME types accepted in addition to the OpenCV formats
+CONTAINER_IMAGE_TYPES = (
+    ({"image/heic", "image/heif"} if HEIC_SUPPORTED else set())
+    | ({"image/avif"} if AVIF_SUPPORTED else set())
+)
+
+
+def sniff_image_format(contents: bytes) -> str:
+    """
+    Identify an encoded image by its leading bytes
+
+    Args:
+        contents: Encoded image
+
+    Returns:
+        One of the FORMAT_* constants
+    """
+    head = contents[:64]
+    if head.startswith(b"\xff\xd8\xff"):
+        return FORMAT_JPEG
+    if head.startswith(b"\x89PNG"):
+        return FORMAT_PNG
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return FORMAT_WEBP
+    if head.startswith(b"BM"):
+        return FORMAT_BMP
+    if head[4:8] == b"ftyp":
+        # Major brand, then the compatible brands
+        box_size = int.from_bytes(head[:4], "big")
+        brands = [head[8:12]] + [head[i:i + 4] for i in range(16, min(box_size, len(head)) - 3, 4)]
+        for brand in brands:
+            if brand in AVIF_BRANDS:
+                return FORMAT_AVIF
+            if brand in HEIC_BRANDS:
+                return FORMAT_HEIC
+        if HEIF_BRANDS.intersection(brands):
+            return FORMAT_HEIC
+    return FORMAT_OTHER
+
+
+class PreviewImage(np.ndarray):
+    """
+    Image decoded from an embedded preview
+
+    Carries the (width, height) of the full-resolution image. Views and
+    results derived from it are plain arrays.
+    """
+
+    source_size: Optional[Tuple[int, int]] = None
+
+    def __array_finalize__(self, obj):
+        self.source_size = None
+
+
+def source_size(img: np.ndarray) -> Tuple[int, int]:
+    """
+    Size of the image an array was decoded from
+
+    Args:
+        img: Decoded image (a preview carries its full-resolution size)
+
+    Returns:
+        (width, height)
+    """
+    return getattr(img, "source_size", None) or (img.shape[1], img.shape[0])
+
+
+def _to_bgr(img: np.ndarray) -> np.ndarray:
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    if img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+    return img
+
+
+def _select_preview(image, min_side: int):
+    """Smallest embedded thumbnail that is a scaled copy at least min_side large"""
+    width, height = image.size
+    best = None
+    for index, side in enumerate(image.info.get("thumbnails", [])):
+        if side < min_side or side >= max(width, height):
+            continue
+        try:
+            thumbnail = image.get_thumbnail(index)
+        except (IndexError, RuntimeError, ValueError):
+            continue
+        t_width, t_height = thumbnail.size
+        # Rotated or cropped previews have a different aspect ratio
+        if thumbnail.mode != image.mode or abs(t_width * height - t_height * width) > 2 * max(width, height):
+            continue
+        if best is None or t_width * t_height < best.size[0] * best.size[1]:
+            best = thumbnail
+    return best
+
+
+def _decode_heif(contents: bytes, min_side: int) -> Tuple[np.ndarray, bool, Tuple[int, int]]:
+    heif_file = pillow_heif.open_heif(contents, convert_hdr_to_8bit=True, bgr_mode=True)
+    image = heif_file[heif_file.primary_index]
+    preview = _select_preview(image, min_side) if min_side > 0 else None
+    if preview is not None:
+        try:
+            return _to_bgr(np.asarray(preview)), True, image.size
+        except (RuntimeError, ValueError):
+            # Corrupt thumbnail: fall back to the image itself
+            pass
+    return _to_bgr(np.asarray(image)), False, image.size
+
+
+def _decode_pillow(contents: bytes) -> Tuple[np.ndarray, bool, Tuple[int, int]]:
+    with Image.open(io.BytesIO(contents)) as pil_image:
+        pil_image = ImageOps.exif_transpose(pil_image).convert("RGB")
+    img = cv2.cvtColor(np.asarray(pil_image), cv2.COLOR_RGB2BGR)
+    return img, False, (img.shape[1], img.shape[0])
+
+
+def decode_container_image(
+    contents: bytes,
+    image_format: str,
+    min_side: Optional[int] = None
+) -> Tuple[np.ndarray, bool, Tuple[int, int]]:
+    """
+    Decode a HEIC or AVIF image, from an embedded preview when possible
+
+    Args:
+        contents: Encoded image
+        image_format: FORMAT_HEIC or FORMAT_AVIF (see sniff_image_format)
+        min_side: Smallest longest side of a usable preview; 0 always
+            decodes the full image (defaults to IMAGE_PREVIEW_MIN_SIDE)
+
+    Returns:
+        (BGR image, whether a preview was decoded, (width, height) of the
+        full-resolution image)
+
+    Raises:
+        ValueError: If no decoder for the format is installed
+    """
+    min_side = settings.image_preview_min_side if min_side is None else min_side
+    if image_format == FORMAT_HEIC and HEIC_SUPPORTED:
+        return _decode_heif(contents, min_side)
+    if image_format == FORMAT_AVIF and AVIF_VIA_HEIF:
+        return _decode_heif(contents, min_side)
+    if image_format == FORMAT_AVIF and AVIF_SUPPORTED:
+        return _decode_pillow(contents)
+    package = "pillow-heif" if image_format == FORMAT_HEIC else "Pillow 11.3+ or pillow-heif with an AV1 decoder"
+    raise ValueError(f"{image_format.upper()} images need {package} installed")
+
+
+class _FormatCounters:
+    __slots__ = ("images", "decode_ms", "max_decode_ms", "decoded_bytes", "max_decoded_bytes", "full_bytes")
+
+    def __init__(self):
+        self.images = 0
+        self.decode_ms = 0.0
+        self.max_decode_ms = 0.0
+        self.decoded_bytes = 0
+        self.max_decoded_bytes = 0
+        self.full_bytes = 0
+
+
+class DecodeTracker:
+    """Decode time and decoded-buffer size per format and decode path"""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, str], _FormatCounters] = {}
+
+    def record(self, image_format: str, preview: bool, decode_ms: float, decoded_bytes: int, full_bytes: int):
+        """
+        Record one decoded image
+
+        Args:
+            image_format: FORMAT_* constant
+            preview: Whether an embedded preview was decoded
+            decode_ms: Decode time
+            decoded_bytes: Size of the decoded BGR image
+            full_bytes: Size of the image decoded at full resolution
+        """
+        key = (image_format, DECODE_PREVIEW if preview else DECODE_FULL)
+        counters = self._counters.get(key)
+        if counters is None:
+            counters = self._counters[key] = _FormatCounters()
+        counters.images += 1
+        counters.decode_ms += decode_ms
+        counters.max_decode_ms = max(counters.max_decode_ms, decode_ms)
+        counters.decoded_bytes += decoded_bytes
+        counters.max_decoded_bytes = max(counters.max_decoded_bytes, decoded_bytes)
+        counters.full_bytes += full_bytes
+
+    def get_stats(self) -> ImageDecodeStats:
+        """
+        Get decode statistics
+
+        Returns:
+            ImageDecodeStats, one entry per format and decode path
+        """
+        formats: List[DecodeFormatStats] = []
+        for (image_format, path), counters in sorted(self._counters.items()):
+            images = counters.images
+            formats.append(DecodeFormatStats(
+                format=image_format,
+                path=path,
+                images=images,
+                average_decode_ms=counters.decode_ms / images,
+                max_decode_ms=counters.max_decode_ms,
+                average_decoded_mb=counters.decoded_bytes / images / MB,
+                max_decoded_mb=counters.max_decoded_bytes / MB,
+                average_full_resolution_mb=counters.full_bytes / images / MB
+            ))
+        return ImageDecodeStats(
+            heic_supported=HEIC_SUPPORTED,
+            avif_supported=AVIF_SUPPORTED,
+            preview_min_side=settings.image_preview_min_side,
+            formats=formats,
+            timestamp=datetime.now()
+        )
+
+    def reset(self):
+        """Reset decode statistics"""
+        self._counters.clear()
+
+
+# Global decode tracker instance
+decode_tracker = DecodeTracker()
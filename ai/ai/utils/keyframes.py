@@ -0,0 +1,189 @@
+"""
+Keyframe selection for BUCChain AI
+
+Picks the few frames of a short clip or photo burst that are worth sending
+to the model: the sharpest view of each visually distinct scene. Frames are
+scored one at a time on small grayscale thumbnails (Laplacian variance for
+sharpness, mean absolute difference for distinctness) and only the current
+keyframe candidates are kept, so memory does not grow with clip length.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+# Longest side of the view sharpness is measured on
+SHARPNESS_SIZE = 256
+
+# Side of the square thumbnail frames are differenced on
+DIFF_SIZE = 64
+
+
+@dataclass
+class Keyframe:
+    """A retained candidate frame"""
+    index: int
+    image: np.ndarray
+    thumbnail: np.ndarray
+    sharpness: float
+    difference: float = 0.0
+
+
+class KeyframeSelector:
+    """
+    Streaming keyframe selection with a fixed number of retained frames
+
+    Each offered frame is compared against the current keyframes. A frame
+    that looks like one of them replaces it only if it is sharper; a
+    distinct frame is added, or replaces the least sharp keyframe once the
+    selection is full.
+    """
+
+    def __init__(self, max_keyframes: int, min_difference: float, max_side: Optional[int] = None):
+        """
+        Args:
+            max_keyframes: Number of keyframes to keep
+            min_difference: Mean absolute gray-level difference (0-255) above
+                which two frames count as distinct views
+            max_side: Downscale retained frames to this longest side
+        """
+        self.max_keyframes = max_keyframes
+        self.min_difference = min_difference
+        self.max_side = max_side
+        self.keyframes: List[Keyframe] = []
+        self.offered = 0
+
+    @staticmethod
+    def _measure(img: np.ndarray):
+        """Sharpness score and difference thumbnail of a frame"""
+        height, width = img.shape[:2]
+        scale = min(1.0, SHARPNESS_SIZE / max(height, width))
+        view = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else img
+        gray = cv2.cvtColor(view, cv2.COLOR_BGR2GRAY) if view.ndim == 3 else view
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+        thumbnail = cv2.resize(gray, (DIFF_SIZE, DIFF_SIZE), interpolation=cv2.INTER_AREA)
+        return sharpness, thumbnail
+
+    def _retain(self, img: np.ndarray) -> np.ndarray:
+        """Copy of a frame small enough to keep around"""
+        height, width = img.shape[:2]
+        if self.max_side and max(height, width) > self.max_side:
+            scale = self.max_side / max(height, width)
+            return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return img.copy()
+
+    def offer(self, img: np.ndarray, index: Optional[int] = None) -> bool:
+        """
+        Consider a frame for the selection
+
+        The frame is copied if it is kept, so the caller may reuse its buffer.
+
+        Args:
+            img: Decoded frame (BGR format)
+            index: Frame position in the clip (defaults to the offer count)
+
+        Returns:
+            True if the frame became a keyframe
+        """
+        index = self.offered if index is None else index
+        self.offered += 1
+        sharpness, thumbnail = self._measure(img)
+
+        nearest, difference = None, math.inf
+        for keyframe in self.keyframes:
+            d = float(cv2.absdiff(thumbnail, keyframe.thumbnail).mean())
+            if d < difference:
+                nearest, difference = keyframe, d
+
+        if nearest is not None and difference < self.min_difference:
+            # Same view as an existing keyframe: keep the sharper of the two
+            if sharpness <= nearest.sharpness:
+                return False
+            victim = nearest
+        elif len(self.keyframes) < self.max_keyframes:
+            victim = None
+        else:
+            victim = min(self.keyframes, key=lambda k: k.sharpness)
+            if sharpness <= victim.sharpness:
+                return False
+
+        keyframe = Keyframe(
+            index=index,
+            image=self._retain(img),
+            thumbnail=thumbnail,
+            sharpness=sharpness
+        )
+        if victim is None:
+            self.keyframes.append(keyframe)
+        else:
+            self.keyframes[self.keyframes.index(victim)] = keyframe
+        return True
+
+    def result(self) -> List[Keyframe]:
+        """
+        Selected keyframes in clip order
+
+        Sets each keyframe's `difference` to its distance from the most
+        similar other keyframe (0 when only one was selected).
+        """
+        for keyframe in self.keyframes:
+            keyframe.difference = min(
+                (float(cv2.absdiff(keyframe.thumbnail, other.thumbnail).mean())
+                 for other in self.keyframes if other is not keyframe),
+                default=0.0
+            )
+        return sorted(self.keyframes, key=lambda k: k.index)
+
+
+def select_video_keyframes(
+    path: str,
+    selector: KeyframeSelector,
+    max_frames: int,
+    stride: int = 1
+) -> int:
+    """
+    Decode a video file frame by frame and offer frames to a selector
+
+    Only every `stride`-th frame is decoded in full (the others are grabbed
+    and skipped); the stride is widened for long clips so at most
+    `max_frames` frames are examined, spread over the whole clip.
+
+    Args:
+        path: Video file path
+        selector: Keyframe selector to feed
+        max_frames: Maximum frames to examine
+        stride: Minimum distance between examined frames
+
+    Returns:
+        Number of frames read from the clip
+
+    Raises:
+        ValueError: If the file cannot be opened as a video
+    """
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError("Unsupported or corrupt video")
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total > 0:
+            stride = max(stride, math.ceil(total / max_frames))
+
+        read = examined = 0
+        while examined < max_frames:
+            if read % stride:
+                if not capture.grab():
+                    break
+                read += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            selector.offer(frame, index=read)
+            read += 1
+            examined += 1
+        return read
+    finally:
+        capture.release()
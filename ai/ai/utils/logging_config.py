@@ -0,0 +1,273 @@
+"""
+Logging setup for BUCChain AI
+
+Request handlers only put log records on an in-memory queue; a background
+QueueListener thread formats them and writes them to stdout and a
+size-rotated log file. Messages use lazy %-style arguments, so a record is
+only formatted by the writer thread, and never when its level is disabled.
+
+Per-request INFO messages are tagged with `extra=SAMPLED` and rate limited
+per message: past LOG_SAMPLE_RATE records per second the rest are dropped
+before they reach the queue, and the next record that gets through reports
+how many were suppressed.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no process claims rotation
+    fcntl = None
+
+# Pass as `extra=` on per-request INFO logs to make them subject to sampling
+SAMPLED = {"sampled": True}
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class SamplingFilter(logging.Filter):
+    """Token-bucket rate limit for records tagged with SAMPLED"""
+
+    def __init__(self, rate: float):
+        """
+        Args:
+            rate: Records per second allowed per message (0 disables sampling)
+        """
+        super().__init__()
+        self.rate = rate
+        self._buckets: Dict[str, List[float]] = {}
+        self._suppressed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno > logging.INFO or not getattr(record, "sampled", False):
+            return True
+
+        now = time.monotonic()
+        key = record.msg
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.rate, now))
+            tokens = min(self.rate, tokens + (now - last) * self.rate)
+            if tokens < 1.0:
+                self._buckets[key] = [tokens, now]
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._buckets[key] = [tokens - 1.0, now]
+            suppressed = self._suppressed.pop(key, 0)
+
+        if suppressed:
+            record.msg = f"{record.msg} (%d similar messages suppressed)"
+            record.args = (record.args or ()) + (suppressed,)
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread
+
+    The stock handler formats every record in the calling thread before
+    queueing it. The queue here never leaves the process, so records can be
+    queued as they are; only exception tracebacks are rendered eagerly,
+    because their frames are not safe to keep for later.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class QueuedLogging:
+    """Root logger wiring: queue handler in front, writer thread behind"""
+
+    def __init__(self):
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.queue_handler: Optional[DeferredQueueHandler] = None
+        self.handlers: List[logging.Handler] = []
+
+    def configure(
+        self,
+        level: str,
+        log_file: str,
+        max_bytes: int,
+        backup_count: int,
+        sample_rate: float,
+        queued: bool = True,
+        rotate: bool = True
+    ):
+        """
+        Configure the root logger
+
+        Args:
+            level: Log level name
+            log_file: Log file path
+            max_bytes: Rotate the file at this size (0 disables rotation)
+            backup_count: Rotated files to keep
+            sample_rate: Per-message rate limit for SAMPLED records
+            queued: Write from a background thread (False writes synchronously)
+            rotate: Whether this process rotates the file; other processes
+                writing the same file reopen it after a rotation instead
+        """
+        self.stop()
+        formatter = logging.Formatter(LOG_FORMAT)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if rotate and max_bytes > 0:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count
+            )
+        else:
+            file_handler = logging.handlers.WatchedFileHandler(log_file)
+        self.handlers = [stream_handler, file_handler]
+        for handler in self.handlers:
+            handler.setFormatter(formatter)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.setLevel(getattr(logging, level.upper()))
+
+        sampler = SamplingFilter(sample_rate)
+        if queued:
+            self.queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+            self.queue_handler.addFilter(sampler)
+            root.addHandler(self.queue_handler)
+            self.listener = logging.handlers.QueueListener(
+                self.queue_handler.queue, *self.handlers, respect_handler_level=True
+            )
+            self.listener.start()
+        else:
+            for handler in self.handlers:
+                handler.addFilter(sampler)
+                root.addHandler(handler)
+
+    def restart_in_child(self, log_file: str, max_bytes: int, backup_count: int, rotate: bool):
+        """
+        Restart the writer thread in a forked child
+
+        Threads do not survive fork, so the child gets a fresh queue and
+        listener (and file handler, so only one process rotates the file).
+
+        Args:
+            log_file: Log file path
+            max_bytes: Rotation size
+            backup_count: Rotated files to keep
+            rotate: Whether this child rotates the file
+        """
+        if self.queue_handler is None:
+            return
+        # The inherited file handler belongs to the parent; drop our copy
+        self.handlers[1].close()
+        formatter = logging.Formatter(LOG_FORMAT)
+        if rotate and max_bytes > 0:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count
+            )
+        else:
+            file_handler = logging.handlers.WatchedFileHandler(log_file)
+        file_handler.setFormatter(formatter)
+        self.handlers = [self.handlers[0], file_handler]
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(
+            self.queue_handler.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def stop(self):
+        """
+        Flush queued records and stop the writer thread
+
+        Records logged afterwards (e.g. during interpreter shutdown) are
+        written synchronously instead of being lost.
+        """
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
+        root = logging.getLogger()
+        root.removeHandler(self.queue_handler)
+        for handler in self.handlers:
+            handler.filters = list(self.queue_handler.filters)
+            root.addHandler(handler)
+        self.queue_handler = None
+
+
+# Rotation lock held by this process: (pid, lock file)
+_rotation_lock: Optional[Tuple[int, object]] = None
+
+
+def claim_log_rotation(log_file: str) -> bool:
+    """
+    Claim the rotation of a log file written by independent processes
+
+    Takes a non-blocking exclusive lock on `<log_file>.lock` and keeps it
+    for the life of the process, so exactly one process rotates the file;
+    when it exits, the next process to claim the file (e.g. the worker
+    started in its place) takes over. Repeated claims in the owning
+    process succeed.
+
+    Args:
+        log_file: Log file path
+
+    Returns:
+        True if this process rotates the file
+    """
+    global _rotation_lock
+    if _rotation_lock is not None and _rotation_lock[0] == os.getpid():
+        return True
+    if fcntl is None:
+        return False
+    lock_file = open(f"{log_file}.lock", "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _rotation_lock = (os.getpid(), lock_file)
+    return True
+
+
+# Global logging instance; flushed at interpreter exit
+queued_logging = QueuedLogging()
+atexit.register(queued_logging.stop)
+
+
+def configure_logging(config, rotate: Optional[bool] = None):
+    """
+    Configure logging from settings
+
+    Args:
+        config: Settings instance
+        rotate: Whether this process rotates the log file (defaults to True
+            for a single process; with several workers only one of them may
+            rotate, see restart_logging_in_child and claim_log_rotation)
+    """
+    if rotate is None:
+        rotate = config.workers <= 1
+    queued_logging.configure(
+        level=config.log_level,
+        log_file=config.log_file,
+        max_bytes=config.log_max_bytes,
+        backup_count=config.log_backup_count,
+        sample_rate=config.log_sample_rate,
+        queued=config.log_queue,
+        rotate=rotate
+    )
+
+
+def restart_logging_in_child(config, worker_index: int):
+    """Restart queued logging after fork; worker 0 rotates the file"""
+    queued_logging.restart_in_child(
+        config.log_file,
+        config.log_max_bytes,
+        config.log_backup_count,
+        rotate=worker_index == 0
+    )
@@ -0,0 +1,144 @@
+"""
+Pre-fork server for BUCChain AI
+
+`uvicorn --workers N` starts every worker from scratch, so each one loads its
+own copy of the model weights. The pre-fork server loads the model once in a
+master process, then forks the workers: the weights stay in pages shared
+copy-on-write between all of them, and each worker only adds its own
+activations and Python state on top.
+
+The master binds the listening socket, forks WORKERS children that each run
+a uvicorn server on it, restarts children that die, and forwards SIGTERM /
+SIGINT to them on shutdown.
+"""
+
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# Back off before restarting a worker that died this soon after starting
+MIN_WORKER_LIFETIME = 1.0
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    """Create the listening socket shared by all workers"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(
+    app,
+    sock: socket.socket,
+    log_level: str,
+    index: int,
+    worker_init: Optional[Callable[[int], None]],
+    worker_exit: Optional[Callable[[], None]]
+):
+    """Serve requests in a forked child (never returns)"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        if worker_init is not None:
+            worker_init(index)
+        # log_config=None: uvicorn's loggers propagate to the app's handlers
+        config = uvicorn.Config(app, log_level=log_level, access_log=True, log_config=None)
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker crashed")
+        code = 1
+    finally:
+        if worker_exit is not None:
+            worker_exit()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def serve_prefork(
+    app,
+    host: str,
+    port: int,
+    workers: int,
+    log_level: str,
+    preload: Callable[[], None],
+    worker_init: Optional[Callable[[int], None]] = None,
+    worker_exit: Optional[Callable[[], None]] = None
+):
+    """
+    Load the model once, then fork the uvicorn workers
+
+    Args:
+        app: ASGI application
+        host: Bind address
+        port: Bind port
+        workers: Number of worker processes
+        log_level: uvicorn log level
+        preload: Loads shared state (the model) in the master before forking
+        worker_init: Called in each child with its worker index (0..workers-1);
+            a restarted worker keeps the index of the one it replaces
+        worker_exit: Called in each child before it exits (atexit handlers do
+            not run in forked children)
+    """
+    preload()
+    # Move everything allocated so far out of the collector's reach so
+    # workers do not dirty the shared pages by scanning it
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(host, port)
+    children: Dict[int, Tuple[int, float]] = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(app, sock, log_level, index, worker_init, worker_exit)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(workers):
+        spawn(index)
+    logger.info("Pre-fork master %s serving on %s:%s with workers %s", os.getpid(), host, port, sorted(children))
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        child = children.pop(pid, None)
+        if child is None or stopping:
+            continue
+        index, started = child
+        logger.warning("Worker %s exited with status %s; restarting", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        spawn(index)
+
+    sock.close()
+    logger.info("Pre-fork master stopped")
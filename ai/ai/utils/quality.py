@@ -0,0 +1,102 @@
+"""
+Image quality gate for BUCChain AI
+
+Cheap checks run on a downscaled grayscale view right after decoding, so
+photos that would only produce unreliable verdicts (blurry, badly exposed,
+tiny or blank frames) are rejected with a "retake photo" result instead of
+going through inference.
+"""
+
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from ai.models.predictions import ImageQuality
+from ai.utils.config import settings
+
+# Longest side of the view the checks run on; thresholds are calibrated for it
+ANALYSIS_SIZE = 512
+
+# Gray levels counted as clipped shadows / highlights
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+
+
+def assess_image_quality(
+    img: np.ndarray,
+    min_width: Optional[int] = None,
+    min_height: Optional[int] = None,
+    blur_threshold: Optional[float] = None,
+    dark_threshold: Optional[float] = None,
+    bright_threshold: Optional[float] = None,
+    clipped_fraction: Optional[float] = None,
+    uniform_std: Optional[float] = None
+) -> ImageQuality:
+    """
+    Assess whether an image is usable for counterfeit detection
+
+    Thresholds default to the QUALITY_* settings.
+
+    Args:
+        img: Decoded image (BGR format)
+        min_width: Minimum width in pixels
+        min_height: Minimum height in pixels
+        blur_threshold: Minimum Laplacian variance of the analysis view
+        dark_threshold: Minimum mean gray level
+        bright_threshold: Maximum mean gray level
+        clipped_fraction: Maximum fraction of clipped shadows or highlights
+        uniform_std: Minimum gray-level standard deviation
+
+    Returns:
+        ImageQuality with measurements and the list of failed checks
+    """
+    start = time.perf_counter()
+    min_width = settings.quality_min_width if min_width is None else min_width
+    min_height = settings.quality_min_height if min_height is None else min_height
+    blur_threshold = settings.quality_blur_threshold if blur_threshold is None else blur_threshold
+    dark_threshold = settings.quality_dark_threshold if dark_threshold is None else dark_threshold
+    bright_threshold = settings.quality_bright_threshold if bright_threshold is None else bright_threshold
+    clipped_fraction = settings.quality_clipped_fraction if clipped_fraction is None else clipped_fraction
+    uniform_std = settings.quality_uniform_std if uniform_std is None else uniform_std
+
+    height, width = img.shape[:2]
+    scale = min(1.0, ANALYSIS_SIZE / max(height, width))
+    # INTER_LINEAR is ~10x cheaper than INTER_AREA at non-integer factors
+    view = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR) if scale < 1.0 else img
+    gray = cv2.cvtColor(view, cv2.COLOR_BGR2GRAY) if view.ndim == 3 else view
+
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    pixels = hist.sum()
+    levels = np.arange(256)
+    brightness = float((hist * levels).sum() / pixels)
+    contrast = float(np.sqrt((hist * (levels - brightness) ** 2).sum() / pixels))
+    under = float(hist[:DARK_LEVEL].sum() / pixels)
+    over = float(hist[BRIGHT_LEVEL:].sum() / pixels)
+    blur_score = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+    issues = []
+    if width < min_width or height < min_height:
+        issues.append("too_small")
+    if brightness < dark_threshold or under > clipped_fraction:
+        issues.append("underexposed")
+    if brightness > bright_threshold or over > clipped_fraction:
+        issues.append("overexposed")
+    # Badly exposed or blank frames also look blurry; only report the cause
+    if not issues:
+        if contrast < uniform_std:
+            issues.append("uniform_frame")
+        elif blur_score < blur_threshold:
+            issues.append("blurry")
+
+    return ImageQuality.model_construct(
+        passed=not issues,
+        issues=issues,
+        blur_score=blur_score,
+        brightness=brightness,
+        underexposed_fraction=under,
+        overexposed_fraction=over,
+        contrast=contrast,
+        assessment_time_ms=(time.perf_counter() - start) * 1000
+    )
@@ -0,0 +1,205 @@
+"""
+INT8 quantization tooling for BUCChain AI
+
+Builds a statically quantized INT8 ONNX model from an FP32 export using a
+local folder of representative product images for calibration, and compares
+the two models on a labelled image set. Requires onnxruntime.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from ai.utils.helpers import mean_matched_iou, to_model_input
+
+logger = logging.getLogger(__name__)
+
+# File extensions picked up from calibration and evaluation folders
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def list_images(directory: str) -> List[Path]:
+    """
+    List image files in a directory (non-recursive, sorted)
+
+    Args:
+        directory: Folder to scan
+
+    Returns:
+        Sorted list of image paths
+    """
+    return sorted(
+        p for p in Path(directory).iterdir()
+        if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+class ImageFolderCalibrationReader:
+    """
+    Calibration data reader for onnxruntime.quantization
+
+    Implements the CalibrationDataReader protocol (get_next / rewind) and feeds
+    images preprocessed exactly like OnnxDetector does at inference time.
+    """
+
+    def __init__(
+        self,
+        image_dir: str,
+        input_name: str,
+        input_size: int = 640,
+        max_images: int = 200
+    ):
+        self.paths = list_images(image_dir)[:max_images]
+        if not self.paths:
+            raise ValueError(f"No calibration images found in {image_dir}")
+        self.input_name = input_name
+        self.input_size = input_size
+        self._index = 0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        while self._index < len(self.paths):
+            path = self.paths[self._index]
+            self._index += 1
+            img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if img is None:
+                logger.warning("Skipping unreadable calibration image: %s", path)
+                continue
+            tensor, _, _ = to_model_input(img, self.input_size)
+            return {self.input_name: tensor}
+        return None
+
+    def rewind(self):
+        self._index = 0
+
+
+def build_int8_model(
+    fp32_path: str,
+    image_dir: str,
+    output_path: str,
+    input_size: int = 640,
+    max_images: int = 200,
+    per_channel: bool = True
+) -> str:
+    """
+    Statically quantize an FP32 ONNX model to INT8
+
+    Args:
+        fp32_path: FP32 ONNX model
+        image_dir: Folder of representative product images
+        output_path: Where to write the INT8 model
+        input_size: Square model input size
+        max_images: Maximum number of calibration images
+        per_channel: Quantize weights per output channel
+
+    Returns:
+        Path to the INT8 model
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import (
+        CalibrationMethod,
+        QuantFormat,
+        QuantType,
+        quantize_static
+    )
+
+    input_name = ort.InferenceSession(
+        fp32_path, providers=["CPUExecutionProvider"]
+    ).get_inputs()[0].name
+    reader = ImageFolderCalibrationReader(image_dir, input_name, input_size, max_images)
+
+    logger.info("Calibrating %s with %s images", fp32_path, len(reader.paths))
+    quantize_static(
+        fp32_path,
+        output_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        calibrate_method=CalibrationMethod.MinMax
+    )
+    logger.info("INT8 model written to %s", output_path)
+    return output_path
+
+
+def compare_models(
+    fp32_path: str,
+    int8_path: str,
+    image_dir: str,
+    labels_path: str,
+    confidence_threshold: float = 0.5,
+    input_size: int = 640
+) -> Dict[str, float]:
+    """
+    Compare FP32 and INT8 models on a labelled image set
+
+    The labels file is a JSON object mapping image filenames to the expected
+    verdict, e.g. {"bag_001.jpg": false, "bag_002.jpg": true}. An image is
+    judged counterfeit when the model returns any detection above the
+    confidence threshold, matching MLService.
+
+    Args:
+        fp32_path: FP32 ONNX model
+        int8_path: INT8 ONNX model
+        image_dir: Folder containing the labelled images
+        labels_path: JSON file of filename -> is_counterfeit
+        confidence_threshold: Detection score threshold
+        input_size: Square model input size
+
+    Returns:
+        Report with accuracy, verdict agreement, box IoU agreement and latency
+    """
+    from ai.services.inference_backend import OnnxDetector
+
+    labels: Dict[str, bool] = json.loads(Path(labels_path).read_text())
+    fp32 = OnnxDetector(fp32_path, input_size)
+    int8 = OnnxDetector(int8_path, input_size)
+
+    correct = {"fp32": 0, "int8": 0}
+    latency = {"fp32": 0.0, "int8": 0.0}
+    agreement = 0
+    iou_total = 0.0
+    evaluated = 0
+
+    for filename, expected in labels.items():
+        img = cv2.imread(str(Path(image_dir) / filename), cv2.IMREAD_COLOR)
+        if img is None:
+            logger.warning("Skipping missing or unreadable image: %s", filename)
+            continue
+
+        boxes = {}
+        for name, detector in (("fp32", fp32), ("int8", int8)):
+            start = time.perf_counter()
+            detections = detector.predict(img, confidence_threshold)
+            latency[name] += time.perf_counter() - start
+            boxes[name] = [
+                (d.bounding_box.x1, d.bounding_box.y1, d.bounding_box.x2, d.bounding_box.y2)
+                for d in detections
+            ]
+            correct[name] += (len(detections) > 0) == bool(expected)
+
+        agreement += bool(boxes["fp32"]) == bool(boxes["int8"])
+        iou_total += mean_matched_iou(boxes["fp32"], boxes["int8"])
+        evaluated += 1
+
+    if evaluated == 0:
+        raise ValueError(f"No labelled images could be read from {image_dir}")
+
+    fp32_latency = latency["fp32"] / evaluated * 1000
+    int8_latency = latency["int8"] / evaluated * 1000
+    return {
+        "images": evaluated,
+        "fp32_accuracy": correct["fp32"] / evaluated,
+        "int8_accuracy": correct["int8"] / evaluated,
+        "accuracy_delta": (correct["int8"] - correct["fp32"]) / evaluated,
+        "verdict_agreement": agreement / evaluated,
+        "mean_box_iou": iou_total / evaluated,
+        "fp32_mean_latency_ms": fp32_latency,
+        "int8_mean_latency_ms": int8_latency,
+        "speedup": fp32_latency / int8_latency if int8_latency > 0 else 0.0
+    }
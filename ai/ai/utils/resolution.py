@@ -0,0 +1,184 @@
+"""
+Content-adaptive model input resolution for BUCChain AI
+
+A close-up of a label fills the frame with a few large structures and is
+detected as well at 320 px as at 640 px, while a wide shelf photo needs
+every pixel the model can take. Each image's edge density - the fraction of
+Canny edge pixels on a 256 px grayscale view, a cheap proxy for how small
+and numerous the objects are - picks its input size from
+ADAPTIVE_INPUT_SIZES: densities below the first of ADAPTIVE_EDGE_THRESHOLDS
+get the smallest size, above the last the largest. Images are never
+scaled up beyond the smallest size that covers their longest side.
+
+The inference time of every size is measured once when the model loads, so
+the latency saved against always using the largest size can be reported.
+"""
+
+import bisect
+import math
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from ai.models.analytics import ResolutionBucket, ResolutionStats
+
+# Longest side of the view edge density is measured on; thresholds are
+# calibrated for it
+ANALYSIS_SIZE = 256
+
+# Timed forward passes per size when calibrating (after one warm-up pass)
+CALIBRATION_RUNS = 3
+
+
+def edge_density(img: np.ndarray, analysis_size: int = ANALYSIS_SIZE) -> float:
+    """
+    Fraction of edge pixels on a downscaled grayscale view
+
+    Args:
+        img: Input image (BGR format)
+        analysis_size: Longest side of the view (at most)
+
+    Returns:
+        Edge density between 0 and 1
+    """
+    # Integer area downscaling averages out sensor noise that would alias
+    # into edges; very large images are subsampled first to keep it cheap
+    factor = math.ceil(max(img.shape[:2]) / analysis_size)
+    if factor > 4:
+        step = factor // 4
+        img = cv2.resize(img, None, fx=1 / step, fy=1 / step, interpolation=cv2.INTER_NEAREST)
+        factor = math.ceil(max(img.shape[:2]) / analysis_size)
+    small = cv2.resize(img, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_AREA) if factor > 1 else img
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    # Thresholds relative to the median intensity adapt to exposure
+    median = float(np.median(gray))
+    edges = cv2.Canny(gray, int(max(0, 0.66 * median)), int(min(255, 1.33 * median)))
+    return cv2.countNonZero(edges) / edges.size
+
+
+class ResolutionSelector:
+    """Picks a model input size per image and tracks the size distribution"""
+
+    def __init__(self, sizes: Sequence[int], thresholds: Sequence[float]):
+        """
+        Args:
+            sizes: Supported input sizes
+            thresholds: Edge densities separating consecutive sizes
+                (one fewer than sizes)
+
+        Raises:
+            ValueError: If sizes is empty or the counts do not match
+        """
+        self.sizes = sorted(set(sizes))
+        self.thresholds = sorted(thresholds)
+        if not self.sizes or len(self.thresholds) != len(self.sizes) - 1:
+            raise ValueError(
+                f"{len(self.sizes)} input sizes need {max(0, len(self.sizes) - 1)} edge thresholds, "
+                f"got {len(self.thresholds)}"
+            )
+        self.calibrated_ms: Dict[int, float] = {}
+        self._images: Dict[int, int] = {size: 0 for size in self.sizes}
+        self._inference: Dict[int, float] = {size: 0.0 for size in self.sizes}
+        self._density = 0.0
+
+    def select(self, img: np.ndarray, max_size: Optional[int] = None) -> Tuple[int, float]:
+        """
+        Choose the input size for an image
+
+        Args:
+            img: Image about to be preprocessed (BGR format)
+            max_size: Optional cap, e.g. the degraded size under load; the
+                largest supported size within it is used
+
+        Returns:
+            (one of the supported sizes, edge density of the image)
+        """
+        density = edge_density(img)
+        size = self.sizes[bisect.bisect_right(self.thresholds, density)]
+        # More input pixels than the image has add no detail
+        longest = max(img.shape[:2])
+        size = min(size, next((s for s in self.sizes if s >= longest), self.sizes[-1]))
+        if max_size:
+            size = min(size, max([s for s in self.sizes if s <= max_size], default=self.sizes[0]))
+        return size, density
+
+    def record(self, size: int, density: float, inference_seconds: float):
+        """
+        Record the inference of an image at its chosen size
+
+        Args:
+            size: Chosen input size
+            density: Edge density of the image
+            inference_seconds: Time spent in inference
+        """
+        self._images[size] += 1
+        self._density += density
+        self._inference[size] += inference_seconds
+
+    def calibrate(self, predict: Callable[[np.ndarray, int], object]):
+        """
+        Measure the inference time of every size
+
+        Args:
+            predict: Runs the model on an image at a given input size
+        """
+        for size in self.sizes:
+            img = np.full((size, size, 3), 114, dtype=np.uint8)
+            predict(img, size)
+            started = time.perf_counter()
+            for _ in range(CALIBRATION_RUNS):
+                predict(img, size)
+            self.calibrated_ms[size] = (time.perf_counter() - started) / CALIBRATION_RUNS * 1000
+
+    def get_stats(self, dynamic_input: bool) -> ResolutionStats:
+        """
+        Get the size distribution and the latency saved
+
+        Args:
+            dynamic_input: Whether the model runs at the chosen sizes
+
+        Returns:
+            ResolutionStats; the savings are estimated from the calibrated
+            per-size inference times (None without a calibration)
+        """
+        images = sum(self._images.values())
+        largest = self.sizes[-1]
+        saved = None
+        if self.calibrated_ms:
+            saved = sum(
+                count * (self.calibrated_ms[largest] - self.calibrated_ms[size])
+                for size, count in self._images.items()
+            )
+        return ResolutionStats(
+            enabled=True,
+            dynamic_input=dynamic_input,
+            sizes=self.sizes,
+            edge_thresholds=self.thresholds,
+            images=images,
+            average_edge_density=self._density / images if images else 0.0,
+            distribution=[
+                ResolutionBucket(
+                    size=size,
+                    images=count,
+                    share=count / images if images else 0.0,
+                    average_inference_ms=self._inference[size] / count * 1000 if count else 0.0,
+                    calibrated_inference_ms=self.calibrated_ms.get(size)
+                )
+                for size, count in self._images.items()
+            ],
+            largest_size=largest,
+            saved_ms_total=saved,
+            saved_ms_per_image=saved / images if saved is not None and images else None,
+            timestamp=datetime.now()
+        )
+
+    def reset(self):
+        """Reset the distribution (the calibration is kept)"""
+        for size in self.sizes:
+            self._images[size] = 0
+            self._inference[size] = 0.0
+        self._density = 0.0
@@ -0,0 +1,450 @@
+"""
+Fast response serialization for BUCChain AI Service
+
+Detection results are built internally by MLService and are already known to
+be valid, so they are converted to plain dicts by hand and encoded with orjson
+(falling back to the standard library encoder when orjson is unavailable)
+instead of going through response_model re-validation and FastAPI's default
+JSON encoder.
+
+The raw-body endpoint answers in a fixed binary layout (or msgpack, when the
+msgpack package is installed and asked for) for service-to-service callers.
+"""
+
+import json
+import struct
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from ai.models.predictions import (
+    BatchDetectionResponse,
+    BoundingBox,
+    DetectionResponse,
+    DetectionResult,
+    ImageQuality,
+    MultiFrameDetectionResponse
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+# Media type clients send in the Accept header to request the compact format
+COMPACT_MEDIA_TYPE = "application/vnd.bucchain.compact+json"
+
+# Media types of the raw-body endpoint's responses
+BINARY_MEDIA_TYPE = "application/vnd.bucchain.detection"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Binary layout, little-endian:
+#   magic "BUCD", u8 version, u8 status (0 completed, 1 retake_photo),
+#   u8 flags (1 counterfeit, 2 degraded, 4 decided by the cascade's screening
+#   model, 8 decided by the cascade's full model), u8 reserved, f32 confidence,
+#   f32 processing seconds, u32 width, u32 height, u16 quality issue bits,
+#   u16 box count N
+# followed by N x 5 f32 (x1, y1, x2, y2, confidence) and the N class names
+# as UTF-8, newline separated.
+BINARY_MAGIC = b"BUCD"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sBBBBffIIHH")
+BOX_FIELDS = 5
+
+FLAG_COUNTERFEIT = 1
+FLAG_DEGRADED = 2
+FLAG_SCREEN_STAGE = 4
+FLAG_FULL_STAGE = 8
+
+STAGE_FLAGS = {"screen": FLAG_SCREEN_STAGE, "full": FLAG_FULL_STAGE}
+
+# Bit per quality gate issue, in ImageQuality.issues naming
+QUALITY_ISSUE_BITS = {
+    "too_small": 1,
+    "blurry": 2,
+    "underexposed": 4,
+    "overexposed": 8,
+    "uniform_frame": 16
+}
+
+
+def _default(obj: Any) -> Any:
+    """Fallback encoder for types the standard json module cannot handle"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encode content as JSON bytes using the fastest available encoder
+
+    Args:
+        content: JSON-compatible content (datetimes are allowed)
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def wants_compact(request: Optional[Request]) -> bool:
+    """
+    Check whether the client asked for the compact response format
+
+    Args:
+        request: Incoming request (may be None)
+
+    Returns:
+        True if the Accept header lists the compact media type
+    """
+    if request is None:
+        return False
+    return COMPACT_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _box_to_json(box: Optional[BoundingBox], compact: bool) -> Any:
+    if box is None:
+        return None
+    if compact:
+        return [box.x1, box.y1, box.x2, box.y2]
+    return {"x1": box.x1, "y1": box.y1, "x2": box.x2, "y2": box.y2}
+
+
+def _result_to_json(result: DetectionResult, compact: bool) -> Dict[str, Any]:
+    return {
+        "class_name": result.class_name,
+        "confidence": result.confidence,
+        "bounding_box": _box_to_json(result.bounding_box, compact)
+    }
+
+
+def _quality_to_json(quality: Optional[ImageQuality]) -> Optional[Dict[str, Any]]:
+    if quality is None:
+        return None
+    return {
+        "passed": quality.passed,
+        "issues": quality.issues,
+        "blur_score": quality.blur_score,
+        "brightness": quality.brightness,
+        "underexposed_fraction": quality.underexposed_fraction,
+        "overexposed_fraction": quality.overexposed_fraction,
+        "contrast": quality.contrast,
+        "assessment_time_ms": quality.assessment_time_ms
+    }
+
+
+def detection_to_dict(
+    response: DetectionResponse,
+    compact: bool = False
+) -> Dict[str, Any]:
+    """
+    Convert a detection response to a JSON-ready dict without re-validation
+
+    Args:
+        response: Detection response built by MLService
+        compact: Encode bounding boxes as [x1, y1, x2, y2] arrays
+
+    Returns:
+        Dictionary matching the DetectionResponse schema
+    """
+    metadata = response.image_metadata
+    return {
+        "is_counterfeit": response.is_counterfeit,
+        "confidence": response.confidence,
+        "detections": [_result_to_json(d, compact) for d in response.detections],
+        "image_metadata": {
+            "filename": metadata.filename,
+            "width": metadata.width,
+            "height": metadata.height,
+            "channels": metadata.channels,
+            "size": metadata.size,
+            "dtype": metadata.dtype
+        },
+        "processing_time_seconds": response.processing_time_seconds,
+        "timestamp": response.timestamp,
+        "model_version": response.model_version,
+        "degraded": response.degraded,
+        "status": response.status,
+        "quality": _quality_to_json(response.quality),
+        "stage": response.stage
+    }
+
+
+def batch_to_dict(
+    response: BatchDetectionResponse,
+    compact: bool = False
+) -> Dict[str, Any]:
+    """
+    Convert a batch detection response to a JSON-ready dict
+
+    Args:
+        response: Batch detection response
+        compact: Encode bounding boxes as [x1, y1, x2, y2] arrays
+
+    Returns:
+        Dictionary matching the BatchDetectionResponse schema
+    """
+    results: List[Dict[str, Any]] = [
+        detection_to_dict(r, compact) for r in response.results
+    ]
+    return {
+        "results": results,
+        "total_processed": response.total_processed,
+        "total_counterfeit": response.total_counterfeit,
+        "average_confidence": response.average_confidence,
+        "total_processing_time_seconds": response.total_processing_time_seconds
+    }
+
+
+def multi_frame_to_dict(
+    response: MultiFrameDetectionResponse,
+    compact: bool = False
+) -> Dict[str, Any]:
+    """
+    Convert a multi-frame detection response to a JSON-ready dict
+
+    Args:
+        response: Fused clip or burst detection response
+        compact: Encode bounding boxes as [x1, y1, x2, y2] arrays
+
+    Returns:
+        Dictionary matching the MultiFrameDetectionResponse schema
+    """
+    return {
+        "is_counterfeit": response.is_counterfeit,
+        "confidence": response.confidence,
+        "status": response.status,
+        "source": response.source,
+        "frames_read": response.frames_read,
+        "frames_examined": response.frames_examined,
+        "counterfeit_votes": response.counterfeit_votes,
+        "keyframes": [
+            {
+                "frame_index": k.frame_index,
+                "sharpness": k.sharpness,
+                "difference": k.difference,
+                "result": detection_to_dict(k.result, compact)
+            }
+            for k in response.keyframes
+        ],
+        "selection_time_seconds": response.selection_time_seconds,
+        "processing_time_seconds": response.processing_time_seconds,
+        "timestamp": response.timestamp,
+        "model_version": response.model_version
+    }
+
+
+def render_detection(
+    response: DetectionResponse,
+    request: Optional[Request] = None
+) -> FastJSONResponse:
+    """
+    Render a detection response in the format negotiated via Accept
+
+    Args:
+        response: Detection response
+        request: Incoming request used for content negotiation
+
+    Returns:
+        Encoded JSON response
+    """
+    compact = wants_compact(request)
+    return FastJSONResponse(
+        content=detection_to_dict(response, compact),
+        media_type=COMPACT_MEDIA_TYPE if compact else "application/json"
+    )
+
+
+def render_batch(
+    response: BatchDetectionResponse,
+    request: Optional[Request] = None
+) -> FastJSONResponse:
+    """
+    Render a batch detection response in the format negotiated via Accept
+
+    Args:
+        response: Batch detection response
+        request: Incoming request used for content negotiation
+
+    Returns:
+        Encoded JSON response
+    """
+    compact = wants_compact(request)
+    return FastJSONResponse(
+        content=batch_to_dict(response, compact),
+        media_type=COMPACT_MEDIA_TYPE if compact else "application/json"
+    )
+
+
+def render_multi_frame(
+    response: MultiFrameDetectionResponse,
+    request: Optional[Request] = None
+) -> FastJSONResponse:
+    """
+    Render a multi-frame detection response in the format negotiated via Accept
+
+    Args:
+        response: Fused clip or burst detection response
+        request: Incoming request used for content negotiation
+
+    Returns:
+        Encoded JSON response
+    """
+    compact = wants_compact(request)
+    return FastJSONResponse(
+        content=multi_frame_to_dict(response, compact),
+        media_type=COMPACT_MEDIA_TYPE if compact else "application/json"
+    )
+
+
+def _packed_boxes(response: DetectionResponse) -> np.ndarray:
+    """Detections as an (N, 5) float32 array of box corners and confidence"""
+    boxes = np.zeros((len(response.detections), BOX_FIELDS), dtype="<f4")
+    for row, detection in zip(boxes, response.detections):
+        box = detection.bounding_box
+        if box is not None:
+            row[:4] = (box.x1, box.y1, box.x2, box.y2)
+        row[4] = detection.confidence
+    return boxes
+
+
+def _quality_bits(response: DetectionResponse) -> int:
+    if response.quality is None:
+        return 0
+    bits = 0
+    for issue in response.quality.issues:
+        bits |= QUALITY_ISSUE_BITS.get(issue, 0)
+    return bits
+
+
+def pack_detection(response: DetectionResponse) -> bytes:
+    """
+    Encode a detection response in the fixed binary layout
+
+    Args:
+        response: Detection response built by MLService
+
+    Returns:
+        Header, packed float32 boxes and class names (see BINARY_HEADER)
+    """
+    metadata = response.image_metadata
+    flags = (FLAG_COUNTERFEIT if response.is_counterfeit else 0) | (FLAG_DEGRADED if response.degraded else 0)
+    flags |= STAGE_FLAGS.get(response.stage, 0)
+    header = BINARY_HEADER.pack(
+        BINARY_MAGIC,
+        BINARY_VERSION,
+        0 if response.status == "completed" else 1,
+        flags,
+        0,
+        response.confidence,
+        response.processing_time_seconds,
+        metadata.width,
+        metadata.height,
+        _quality_bits(response),
+        len(response.detections)
+    )
+    names = "\n".join(d.class_name for d in response.detections).encode("utf-8")
+    return header + _packed_boxes(response).tobytes() + names
+
+
+def unpack_detection(data: bytes) -> Dict[str, Any]:
+    """
+    Decode the fixed binary layout (for clients and tests)
+
+    Args:
+        data: Bytes produced by pack_detection
+
+    Returns:
+        Dictionary with the decoded fields; boxes as an (N, 5) float32 array
+
+    Raises:
+        ValueError: If the data is not a supported binary detection
+    """
+    if len(data) < BINARY_HEADER.size:
+        raise ValueError("Truncated binary detection")
+    magic, version, status, flags, _, confidence, seconds, width, height, issues, count = \
+        BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("Not a version 1 binary detection")
+    end = BINARY_HEADER.size + count * BOX_FIELDS * 4
+    boxes = np.frombuffer(data, dtype="<f4", count=count * BOX_FIELDS, offset=BINARY_HEADER.size)
+    names = data[end:].decode("utf-8").split("\n") if count else []
+    return {
+        "is_counterfeit": bool(flags & FLAG_COUNTERFEIT),
+        "confidence": confidence,
+        "status": "completed" if status == 0 else "retake_photo",
+        "degraded": bool(flags & FLAG_DEGRADED),
+        "stage": next((stage for stage, bit in STAGE_FLAGS.items() if flags & bit), None),
+        "processing_time_seconds": seconds,
+        "width": width,
+        "height": height,
+        "quality_issues": [name for name, bit in QUALITY_ISSUE_BITS.items() if issues & bit],
+        "boxes": boxes.reshape(count, BOX_FIELDS),
+        "class_names": names
+    }
+
+
+def wants_msgpack(request: Optional[Request]) -> bool:
+    """Check whether the client asked for msgpack and it is available"""
+    if request is None or msgpack is None:
+        return False
+    return MSGPACK_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def render_binary(
+    response: DetectionResponse,
+    request: Optional[Request] = None
+) -> Response:
+    """
+    Render a detection response for the raw-body endpoint
+
+    msgpack when the client accepts it and msgpack is installed, otherwise
+    the fixed binary layout. Boxes are packed float32 in both.
+
+    Args:
+        response: Detection response
+        request: Incoming request used for content negotiation
+
+    Returns:
+        Encoded response
+    """
+    if wants_msgpack(request):
+        content = msgpack.packb({
+            "is_counterfeit": response.is_counterfeit,
+            "confidence": response.confidence,
+            "status": response.status,
+            "degraded": response.degraded,
+            "stage": response.stage,
+            "processing_time_seconds": response.processing_time_seconds,
+            "width": response.image_metadata.width,
+            "height": response.image_metadata.height,
+            "quality_issues": response.quality.issues if response.quality is not None else [],
+            "boxes": _packed_boxes(response).tobytes(),
+            "class_names": [d.class_name for d in response.detections]
+        })
+        return Response(content=content, media_type=MSGPACK_MEDIA_TYPE)
+    return Response(content=pack_detection(response), media_type=BINARY_MEDIA_TYPE)
@@ -0,0 +1,286 @@
+"""
+Shared-memory frame ring for BUCChain AI
+
+Hands decoded frames and preprocessed tensors to inference worker processes
+without pickling them. The API process owns one shared-memory segment split
+into fixed-size slots; it writes an array into a free slot and sends the
+worker a small FrameHandle, and the worker maps the slot and reads the array
+in place.
+
+Segment layout:
+    preamble    int64 slot count, int64 slot size in bytes
+    header      int64 (refcount, generation) per slot
+    slots       slot data, each slot 64-byte aligned
+
+Slots are reference counted and only the owning process changes counts, so
+a worker crash cannot leak a slot: the owner keeps its reference until the
+worker's result (or failure) comes back. The generation number changes every
+time a slot is reused, so a stale handle is detected instead of silently
+reading another frame. Segments are named after the owner's pid; they are
+unlinked at exit, and segments left behind by a killed process are swept on
+the next start.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "bucchain_frames_"
+SHM_DIR = Path("/dev/shm")
+
+PREAMBLE_BYTES = 16
+ALIGNMENT = 64
+
+
+class FrameRingFull(RuntimeError):
+    """No free slot, or the array does not fit in a slot"""
+
+
+@dataclass(frozen=True)
+class FrameHandle:
+    """Picklable reference to an array stored in a ring slot"""
+    segment: str
+    slot: int
+    generation: int
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+class SharedFrame(np.ndarray):
+    """
+    Array backed by a ring slot
+
+    Carries the handle of its slot so it can be passed to a worker without a
+    copy. Views and results derived from it are plain arrays.
+    """
+
+    handle: Optional[FrameHandle] = None
+    ring: Optional["SharedFrameRing"] = None
+    # Full-resolution (width, height) when the frame holds a decoded preview
+    source_size: Optional[Tuple[int, int]] = None
+
+    def __array_finalize__(self, obj):
+        self.handle = None
+        self.ring = None
+        self.source_size = None
+
+
+def _align(n: int) -> int:
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_stale_segments() -> int:
+    """
+    Unlink ring segments whose owning process no longer exists
+
+    Returns:
+        Number of segments removed
+    """
+    if not SHM_DIR.is_dir():
+        return 0
+    removed = 0
+    for path in SHM_DIR.glob(f"{SEGMENT_PREFIX}*"):
+        try:
+            pid = int(path.name[len(SEGMENT_PREFIX):].split("_")[0])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            path.unlink(missing_ok=True)
+            removed += 1
+    if removed:
+        logger.warning("Removed %s shared-memory frame segments left by dead processes", removed)
+    return removed
+
+
+class SharedFrameRing:
+    """Fixed-size slots in one shared-memory segment"""
+
+    def __init__(self, slots: int, slot_bytes: int, name: Optional[str] = None, create: bool = True):
+        """
+        Create (or attach to) a frame ring
+
+        Args:
+            slots: Number of slots
+            slot_bytes: Capacity of each slot in bytes
+            name: Segment name (defaults to one derived from the pid)
+            create: Create the segment; False attaches to an existing one
+        """
+        self.slots = slots
+        self.slot_bytes = _align(slot_bytes)
+        self.owner = create
+        self._data_offset = _align(PREAMBLE_BYTES + slots * 2 * 8)
+        size = self._data_offset + slots * self.slot_bytes
+
+        if create:
+            sweep_stale_segments()
+            name = name or f"{SEGMENT_PREFIX}{os.getpid()}_{id(self):x}"
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            np.ndarray((2,), dtype=np.int64, buffer=self.shm.buf)[:] = (slots, self.slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.name = self.shm.name
+        self._header = np.ndarray((slots, 2), dtype=np.int64, buffer=self.shm.buf, offset=PREAMBLE_BYTES)
+        if create:
+            self._header[:] = 0
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self.writes = 0
+        self.full = 0
+        if create:
+            atexit.register(self.unlink)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedFrameRing":
+        """
+        Attach to a ring created by another process (read side)
+
+        Args:
+            name: Segment name from a FrameHandle or the owner's ring
+
+        Returns:
+            SharedFrameRing view of the segment
+        """
+        probe = shared_memory.SharedMemory(name=name)
+        slots, slot_bytes = (int(v) for v in np.ndarray((2,), dtype=np.int64, buffer=probe.buf))
+        probe.close()
+        return cls(slots, slot_bytes, name=name, create=False)
+
+    def _slot_array(self, slot: int, shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+        offset = self._data_offset + slot * self.slot_bytes
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+
+    def allocate(self, shape: Tuple[int, ...], dtype=np.uint8) -> SharedFrame:
+        """
+        Reserve a slot for an array of the given shape
+
+        The returned array starts with a reference count of 1; write into it
+        in place (e.g. as the dst of cv2.resize) and release it when done.
+
+        Args:
+            shape: Array shape
+            dtype: Array dtype
+
+        Returns:
+            SharedFrame backed by the slot
+
+        Raises:
+            FrameRingFull: If the array is too large or every slot is in use
+        """
+        dtype = np.dtype(dtype)
+        if int(np.prod(shape)) * dtype.itemsize > self.slot_bytes:
+            self.full += 1
+            raise FrameRingFull(f"Array of shape {shape} does not fit in a {self.slot_bytes}-byte slot")
+
+        with self._lock:
+            for step in range(self.slots):
+                slot = (self._cursor + step) % self.slots
+                if self._header[slot, 0] == 0:
+                    break
+            else:
+                self.full += 1
+                raise FrameRingFull("All frame slots are in use")
+            self._cursor = (slot + 1) % self.slots
+            self._header[slot, 0] = 1
+            self._header[slot, 1] += 1
+            generation = int(self._header[slot, 1])
+            self.writes += 1
+
+        frame = self._slot_array(slot, tuple(shape), dtype).view(SharedFrame)
+        frame.handle = FrameHandle(self.name, slot, generation, tuple(shape), dtype.str)
+        frame.ring = self
+        return frame
+
+    def put(self, array: np.ndarray) -> SharedFrame:
+        """
+        Copy an array into a free slot
+
+        Args:
+            array: Array to store
+
+        Returns:
+            SharedFrame backed by the slot (reference count 1)
+
+        Raises:
+            FrameRingFull: If the array is too large or every slot is in use
+        """
+        frame = self.allocate(array.shape, array.dtype)
+        np.copyto(frame, array)
+        return frame
+
+    def view(self, handle: FrameHandle) -> np.ndarray:
+        """
+        Map the array behind a handle without copying
+
+        Args:
+            handle: Handle from the owning process
+
+        Returns:
+            Array backed by the slot; valid until the owner releases it
+
+        Raises:
+            ValueError: If the slot has been reused since the handle was made
+        """
+        if int(self._header[handle.slot, 1]) != handle.generation:
+            raise ValueError(f"Stale frame handle for slot {handle.slot}")
+        return self._slot_array(handle.slot, handle.shape, np.dtype(handle.dtype))
+
+    def retain(self, handle: FrameHandle):
+        """Take another reference to a slot (owner process only)"""
+        with self._lock:
+            self._header[handle.slot, 0] += 1
+
+    def release(self, handle: FrameHandle):
+        """Drop a reference to a slot; it is reused once no references remain"""
+        with self._lock:
+            if self._header[handle.slot, 1] == handle.generation and self._header[handle.slot, 0] > 0:
+                self._header[handle.slot, 0] -= 1
+
+    @property
+    def slots_in_use(self) -> int:
+        """Number of slots currently referenced"""
+        return int(np.count_nonzero(self._header[:, 0]))
+
+    def close(self):
+        """Detach from the segment"""
+        self._header = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Arrays still reference the mapping; it is released with them
+            pass
+
+    def unlink(self):
+        """Detach and remove the segment (owner only)"""
+        self.close()
+        if self.owner:
+            self.owner = False
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def release_frame(img: np.ndarray):
+    """Release the ring slot behind an image, if it has one"""
+    if isinstance(img, SharedFrame) and img.handle is not None:
+        img.ring.release(img.handle)
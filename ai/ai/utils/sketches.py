@@ -0,0 +1,176 @@
+"""
+Bounded-memory streaming summaries for BUCChain AI analytics
+
+SpaceSaving keeps the heaviest keys of a stream with their counts and
+metric sums in a table of fixed size; CountMinSketch answers frequency
+queries for any key, including keys that were evicted from the table. It
+never undercounts and overcounts by at most e * total / width with
+probability 1 - e^-depth (98% at depth 4).
+"""
+
+import hashlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class GroupCounts:
+    """Counts and metric sums of one key"""
+
+    __slots__ = ("count", "error", "counterfeit", "confidence", "seconds")
+
+    def __init__(self, count: int = 0, error: int = 0):
+        self.count = count
+        self.error = error
+        self.counterfeit = 0
+        self.confidence = 0.0
+        self.seconds = 0.0
+
+    @property
+    def observed(self) -> int:
+        """Events counted since the key was last admitted to the table"""
+        return self.count - self.error
+
+
+class SpaceSaving:
+    """
+    Heavy hitters with the Space-Saving algorithm
+
+    A key that is not in a full table replaces the key with the smallest
+    count and inherits that count as its error, so for every tracked key
+    `count - error <= true count <= count`, and every key occurring more
+    than total / capacity times is tracked. Metric sums cover the
+    `count - error` events seen since the key entered the table.
+
+    Counts only grow, so the keys holding the minimum count are collected
+    in one scan and evicted one by one; a new scan is only needed once they
+    are used up, which keeps evictions O(1) amortized.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Maximum number of tracked keys
+        """
+        self.capacity = capacity
+        self.entries: Dict[str, GroupCounts] = {}
+        self.evictions = 0
+        self._min_count = 0
+        self._min_keys: List[str] = []
+
+    def _pop_smallest(self) -> GroupCounts:
+        """Remove a key with the minimum count"""
+        while True:
+            while self._min_keys:
+                key = self._min_keys.pop()
+                entry = self.entries.get(key)
+                if entry is not None and entry.count == self._min_count:
+                    return self.entries.pop(key)
+            self._min_count = min(entry.count for entry in self.entries.values())
+            self._min_keys = [k for k, entry in self.entries.items() if entry.count == self._min_count]
+
+    def add(
+        self,
+        key: str,
+        counterfeit: bool,
+        confidence: float,
+        seconds: float
+    ) -> bool:
+        """
+        Count one event
+
+        Args:
+            key: Group key
+            counterfeit: Whether the item was counterfeit
+            confidence: Verdict confidence
+            seconds: Processing time
+
+        Returns:
+            True if a key had to be evicted to make room
+        """
+        entry = self.entries.get(key)
+        evicted = False
+        if entry is None:
+            floor = 0
+            if len(self.entries) >= self.capacity:
+                floor = self._pop_smallest().count
+                self.evictions += 1
+                evicted = True
+            entry = self.entries[key] = GroupCounts(floor, floor)
+        entry.count += 1
+        entry.counterfeit += counterfeit
+        entry.confidence += confidence
+        entry.seconds += seconds
+        return evicted
+
+
+class CountMinSketch:
+    """
+    Count-min sketch of several counters per key
+
+    Estimates never undercount; take the minimum over the depth rows.
+    Each counter is a flat int32 array of depth x width cells; single-cell
+    updates on it are far cheaper per event than NumPy indexing.
+    """
+
+    def __init__(self, width: int, depth: int, counters: int = 1):
+        """
+        Args:
+            width: Columns per row (error at most e * total / width)
+            depth: Independent hash rows (failure probability e^-depth)
+            counters: Values kept per key, e.g. events and counterfeits
+        """
+        self.width = width
+        self.depth = depth
+        self._counters = [array("i", bytes(4 * depth * width)) for _ in range(counters)]
+
+    def _cells(self, key: str) -> List[int]:
+        """Flat index of the key's cell in each row"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, key: str, values: Iterable[int]):
+        """
+        Add values to a key's counters
+
+        Args:
+            key: Key to count
+            values: One increment per counter
+        """
+        cells = self._cells(key)
+        for counter, value in zip(self._counters, values):
+            if value:
+                for cell in cells:
+                    counter[cell] += value
+
+    def estimate(self, key: str) -> Tuple[int, ...]:
+        """
+        Estimate a key's counters
+
+        Args:
+            key: Key to look up
+
+        Returns:
+            Upper-bound estimate per counter
+        """
+        cells = self._cells(key)
+        return tuple(min(counter[cell] for cell in cells) for counter in self._counters)
+
+    @staticmethod
+    def merged_estimate(sketches: Iterable[Optional["CountMinSketch"]], key: str) -> Optional[Tuple[int, ...]]:
+        """
+        Estimate a key's counters summed over several sketches of equal shape
+
+        Returns:
+            Summed estimate per counter, or None if no sketch was given
+        """
+        sketches = [s for s in sketches if s is not None]
+        if not sketches:
+            return None
+        cells = sketches[0]._cells(key)
+        return tuple(
+            min(sum(s._counters[counter][cell] for s in sketches) for cell in cells)
+            for counter in range(len(sketches[0]._counters))
+        )
@@ -12,22 +12,30 @@ import logging
 from datetime import datetime
 
 # Import configuration and services
-from ai.utils.config import settings
+from ai.utils.config import settings, cpu_resources
 from ai.services.ml_service import ml_service
+from ai.services.admission_service import admission_controller
 from ai.services.analytics_service import analytics_service
+from ai.services.memory_service import memory_watchdog
+from ai.services.quota_service import QuotaMiddleware
+from ai.utils.logging_config import (
+    claim_log_rotation,
+    configure_logging,
+    queued_logging,
+    restart_logging_in_child
+)
+from ai.utils.prefork import serve_prefork
 
 # Import routers
-from ai.routes import predictions, analytics
-
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, settings.log_level),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler(settings.log_file)
-    ]
-)
+from ai.routes import predictions, analytics, references
+
+# Configure logging (queued, written by a background thread). Workers of
+# the uvicorn supervisor import this module on their own; the first of them
+# to claim the log file rotates it
+if settings.workers > 1 and not settings.prefork_model and __name__ != "__main__":
+    configure_logging(settings, rotate=claim_log_rotation(settings.log_file))
+else:
+    configure_logging(settings)
 logger = logging.getLogger(__name__)
 
 
@@ -47,6 +55,11 @@ def create_app() -> FastAPI:
         openapi_url="/openapi.json"
     )
     
+    # Client quotas, checked before a request body is read (added first so
+    # CORS headers also reach throttled requests)
+    if settings.quota_enabled:
+        app.add_middleware(QuotaMiddleware)
+    
     # CORS middleware
     app.add_middleware(
         CORSMiddleware,
@@ -68,6 +81,12 @@ def create_app() -> FastAPI:
         tags=["Detection"]
     )
     
+    # Reference catalog endpoints
+    app.include_router(
+        references.router,
+        prefix=settings.api_v1_prefix
+    )
+    
     # Additional API v1 analytics endpoints
     analytics_v1_router = FastAPI().router
     analytics_v1_router.routes = [
@@ -90,27 +109,43 @@ app = create_app()
 async def startup_event():
     """Execute startup tasks"""
     logger.info("=" * 60)
-    logger.info(f"{settings.app_name} Starting")
-    logger.info(f"Timestamp: {datetime.now().isoformat()}")
-    logger.info(f"Python Version: {sys.version}")
-    logger.info(f"Configuration:")
-    logger.info(f"  - Port: {settings.port}")
-    logger.info(f"  - Model: {settings.model_name}")
-    logger.info(f"  - Model Path: {settings.model_path}")
-    logger.info(f"  - Model Exists: {settings.model_exists}")
-    logger.info(f"  - API Prefix: {settings.api_v1_prefix}")
-    logger.info(f"  - CORS Origins: {settings.cors_origins}")
+    logger.info("%s Starting", settings.app_name)
+    logger.info("Timestamp: %s", datetime.now().isoformat())
+    logger.info("Python Version: %s", sys.version)
+    logger.info("Configuration:")
+    logger.info("  - Port: %s", settings.port)
+    logger.info("  - Model: %s", settings.model_name)
+    logger.info("  - Model Path: %s", settings.model_path)
+    logger.info("  - Model Exists: %s", settings.model_exists)
+    logger.info("  - API Prefix: %s", settings.api_v1_prefix)
+    logger.info("  - CORS Origins: %s", settings.cors_origins)
+    logger.info("  - CPU Layout: %s", cpu_resources.layout(ml_service.intra_op_threads))
     logger.info("=" * 60)
     
-    # Load ML model
-    logger.info("Loading ML model...")
-    ml_service.load_model()
+    # Apply the per-process thread budget before any threads are started
+    cpu_resources.apply()
+    
+    # Load ML model (already loaded when the pre-fork master forked us)
+    if not ml_service.is_model_loaded:
+        logger.info("Loading ML model...")
+        ml_service.load_model()
     
     if ml_service.is_model_loaded:
         logger.info("✓ Model loaded successfully")
     else:
         logger.warning("⚠ Model not loaded - using mock inference")
     
+    # Degrading only relieves load when the model runs at the reduced size
+    if not ml_service.reduced_input_supported:
+        admission_controller.degrade_enabled = False
+        logger.warning(
+            "Model has a fixed input size; overload is shed instead of degraded "
+            "(export with dynamic=True to enable DEGRADED_INPUT_SIZE)"
+        )
+    
+    # Sample RSS and recycle this worker past MEMORY_SOFT_LIMIT_MB
+    memory_watchdog.start()
+    
     logger.info("✓ Startup complete")
 
 
@@ -118,25 +153,70 @@ async def startup_event():
 async def shutdown_event():
     """Execute shutdown tasks"""
     logger.info("=" * 60)
-    logger.info(f"{settings.app_name} Shutting Down")
-    logger.info(f"Timestamp: {datetime.now().isoformat()}")
+    logger.info("%s Shutting Down", settings.app_name)
+    logger.info("Timestamp: %s", datetime.now().isoformat())
     
     # Log final statistics
     summary = analytics_service.get_summary()
-    logger.info(f"Session Statistics:")
-    logger.info(f"  - Total Detections: {summary.total_detections}")
-    logger.info(f"  - Total Counterfeit: {summary.total_counterfeit}")
-    logger.info(f"  - Average Confidence: {summary.average_confidence:.2f}")
-    logger.info(f"  - Uptime: {summary.uptime_seconds:.2f}s")
+    logger.info("Session Statistics:")
+    logger.info("  - Total Detections: %s", summary.total_detections)
+    logger.info("  - Total Counterfeit: %s", summary.total_counterfeit)
+    logger.info("  - Average Confidence: %.2f", summary.average_confidence)
+    logger.info("  - Uptime: %.2fs", summary.uptime_seconds)
+    logger.info("  - Peak RSS: %.0f MB", memory_watchdog.peak_rss / (1024 * 1024))
     logger.info("=" * 60)
+    
+    await memory_watchdog.stop()
+    
+    # Write out queued spike alerts
+    analytics_service.spikes.sink.stop()
+    
+    # Stop inference worker processes and remove the shared frame ring
+    ml_service.shutdown()
+    
+    # Flush queued log records
+    queued_logging.stop()
+
+
+def preload_model():
+    """Load the model in the pre-fork master so workers share its pages"""
+    if settings.inference_processes > 0:
+        # Worker pools cannot be forked; each API worker starts its own
+        logger.warning("PREFORK_MODEL has no effect with INFERENCE_PROCESSES > 0")
+        return
+    # ONNX Runtime thread pools do not survive fork, so preforked sessions
+    # run single-threaded and parallelism comes from the worker count
+    cpu_resources.apply()
+    ml_service.intra_op_threads = 1
+    ml_service.load_model()
+
+
+def init_worker(worker_index: int):
+    """Per-process setup of a forked worker"""
+    restart_logging_in_child(settings, worker_index)
+    cpu_resources.apply(worker_index)
 
 
 if __name__ == "__main__":
-    logger.info(f"Starting {settings.app_name} on port {settings.port}...")
-    uvicorn.run(
-        app,
-        host=settings.host,
-        port=settings.port,
-        log_level=settings.log_level.lower(),
-        access_log=True
-    )
+    logger.info("Starting %s on port %s...", settings.app_name, settings.port)
+    if settings.workers > 1 and settings.prefork_model:
+        serve_prefork(
+            app,
+            host=settings.host,
+            port=settings.port,
+            workers=settings.workers,
+            log_level=settings.log_level.lower(),
+            preload=preload_model,
+            worker_init=init_worker,
+            worker_exit=queued_logging.stop
+        )
+    else:
+        uvicorn.run(
+            "main:app" if settings.workers > 1 else app,
+            host=settings.host,
+            port=settings.port,
+            workers=settings.workers,
+            log_level=settings.log_level.lower(),
+            access_log=True,
+            log_config=None
+        )
@@ -0,0 +1,110 @@
+"""
+Benchmark the binary detection protocol against multipart + JSON
+
+Starts the service on a local port and sends the same image over one
+keep-alive connection to:
+
+    multipart   POST /api/v1/detect       multipart/form-data in, JSON out
+    raw         POST /api/v1/detect/raw   raw body in, fixed binary layout out
+    msgpack     POST /api/v1/detect/raw   raw body in, msgpack out
+
+and reports the latency per request and the bytes on the wire. The model
+time is the same for all three, so the latency difference is the protocol
+overhead saved. Use a small model and image to see it clearly.
+
+Usage:
+    python scripts/benchmark_binary_protocol.py --model models/weights/yolov10n.onnx
+    python scripts/benchmark_binary_protocol.py --model models/weights/yolov10n.onnx --size 320 --requests 1000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import httpx
+import numpy as np
+
+AI_DIR = Path(__file__).resolve().parent.parent
+
+
+def make_image(size: int) -> bytes:
+    rng = np.random.default_rng(0)
+    img = np.full((size * 3 // 4, size, 3), 90, np.uint8)
+    for _ in range(20):
+        x, y = int(rng.integers(0, size - 40)), int(rng.integers(0, size * 3 // 4 - 30))
+        cv2.rectangle(img, (x, y), (x + 40, y + 30), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def measure(client: httpx.Client, label: str, requests: int, send):
+    for _ in range(20):
+        send()
+    latencies = []
+    response = None
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = send()
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    request_bytes = int(response.request.headers["content-length"])
+    print(
+        f"  {label:<10} mean {np.mean(latencies) * 1000:6.2f} ms   p50 {np.median(latencies) * 1000:6.2f} ms   "
+        f"request {request_bytes:>7} B   response {len(response.content):>5} B"
+    )
+    return float(np.mean(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", help="ONNX model to serve (default: mock inference, 100 ms per image)")
+    parser.add_argument("--size", type=int, default=320, help="Image width in pixels")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per protocol")
+    parser.add_argument("--port", type=int, default=8104, help="Port to run the service on")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PORT=str(args.port), LOG_LEVEL="WARNING", QUALITY_GATE_ENABLED="false")
+    if args.model:
+        env["MODEL_PATH"] = str(Path(args.model).resolve())
+    server = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=AI_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        with httpx.Client(base_url=url, timeout=30) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if client.get("/health").is_success:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise SystemExit("Service did not start")
+                time.sleep(0.3)
+
+            payload = make_image(args.size)
+            raw_headers = {"Content-Type": "image/jpeg", "X-Filename": "scan.jpg"}
+            print(f"{args.requests} requests, {len(payload)} B JPEG, one keep-alive connection")
+            multipart = measure(client, "multipart", args.requests, lambda: client.post(
+                "/api/v1/detect", files={"file": ("scan.jpg", payload, "image/jpeg")}
+            ))
+            raw = measure(client, "raw", args.requests, lambda: client.post(
+                "/api/v1/detect/raw", content=payload, headers=raw_headers
+            ))
+            packed = measure(client, "msgpack", args.requests, lambda: client.post(
+                "/api/v1/detect/raw", content=payload, headers={**raw_headers, "Accept": "application/msgpack"}
+            ))
+            print(f"  saved per request: raw {(multipart - raw) * 1000:.2f} ms, "
+                  f"msgpack {(multipart - packed) * 1000:.2f} ms")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark the two-stage model cascade against the full model alone
+
+Runs the same images, with several in flight at once, through:
+
+    full       the full model on every image
+    cascade    the screening model on every image, images scoring inside
+               the uncertainty band escalated to the full model in batches
+
+and reports throughput, mean latency, the escalation rate and how often the
+cascade's verdict matches the full model's. The images are synthetic scenes
+with a product patch of random contrast, so the scores spread across the
+band; use real scans (--images) for representative numbers.
+
+Usage:
+    python scripts/benchmark_cascade.py --model models/weights/yolov10m.onnx --screen-model models/weights/yolov10n.onnx
+    python scripts/benchmark_cascade.py --model models/weights/yolov10n.onnx --screen-size 320 --band 0.3 0.6
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+AI_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AI_DIR))
+
+from ai.services.cascade_service import FULL_STAGE, ModelCascade  # noqa: E402
+from ai.services.inference_backend import OnnxDetector  # noqa: E402
+from ai.utils.helpers import preprocess_image  # noqa: E402
+
+
+def make_images(count: int):
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        img = np.full((480, 640, 3), 40, np.uint8)
+        x, y = int(rng.integers(0, 440)), int(rng.integers(0, 300))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(img, (x, y), (x + 200, y + 180), color, -1)
+        images.append(img)
+    return images
+
+
+def load_images(directory: Path):
+    images = [cv2.imread(str(p)) for p in sorted(directory.iterdir()) if p.suffix.lower() in (".jpg", ".jpeg", ".png")]
+    return [img for img in images if img is not None]
+
+
+async def run(images, predict, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, results = [], [None] * len(images)
+
+    async def one(index, img):
+        async with semaphore:
+            start = time.perf_counter()
+            results[index] = await predict(img)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, img) for i, img in enumerate(images)))
+    return time.perf_counter() - start, latencies, results
+
+
+def report(label: str, images: int, elapsed: float, latencies):
+    print(f"  {label:<8} {images / elapsed:7.1f} images/s   mean latency {np.mean(latencies) * 1000:7.1f} ms")
+
+
+async def main_async(args):
+    full = OnnxDetector(args.model, args.size)
+    screen = OnnxDetector(args.screen_model or args.model, args.screen_size)
+    images = load_images(Path(args.images)) if args.images else make_images(args.count)
+    images = [preprocess_image(img) for img in images]
+
+    async def predict_full(img):
+        return await asyncio.to_thread(full.predict, img, args.threshold)
+
+    cascade = ModelCascade(screen, full, args.band[0], args.band[1], args.batch_size, args.batch_window_ms / 1000)
+
+    print(f"{len(images)} images, concurrency {args.concurrency}, band [{args.band[0]}, {args.band[1]}), "
+          f"full {full.input_size} px{' (dynamic batch)' if full.dynamic_batch else ''}, "
+          f"screen {screen.input_size} px")
+    await run(images[:4], predict_full, 1)
+    await run(images[:4], lambda img: cascade.predict(img, args.threshold), 1)
+    cascade = ModelCascade(screen, full, args.band[0], args.band[1], args.batch_size, args.batch_window_ms / 1000)
+
+    elapsed, latencies, reference = await run(images, predict_full, args.concurrency)
+    report("full", len(images), elapsed, latencies)
+    elapsed, latencies, results = await run(
+        images, lambda img: cascade.predict(img, args.threshold), args.concurrency
+    )
+    report("cascade", len(images), elapsed, latencies)
+
+    stats = cascade.get_stats()
+    agree = sum(bool(ref) == bool(dets) for ref, (dets, _) in zip(reference, results))
+    escalated = [bool(ref) == bool(dets) for ref, (dets, stage) in zip(reference, results) if stage == FULL_STAGE]
+    print(f"  escalated {stats.escalated}/{len(images)} ({stats.escalation_rate:.0%}) in {stats.batches} batches "
+          f"of {stats.average_batch_size:.1f}, mean batch wait {stats.average_batch_wait_ms:.1f} ms")
+    for stage in stats.stages:
+        print(f"  {stage.stage:<8} {stage.images:5d} images   mean {stage.average_latency_ms:7.1f} ms   "
+              f"p95 {stage.p95_latency_ms:7.1f} ms")
+    print(f"  verdict agreement with full model: {agree / len(images):.1%} "
+          f"(escalated images {sum(escalated)}/{len(escalated)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", required=True, help="Full ONNX model")
+    parser.add_argument("--screen-model", help="Screening ONNX model (default: the full model)")
+    parser.add_argument("--size", type=int, default=640, help="Full model input size")
+    parser.add_argument("--screen-size", type=int, default=320, help="Screening model input size")
+    parser.add_argument("--band", type=float, nargs=2, default=(0.2, 0.7), help="Uncertainty band (low high)")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Confidence threshold")
+    parser.add_argument("--batch-size", type=int, default=8, help="Escalated images per full-model batch")
+    parser.add_argument("--batch-window-ms", type=float, default=10.0, help="Escalation batch window")
+    parser.add_argument("--concurrency", type=int, default=16, help="Images in flight")
+    parser.add_argument("--count", type=int, default=200, help="Synthetic images")
+    parser.add_argument("--images", help="Directory of images to use instead of synthetic ones")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark client call patterns against a running service
+
+Starts the service on a local port and sends the same images with:
+
+    requests      requests.post per image (new connection each time)
+    pooled        BucchainClient, sequential calls over keep-alive connections
+    concurrent    AsyncBucchainClient, all calls in flight at once
+    coalesced     AsyncBucchainClient(coalesce=True), calls merged into
+                  /detect/batch requests
+
+and reports throughput and mean latency per image.
+
+Without --model the service uses mock inference, which sleeps 100 ms per
+image and hides the client-side differences.
+
+Usage:
+    python scripts/benchmark_client.py --model models/weights/yolov10n.onnx
+    python scripts/benchmark_client.py --model models/weights/yolov10n.onnx --images 200 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import requests
+
+AI_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AI_DIR))
+
+from ai.client import AsyncBucchainClient, BucchainClient  # noqa: E402
+
+
+def write_images(directory: Path, count: int):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        img = np.full((480, 640, 3), 90, np.uint8)
+        for _ in range(20):
+            x, y = int(rng.integers(0, 560)), int(rng.integers(0, 420))
+            cv2.rectangle(img, (x, y), (x + 80, y + 60), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        path = directory / f"scan_{i:04d}.jpg"
+        cv2.imwrite(str(path), img)
+        paths.append(path)
+    return paths
+
+
+def report(label: str, images: int, elapsed: float, latencies):
+    print(f"  {label:<11} {images / elapsed:8.1f} images/s   mean latency {np.mean(latencies) * 1000:7.1f} ms")
+
+
+def bench_requests(url: str, paths):
+    latencies = []
+    start = time.perf_counter()
+    for path in paths:
+        t = time.perf_counter()
+        with open(path, "rb") as f:
+            requests.post(f"{url}/api/v1/detect", files={"file": (path.name, f, "image/jpeg")}).raise_for_status()
+        latencies.append(time.perf_counter() - t)
+    report("requests", len(paths), time.perf_counter() - start, latencies)
+
+
+def bench_pooled(url: str, paths):
+    latencies = []
+    with BucchainClient(url) as client:
+        client.health()
+        start = time.perf_counter()
+        for path in paths:
+            t = time.perf_counter()
+            client.detect(path)
+            latencies.append(time.perf_counter() - t)
+        report("pooled", len(paths), time.perf_counter() - start, latencies)
+
+
+async def bench_async(url: str, paths, concurrency: int, coalesce: bool):
+    latencies = []
+    async with AsyncBucchainClient(url, coalesce=coalesce, max_connections=concurrency) as client:
+        await client.health()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(path):
+            async with semaphore:
+                t = time.perf_counter()
+                await client.detect(path)
+                latencies.append(time.perf_counter() - t)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(path) for path in paths))
+        elapsed = time.perf_counter() - start
+        label = "coalesced" if coalesce else "concurrent"
+        report(label, len(paths), elapsed, latencies)
+        if coalesce:
+            print(f"  {'':<11} {client.coalesced_batches} batch requests, {client.retries} retries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", help="ONNX model to serve (default: mock inference)")
+    parser.add_argument("--images", type=int, default=100, help="Images per pattern")
+    parser.add_argument("--concurrency", type=int, default=16, help="Calls in flight for the async patterns")
+    parser.add_argument("--port", type=int, default=8103, help="Port to run the service on")
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        PORT=str(args.port),
+        LOG_LEVEL="WARNING",
+        MAX_QUEUE_DEPTH="512",
+        LATENCY_SLO_MS="60000"
+    )
+    if args.model:
+        env["MODEL_PATH"] = str(Path(args.model).resolve())
+    server = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=AI_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if requests.get(f"{url}/health", timeout=1).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise SystemExit("Service did not start")
+            time.sleep(0.3)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = write_images(Path(tmp), args.images)
+            print(f"{args.images} images of 640x480, concurrency {args.concurrency}")
+            bench_requests(url, paths)
+            bench_pooled(url, paths)
+            asyncio.run(bench_async(url, paths, args.concurrency, coalesce=False))
+            asyncio.run(bench_async(url, paths, args.concurrency, coalesce=True))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
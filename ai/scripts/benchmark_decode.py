@@ -0,0 +1,97 @@
+"""
+Benchmark image decoding: full resolution against embedded previews
+
+Decodes each file the way the service does (decode_image_bytes) twice:
+with IMAGE_PREVIEW_MIN_SIDE (HEIC/AVIF previews allowed) and with previews
+disabled. Every measurement runs in a fresh process so the peak RSS
+includes the decoder's native buffers, which tracemalloc does not see.
+
+    decode ms      median decode time
+    decoded MB     size of the BGR image handed to the pipeline
+    peak RSS MB    growth of the process's peak RSS during the decodes
+
+Usage:
+    python scripts/benchmark_decode.py photo.heic photo.avif photo.jpg
+    python scripts/benchmark_decode.py photos/*.heic --min-side 1024 --repeat 20
+"""
+
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+AI_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AI_DIR))
+
+
+def measure(path: str, min_side: int, repeat: int, queue):
+    # Imported in the child so the baseline RSS already includes the decoders
+    import logging
+    logging.disable(logging.INFO)
+    from ai.utils.config import settings
+    from ai.utils.helpers import decode_image_bytes
+    from ai.utils.image_formats import sniff_image_format
+
+    settings.image_preview_min_side = min_side
+    data = Path(path).read_bytes()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        img = decode_image_bytes(data, path, max_size=len(data))
+        times.append((time.perf_counter() - started) * 1000)
+        del img
+    img = decode_image_bytes(data, path, max_size=len(data))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((
+        sniff_image_format(data),
+        f"{img.shape[1]}x{img.shape[0]}",
+        statistics.median(times),
+        img.nbytes / (1024 * 1024),
+        (peak - baseline) / 1024
+    ))
+
+
+def run(path: str, min_side: int, repeat: int):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(path, min_side, repeat, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="+", help="Images to decode")
+    parser.add_argument("--min-side", type=int, default=None,
+                        help="Smallest usable preview (default: IMAGE_PREVIEW_MIN_SIDE)")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed decodes per file and path")
+    args = parser.parse_args()
+
+    from ai.utils.config import settings
+    min_side = settings.image_preview_min_side if args.min_side is None else args.min_side
+
+    print(f"{'file':28s} {'format':6s} {'path':8s} {'size':>11s} {'decode ms':>10s} "
+          f"{'decoded MB':>11s} {'peak RSS MB':>12s}")
+    for path in args.files:
+        full = run(path, 0, args.repeat)
+        rows = [("full", full)]
+        if full[0] in ("heic", "avif") and min_side > 0:
+            preview = run(path, min_side, args.repeat)
+            if preview[1] != full[1]:
+                rows.append(("preview", preview))
+        for label, (image_format, size, decode_ms, decoded_mb, peak_mb) in rows:
+            print(f"{Path(path).name[:28]:28s} {image_format:6s} {label:8s} {size:>11s} {decode_ms:10.1f} "
+                  f"{decoded_mb:11.1f} {peak_mb:12.1f}")
+        if len(rows) == 2:
+            print(f"{'':28s} preview speedup {full[2] / rows[1][1][2]:.1f}x, "
+                  f"{full[4] - rows[1][1][4]:.0f} MB less peak RSS")
+
+
+if __name__ == "__main__":
+    main()
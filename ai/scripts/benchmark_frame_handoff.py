@@ -0,0 +1,87 @@
+"""
+Benchmark shared-memory frame handoff against pickling
+
+Sends frames of several sizes to a worker process either pickled (the
+default for ProcessPoolExecutor arguments) or as a handle to a
+SharedFrameRing slot, and reports the round-trip time per frame. The worker
+touches every row so both methods actually read the pixels.
+
+Usage:
+    python scripts/benchmark_frame_handoff.py
+    python scripts/benchmark_frame_handoff.py --rounds 100
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from ai.utils.shared_frames import FrameHandle, SharedFrameRing  # noqa: E402
+
+# (label, shape, dtype): decoded frames and a preprocessed model tensor
+PAYLOADS = [
+    ("640x640 frame", (640, 640, 3), np.uint8),
+    ("1920x1080 frame", (1080, 1920, 3), np.uint8),
+    ("4000x3000 frame", (3000, 4000, 3), np.uint8),
+    ("1x3x640x640 tensor", (1, 3, 640, 640), np.float32),
+]
+
+_ring = None
+
+
+def _attach(name: str):
+    global _ring
+    _ring = SharedFrameRing.attach(name)
+
+
+def _consume(payload) -> float:
+    """Read the frame the way inference would (one value per row)"""
+    frame = _ring.view(payload) if isinstance(payload, FrameHandle) else payload
+    return float(frame.reshape(frame.shape[0], -1)[:, 0].sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=50, help="Frames sent per payload and method")
+    args = parser.parse_args()
+
+    slot_bytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, shape, dtype in PAYLOADS)
+    ring = SharedFrameRing(2, slot_bytes)
+    executor = ProcessPoolExecutor(1, mp_context=get_context("spawn"), initializer=_attach, initargs=(ring.name,))
+    executor.submit(float, 0).result()
+
+    try:
+        print(f"{'payload':<20} {'MB':>7} {'pickle ms':>10} {'shm ms':>8} {'speedup':>8}")
+        for label, shape, dtype in PAYLOADS:
+            array = np.random.default_rng(0).integers(0, 255, shape).astype(dtype)
+
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                executor.submit(_consume, array).result()
+            pickled = (time.perf_counter() - start) / args.rounds
+
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                frame = ring.put(array)
+                executor.submit(_consume, frame.handle).result()
+                ring.release(frame.handle)
+            shared = (time.perf_counter() - start) / args.rounds
+            del frame
+
+            print(
+                f"{label:<20} {array.nbytes / 1e6:7.1f} {pickled * 1000:10.2f} "
+                f"{shared * 1000:8.2f} {pickled / shared:7.1f}x"
+            )
+    finally:
+        executor.shutdown()
+        ring.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark keyframe selection on short and long clips
+
+Writes synthetic clips of increasing length (a few distinct scenes, most
+frames slightly blurred as in hand-held footage), runs keyframe selection
+on each in a fresh process, and reports selection time, the keyframes that
+were picked, and the peak RSS of the process. Peak memory should stay flat
+as the clip grows, since only the current keyframes are kept.
+
+Usage:
+    python scripts/benchmark_keyframes.py
+    python scripts/benchmark_keyframes.py --width 1920 --height 1080 --lengths 150 1500
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai.utils.config import settings  # noqa: E402
+from ai.utils.keyframes import KeyframeSelector, select_video_keyframes  # noqa: E402
+
+
+def write_clip(path: str, frames: int, width: int, height: int, scenes: int):
+    """Clip of `scenes` views with a sharp frame every 7 frames"""
+    rng = np.random.default_rng(0)
+    views = []
+    for k in range(scenes):
+        view = np.full((height, width, 3), (30 + 50 * k % 200, 90, 220 - 40 * k % 200), np.uint8)
+        for _ in range(40):
+            x, y = int(rng.integers(0, width - 120)), int(rng.integers(0, height - 80))
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(view, (x, y), (x + 110, y + 70), color, -1)
+            cv2.putText(view, "BUC", (x + 5, y + 50), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+        views.append(view)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (width, height))
+    for i in range(frames):
+        view = views[i * scenes // frames]
+        writer.write(view if i % 7 == 0 else cv2.GaussianBlur(view, (0, 0), 2.5))
+    writer.release()
+
+
+def select(path: str, queue):
+    selector = KeyframeSelector(
+        settings.burst_max_keyframes,
+        settings.burst_min_difference,
+        settings.burst_keyframe_max_side
+    )
+    start = time.perf_counter()
+    read = select_video_keyframes(path, selector, settings.burst_max_frames, settings.burst_frame_stride)
+    elapsed = time.perf_counter() - start
+    keyframes = [k.index for k in selector.result()]
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((read, selector.offered, keyframes, elapsed, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--width", type=int, default=1280, help="Frame width")
+    parser.add_argument("--height", type=int, default=720, help="Frame height")
+    parser.add_argument("--scenes", type=int, default=4, help="Distinct views in each clip")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[60, 300, 1800], help="Clip lengths in frames")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{args.width}x{args.height} clips, {args.scenes} scenes, "
+          f"max {settings.burst_max_keyframes} keyframes, {settings.burst_max_frames} frames examined")
+    print(f"  {'frames':>7} {'read':>6} {'scored':>7} {'time s':>7} {'peak RSS MB':>12}  keyframes")
+    with tempfile.TemporaryDirectory() as tmp:
+        for length in args.lengths:
+            path = str(Path(tmp) / f"clip_{length}.mp4")
+            write_clip(path, length, args.width, args.height, args.scenes)
+            queue = ctx.Queue()
+            process = ctx.Process(target=select, args=(path, queue))
+            process.start()
+            read, scored, keyframes, elapsed, peak_mb = queue.get()
+            process.join()
+            print(f"  {length:>7} {read:>6} {scored:>7} {elapsed:>7.2f} {peak_mb:>12.1f}  {keyframes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark per-request logging overhead
+
+Emits the log lines of one detection request (decode, detection completed,
+analytics debug) many times and reports the time spent in the calling
+thread, which is what a request pays:
+
+    sync      FileHandler + StreamHandler, f-string messages (previous setup)
+    queued    QueueHandler + background writer, %-style messages
+    sampled   queued, with per-request INFO messages rate limited
+
+Output goes to a temporary log file and to /dev/null instead of stdout.
+
+Usage:
+    python scripts/benchmark_logging.py
+    python scripts/benchmark_logging.py --requests 50000
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai.utils.logging_config import LOG_FORMAT, SAMPLED, queued_logging  # noqa: E402
+
+logger = logging.getLogger("ai.benchmark")
+
+FILENAME = "IMG_2025_0001.jpg"
+SHAPE = (3024, 4032, 3)
+
+
+def sync_request(i: int):
+    logger.info(f"Successfully decoded image: {FILENAME}, shape: {SHAPE}")
+    logger.info(f"Detection completed: {FILENAME}, counterfeit={False}, confidence={0.98:.2f}, time={0.1234:.2f}s")
+    logger.debug(f"Recorded detection: {FILENAME}, counterfeit={False}, total_count={i}")
+
+
+def queued_request(i: int):
+    logger.info("Successfully decoded image: %s, shape: %s", FILENAME, SHAPE, extra=SAMPLED)
+    logger.info(
+        "Detection completed: %s, counterfeit=%s, confidence=%.2f, time=%.2fs",
+        FILENAME, False, 0.98, 0.1234, extra=SAMPLED
+    )
+    logger.debug("Recorded detection: %s, counterfeit=%s, total_count=%s", FILENAME, False, i)
+
+
+def configure_sync(log_file: Path, devnull):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in (logging.StreamHandler(devnull), logging.FileHandler(log_file)):
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def configure_queued(log_file: Path, devnull, sample_rate: float):
+    queued_logging.configure("INFO", str(log_file), 10 * 1024 * 1024, 5, sample_rate)
+    queued_logging.handlers[0].setStream(devnull)
+
+
+def measure(label: str, emit, requests: int):
+    start = time.perf_counter()
+    for i in range(requests):
+        emit(i)
+    caller = time.perf_counter() - start
+    queued_logging.stop()
+    total = time.perf_counter() - start
+    print(f"  {label:<8} {caller / requests * 1e6:8.1f} us/request in caller   ({total:.2f}s until flushed)")
+    return caller
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000, help="Simulated requests per mode")
+    parser.add_argument("--sample-rate", type=float, default=10.0, help="Sampled messages per second")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open("/dev/null", "w") as devnull:
+        print(f"{args.requests} requests, 2 INFO + 1 DEBUG line each")
+        configure_sync(Path(tmp) / "sync.log", devnull)
+        baseline = measure("sync", sync_request, args.requests)
+        configure_queued(Path(tmp) / "queued.log", devnull, 0)
+        queued = measure("queued", queued_request, args.requests)
+        configure_queued(Path(tmp) / "sampled.log", devnull, args.sample_rate)
+        sampled = measure("sampled", queued_request, args.requests)
+        print(f"  speedup: queued {baseline / queued:.1f}x, sampled {baseline / sampled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark content-adaptive input resolution
+
+Runs every image in a folder through the ONNX model twice: at the input size
+picked from its edge density (ADAPTIVE_INPUT_SIZES / ADAPTIVE_EDGE_THRESHOLDS)
+and at the largest supported size. Reports the size distribution, the cost
+of the edge-density estimate, mean inference time of both runs, and how
+well the adaptive detections agree with the largest-size ones (same verdict,
+mean matched box IoU). The model must be exported with dynamic height and
+width (yolo export ... dynamic=True).
+
+Usage:
+    python scripts/benchmark_resolution.py --images data/labelled --model models/weights/yolov10n.onnx
+    python scripts/benchmark_resolution.py --images data/labelled --thresholds 0.03,0.06,0.1
+"""
+
+import argparse
+import logging
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2  # noqa: E402
+
+from ai.services.inference_backend import OnnxDetector  # noqa: E402
+from ai.utils.config import settings  # noqa: E402
+from ai.utils.helpers import mean_matched_iou  # noqa: E402
+from ai.utils.quantization import list_images  # noqa: E402
+from ai.utils.resolution import ResolutionSelector  # noqa: E402
+
+
+def boxes(detections):
+    return [(d.bounding_box.x1, d.bounding_box.y1, d.bounding_box.x2, d.bounding_box.y2)
+            for d in detections if d.bounding_box is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", required=True, help="Folder of sample images")
+    parser.add_argument("--model", default=settings.active_model_path, help="ONNX model with dynamic input size")
+    parser.add_argument("--sizes", default=settings.adaptive_input_sizes, help="Supported input sizes")
+    parser.add_argument("--thresholds", default=settings.adaptive_edge_thresholds,
+                        help="Edge densities separating the sizes")
+    parser.add_argument("--threshold", type=float, default=settings.confidence_threshold,
+                        help="Detection confidence threshold")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    detector = OnnxDetector(args.model, settings.model_input_size)
+    if not detector.dynamic_size:
+        raise SystemExit(f"{args.model} has a fixed {detector.input_size} px input; export it with dynamic=True")
+    selector = ResolutionSelector(
+        [int(size) for size in args.sizes.split(",")],
+        [float(value) for value in args.thresholds.split(",")]
+    )
+    largest = selector.sizes[-1]
+    paths = list_images(args.images)
+    if not paths:
+        raise SystemExit(f"No images found in {args.images}")
+
+    chosen = Counter()
+    select_time = 0.0
+    latency = {"adaptive": 0.0, "largest": 0.0}
+    same_verdict = 0
+    iou = 0.0
+    evaluated = 0
+    for path in paths:
+        img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        start = time.perf_counter()
+        size, _ = selector.select(img)
+        select_time += time.perf_counter() - start
+        chosen[size] += 1
+
+        # Warm the session for both sizes so only steady-state time is counted
+        detector.predict(img, args.threshold, size)
+        detector.predict(img, args.threshold, largest)
+        start = time.perf_counter()
+        adaptive = detector.predict(img, args.threshold, size)
+        latency["adaptive"] += time.perf_counter() - start
+        start = time.perf_counter()
+        reference = detector.predict(img, args.threshold, largest)
+        latency["largest"] += time.perf_counter() - start
+
+        same_verdict += bool(adaptive) == bool(reference)
+        iou += mean_matched_iou(boxes(reference), boxes(adaptive))
+        evaluated += 1
+
+    if not evaluated:
+        raise SystemExit("No readable images")
+    print(f"{evaluated} images, model {args.model}")
+    print("  sizes           " + "  ".join(f"{size}: {chosen[size]}" for size in selector.sizes))
+    print(f"  size selection  {select_time / evaluated * 1000:.2f} ms per image")
+    adaptive_ms = latency["adaptive"] / evaluated * 1000
+    largest_ms = latency["largest"] / evaluated * 1000
+    print(f"  inference       adaptive {adaptive_ms:.1f} ms   always {largest} px {largest_ms:.1f} ms   "
+          f"saved {largest_ms - adaptive_ms:.1f} ms ({1 - adaptive_ms / largest_ms:.0%})")
+    print(f"  agreement       same verdict {same_verdict / evaluated:.1%}   box IoU {iou / evaluated:.3f}")
+
+
+if __name__ == "__main__":
+    main()
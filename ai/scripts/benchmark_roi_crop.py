@@ -0,0 +1,92 @@
+"""
+Benchmark the region-of-interest pre-crop stage
+
+Runs every image in a folder through MLService.detect with the pre-crop
+disabled and enabled, and reports the cost of the crop stage, end-to-end
+latency, how much of the frame was kept, and the detection-rate impact.
+
+Usage:
+    python scripts/benchmark_roi_crop.py --images data/labelled
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2  # noqa: E402
+
+from ai.services.ml_service import ml_service  # noqa: E402
+from ai.utils.config import settings  # noqa: E402
+from ai.utils.helpers import find_salient_region  # noqa: E402
+from ai.utils.quantization import list_images  # noqa: E402
+
+
+async def run(image_dir: str, input_size: int):
+    ml_service.load_model()
+    paths = list_images(image_dir)
+    if not paths:
+        raise SystemExit(f"No images found in {image_dir}")
+
+    crop_time = 0.0
+    kept_area = 0.0
+    cropped = 0
+    latency = {False: 0.0, True: 0.0}
+    detected = {False: 0, True: 0}
+    agreement = 0
+    evaluated = 0
+
+    for path in paths:
+        img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+
+        start = time.perf_counter()
+        region = find_salient_region(
+            img,
+            margin=settings.roi_margin,
+            min_area_ratio=settings.roi_min_area_ratio
+        )
+        crop_time += time.perf_counter() - start
+        if region:
+            cropped += 1
+            kept_area += region[2] * region[3] / (img.shape[0] * img.shape[1])
+        else:
+            kept_area += 1.0
+
+        verdicts = {}
+        for enabled in (False, True):
+            ml_service.roi_crop_enabled = enabled
+            start = time.perf_counter()
+            result = await ml_service.detect(img, path.name, input_size=input_size)
+            latency[enabled] += time.perf_counter() - start
+            detected[enabled] += result.is_counterfeit
+            verdicts[enabled] = result.is_counterfeit
+        agreement += verdicts[False] == verdicts[True]
+        evaluated += 1
+
+    print(f"Images: {evaluated} (model loaded: {ml_service.is_model_loaded}, input size: {input_size or 'full'})")
+    print(f"  crop stage:            {crop_time / evaluated * 1000:8.2f} ms/image")
+    print(f"  crop found:            {cropped / evaluated:8.1%}")
+    print(f"  frame area kept:       {kept_area / evaluated:8.1%}")
+    print(f"  latency without crop:  {latency[False] / evaluated * 1000:8.2f} ms/image")
+    print(f"  latency with crop:     {latency[True] / evaluated * 1000:8.2f} ms/image")
+    print(f"  detection rate:        {detected[False] / evaluated:8.1%} -> {detected[True] / evaluated:.1%}")
+    print(f"  verdict agreement:     {agreement / evaluated:8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", required=True, help="Folder of product images")
+    parser.add_argument("--input-size", type=int, default=0, help="Longest-side input size (0 for full)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args.images, args.input_size or None))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark the analytics rollups on a high-cardinality detection stream
+
+Feeds a synthetic stream with Zipf-distributed supplier and product ids
+(a few large suppliers, a long tail of small ones) through RollupStore and
+compares it with exact per-key counting:
+
+    record cost     time per detection
+    memory          traced memory of the store vs. exact dictionaries
+    group-by        query time and how many of the true top suppliers are
+                    returned, with their count and counterfeit-rate error
+    point queries   count-min estimates for tail keys vs. their true count
+
+Usage:
+    python scripts/benchmark_rollups.py
+    python scripts/benchmark_rollups.py --events 2000000 --suppliers 100000 --top-keys 500
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+AI_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AI_DIR))
+
+from ai.services.rollup_service import (  # noqa: E402
+    DetectionTags,
+    Dimension,
+    RollupOrder,
+    RollupStore
+)
+
+
+def make_stream(events: int, suppliers: int, products: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    supplier_ids = (rng.zipf(1.3, events) - 1) % suppliers
+    product_ids = (rng.zipf(1.2, events) - 1) % products
+    # Counterfeit rate differs per supplier, between 1% and 30%
+    rates = rng.uniform(0.01, 0.3, suppliers)
+    counterfeit = rng.random(events) < rates[supplier_ids]
+    confidence = rng.uniform(0.5, 1.0, events)
+    return supplier_ids, product_ids, counterfeit, confidence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=500_000, help="Detections in the stream")
+    parser.add_argument("--suppliers", type=int, default=50_000, help="Distinct supplier ids")
+    parser.add_argument("--products", type=int, default=200_000, help="Distinct product ids")
+    parser.add_argument("--top-keys", type=int, default=200, help="ROLLUP_TOP_KEYS")
+    parser.add_argument("--hours", type=int, default=24, help="Hours the stream is spread over")
+    args = parser.parse_args()
+
+    supplier_ids, product_ids, counterfeit, confidence = make_stream(args.events, args.suppliers, args.products)
+    suppliers = [f"supplier-{i}" for i in supplier_ids.tolist()]
+    products = [f"sku-{i}" for i in product_ids.tolist()]
+    counterfeit = counterfeit.tolist()
+    confidence = confidence.tolist()
+    # Keep the stream inside the buckets a query over the last --hours covers
+    start = time.time() // 3600 * 3600 - (args.hours - 1) * 3600
+    timestamps = np.linspace(start, time.time() - 1, args.events).tolist()
+
+    def fill(store: RollupStore):
+        for i in range(args.events):
+            store.record(
+                DetectionTags(suppliers[i], products[i], "erp", "yolov10n"),
+                counterfeit[i], confidence[i], 0.05, now=timestamps[i]
+            )
+
+    def new_store() -> RollupStore:
+        return RollupStore(bucket_seconds=3600, retention_seconds=args.hours * 3600, top_keys=args.top_keys)
+
+    store = new_store()
+    began = time.perf_counter()
+    fill(store)
+    record_time = (time.perf_counter() - began) / args.events
+
+    # Memory is measured on a second pass; tracing slows recording down
+    tracemalloc.start()
+    traced = new_store()
+    fill(traced)
+    store_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+
+    tracemalloc.start()
+    exact = {"supplier": defaultdict(lambda: [0, 0]), "product": defaultdict(lambda: [0, 0])}
+    for i in range(args.events):
+        for name, key in (("supplier", suppliers[i]), ("product", products[i])):
+            entry = exact[name][key]
+            entry[0] += 1
+            entry[1] += counterfeit[i]
+    exact_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{args.events} detections over {args.hours} h, {len(exact['supplier'])} suppliers, "
+          f"{len(exact['product'])} products, top keys {args.top_keys}")
+    print(f"  record          {record_time * 1e6:6.1f} us per detection")
+    print(f"  memory          rollups {store_memory / 1e6:6.1f} MB   exact dictionaries {exact_memory / 1e6:6.1f} MB")
+
+    query_times = []
+    for _ in range(5):
+        began = time.perf_counter()
+        result = store.group_by(Dimension.SUPPLIER, hours=args.hours, limit=20)
+        query_times.append(time.perf_counter() - began)
+    query_time = float(np.median(query_times))
+    true_top = sorted(exact["supplier"].items(), key=lambda kv: kv[1][0], reverse=True)[:20]
+    returned = {g.key: g for g in result.groups}
+    found = [key for key, _ in true_top if key in returned]
+    count_error = np.mean([abs(returned[k].detections - exact["supplier"][k][0]) / exact["supplier"][k][0] for k in found])
+    rate_error = np.mean([
+        abs(returned[k].counterfeit_rate - exact["supplier"][k][1] / exact["supplier"][k][0]) for k in found
+    ])
+    print(f"  group-by        {query_time * 1000:6.1f} ms   top-20 suppliers found {len(found)}/20   "
+          f"count error {count_error:.2%}   rate error {rate_error * 100:.2f} points")
+    result = store.group_by(Dimension.SUPPLIER, hours=args.hours, limit=20,
+                            order=RollupOrder.COUNTERFEIT_RATE, min_detections=500)
+    print(f"  highest rate    {', '.join(f'{g.key} {g.counterfeit_rate:.0%}' for g in result.groups[:3])}")
+
+    tail = [key for key, (count, _) in exact["supplier"].items() if 5 <= count <= 50][:200]
+    began = time.perf_counter()
+    estimates = [store.estimate(Dimension.SUPPLIER, key, hours=args.hours).detections for key in tail]
+    point_time = (time.perf_counter() - began) / max(1, len(tail))
+    overcount = [e - exact["supplier"][k][0] for k, e in zip(tail, estimates)]
+    print(f"  point query     {point_time * 1000:6.2f} ms   tail keys (5-50 detections): "
+          f"mean overcount {np.mean(overcount):.1f}, max {max(overcount)}, undercounts {sum(o < 0 for o in overcount)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark detection response serialization
+
+Compares the default path (Pydantic validation of every model plus FastAPI's
+response_model serialization and the standard JSON encoder) against the fast
+path (model_construct plus hand-written dict conversion and orjson).
+
+Usage:
+    python scripts/benchmark_serialization.py --images 50 --detections 20
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from ai.models.predictions import (  # noqa: E402
+    BatchDetectionResponse,
+    BoundingBox,
+    DetectionResponse,
+    DetectionResult,
+    ImageMetadata
+)
+from ai.utils.serialization import batch_to_dict, dumps  # noqa: E402
+
+
+def build_batch(images: int, detections: int, validate: bool) -> BatchDetectionResponse:
+    """Build a synthetic batch response, validated or constructed"""
+    make = (lambda cls, **kw: cls(**kw)) if validate else (lambda cls, **kw: cls.model_construct(**kw))
+    results = []
+    for i in range(images):
+        boxes = [
+            make(
+                DetectionResult,
+                class_name="counterfeit_logo",
+                confidence=0.5 + (j % 50) / 100,
+                bounding_box=make(BoundingBox, x1=10.0 + j, y1=20.0 + j, x2=110.0 + j, y2=220.0 + j)
+            )
+            for j in range(detections)
+        ]
+        results.append(make(
+            DetectionResponse,
+            is_counterfeit=bool(boxes),
+            confidence=0.97,
+            detections=boxes,
+            image_metadata=make(
+                ImageMetadata,
+                filename=f"image_{i}.jpg",
+                width=640,
+                height=480,
+                channels=3,
+                size=921600,
+                dtype="uint8"
+            ),
+            processing_time_seconds=0.12,
+            timestamp=datetime.now(),
+            model_version="yolov10n"
+        ))
+    return make(
+        BatchDetectionResponse,
+        results=results,
+        total_processed=images,
+        total_counterfeit=images,
+        average_confidence=0.97,
+        total_processing_time_seconds=0.12 * images
+    )
+
+
+def default_path(images: int, detections: int, adapter: TypeAdapter) -> bytes:
+    """Validated models, response_model re-validation, stdlib encoder"""
+    batch = build_batch(images, detections, validate=True)
+    validated = adapter.validate_python(batch)
+    content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(images: int, detections: int, compact: bool) -> bytes:
+    """Constructed models, hand-written conversion, orjson"""
+    batch = build_batch(images, detections, validate=False)
+    return dumps(batch_to_dict(batch, compact))
+
+
+def timeit(fn, repeat: int) -> float:
+    """Return the median wall time of fn in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", type=int, default=50, help="Results per batch response")
+    parser.add_argument("--detections", type=int, default=20, help="Detections per result")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed iterations")
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(BatchDetectionResponse)
+    cases = {
+        "default (validate + stdlib json)": lambda: default_path(args.images, args.detections, adapter),
+        "fast (construct + orjson)": lambda: fast_path(args.images, args.detections, False),
+        "fast compact (construct + orjson)": lambda: fast_path(args.images, args.detections, True),
+    }
+
+    print(f"Batch of {args.images} images x {args.detections} detections, median of {args.repeat} runs")
+    baseline = None
+    for name, fn in cases.items():
+        fn()  # warm up
+        elapsed = timeit(fn, args.repeat)
+        size = len(fn())
+        baseline = baseline or elapsed
+        print(f"  {name:<36} {elapsed:8.2f} ms  {size:>8} bytes  {baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
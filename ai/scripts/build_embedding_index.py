@@ -0,0 +1,91 @@
+"""
+Build the reference embedding index and benchmark similarity search
+
+The reference folder holds one sub-folder per product id, each containing
+known-genuine images:
+
+    references/
+        BAG-2025-0001/front.jpg
+        BAG-2025-0001/logo.jpg
+        BAG-2025-0002/front.jpg
+
+Usage:
+    python scripts/build_embedding_index.py --references data/references
+    python scripts/build_embedding_index.py --benchmark 1000
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from ai.services.embedding_service import VectorIndex, compute_descriptor  # noqa: E402
+from ai.utils.config import settings  # noqa: E402
+from ai.utils.quantization import list_images  # noqa: E402
+
+
+def register_folder(index: VectorIndex, root: Path, chunk: int = 1024):
+    """Register every image under root/<product_id>/ in chunks"""
+    product_ids, vectors = [], []
+    for product_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        for path in list_images(str(product_dir)):
+            img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if img is None:
+                logging.warning(f"Skipping unreadable image: {path}")
+                continue
+            product_ids.append(product_dir.name)
+            vectors.append(compute_descriptor(img))
+            if len(vectors) == chunk:
+                index.add_many(product_ids, np.stack(vectors))
+                product_ids, vectors = [], []
+    if vectors:
+        index.add_many(product_ids, np.stack(vectors))
+
+
+def benchmark(index: VectorIndex, queries: int, nprobe: int):
+    """Time approximate search and measure recall@1 against exact search"""
+    rng = np.random.default_rng(0)
+    rows = rng.choice(index.count, min(queries, index.count), replace=False)
+    noise = rng.normal(0, 0.02, (len(rows), index.dim)).astype(np.float32)
+    samples = np.asarray(index.vectors[np.sort(rows)]) + noise
+    samples /= np.linalg.norm(samples, axis=1, keepdims=True)
+
+    hits, elapsed = 0, 0.0
+    for query in samples:
+        start = time.perf_counter()
+        approximate = index.search(query, k=1, nprobe=nprobe)
+        elapsed += time.perf_counter() - start
+        exact = int(np.argmax(np.asarray(index.vectors[:index.count]) @ query))
+        hits += bool(approximate) and approximate[0][0] == exact
+
+    print(f"Index: {index.count} vectors, trained: {index.trained}, nprobe: {nprobe}")
+    print(f"  mean search time: {elapsed / len(samples) * 1000:.2f} ms")
+    print(f"  recall@1:         {hits / len(samples):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--index", default=settings.embedding_index_dir, help="Index directory")
+    parser.add_argument("--references", help="Folder of <product_id>/<image> references to register")
+    parser.add_argument("--nlist", type=int, help="IVF lists (default: sqrt of vector count)")
+    parser.add_argument("--benchmark", type=int, default=0, help="Number of benchmark queries")
+    parser.add_argument("--nprobe", type=int, default=settings.embedding_nprobe, help="Lists scanned per query")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+
+    index = VectorIndex(args.index)
+    if args.references:
+        register_folder(index, Path(args.references))
+        index.train(args.nlist)
+    if args.benchmark:
+        benchmark(index, args.benchmark, args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Precompute the keypoint reference store and benchmark verification
+
+The reference folder uses the same layout as build_embedding_index.py, one
+sub-folder of known-genuine images per product id:
+
+    references/
+        BAG-2025-0001/logo.jpg
+        BAG-2025-0002/label.jpg
+
+With --benchmark, every reference is verified against its own product to
+report the cold (disk load + matcher training) and warm (LRU-cached)
+per-request cost.
+
+Usage:
+    python scripts/build_keypoint_store.py --references data/references
+    python scripts/build_keypoint_store.py --references data/references --benchmark
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2  # noqa: E402
+
+from ai.services.verification_service import VerificationService  # noqa: E402
+from ai.utils.config import settings  # noqa: E402
+from ai.utils.quantization import list_images  # noqa: E402
+
+
+def load_references(root: Path):
+    """Yield (product_id, image) for every readable reference image"""
+    for product_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        for path in list_images(str(product_dir)):
+            img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if img is None:
+                logging.warning(f"Skipping unreadable image: {path}")
+                continue
+            yield product_dir.name, img
+
+
+def benchmark(service: VerificationService, root: Path):
+    """Time cold and warm verification of every reference against its product"""
+    timings = {"cold": [], "warm": []}
+    verified = 0
+    for product_id, img in load_references(root):
+        service._cache.clear()
+        for phase in ("cold", "warm"):
+            start = time.perf_counter()
+            result = service.verify(product_id, img)
+            timings[phase].append(time.perf_counter() - start)
+        verified += bool(result and result.verified)
+
+    count = len(timings["warm"])
+    print(f"References: {count}, detector: {service.detector_name}")
+    print(f"  cold verification: {sum(timings['cold']) / count * 1000:8.2f} ms")
+    print(f"  warm verification: {sum(timings['warm']) / count * 1000:8.2f} ms")
+    print(f"  self-verified:     {verified / count:8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--store", default=settings.keypoint_store_dir, help="Keypoint store directory")
+    parser.add_argument("--references", required=True, help="Folder of <product_id>/<image> references")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark verification after building")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+
+    service = VerificationService(args.store)
+    root = Path(args.references)
+    stored = sum(bool(service.register_reference(pid, img)) for pid, img in load_references(root))
+    print(f"Stored {stored} references in {args.store}")
+    if args.benchmark:
+        benchmark(service, root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Run the golden corpus through the detection pipeline and check for regressions
+
+Every labelled image of the corpus goes through decoding and
+MLService.detect as configured by the environment (.env, MODEL_PATH,
+QUALITY_GATE_ENABLED, ...). Verdicts, boxes, per-stage timings and peak
+memory are written to a results file and compared with a baseline; the
+command exits with status 1 on an accuracy or performance regression.
+
+Usage:
+    # Record the baseline (e.g. on main, before a change)
+    python scripts/golden_corpus.py run --corpus data/golden --output data/golden/baseline.json
+
+    # After the change: run and diff against the baseline
+    python scripts/golden_corpus.py run --corpus data/golden --output golden_results.json \
+        --baseline data/golden/baseline.json
+
+    # Diff two result files again, e.g. with other tolerances
+    python scripts/golden_corpus.py compare --results golden_results.json \
+        --baseline data/golden/baseline.json --latency-tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai.services.ml_service import ml_service  # noqa: E402
+from ai.utils.golden_corpus import STAGES, Tolerances, compare_results, run_corpus  # noqa: E402
+
+
+def print_summary(results: dict):
+    summary = results["summary"]
+    accuracy = summary["accuracy"]
+    print(f"{summary['images']} images (corpus {results['corpus']['version'] or 'unversioned'}), "
+          f"model {results['environment']['model_name']}"
+          f"{'' if results['environment']['model_loaded'] else ' (mock inference)'}")
+    print(f"  accuracy        {'-' if accuracy is None else f'{accuracy:.3f}'}   retakes {summary['retakes']}   "
+          f"throughput {summary['throughput_images_per_second']:.1f} img/s")
+    print("  median ms       " + "  ".join(f"{stage} {summary['stage_p50_ms'][stage]:.1f}" for stage in STAGES))
+    traced = summary["peak_traced_mb"]
+    print(f"  memory          peak RSS {summary['peak_rss_mb']:.0f} MB"
+          f"{'' if traced is None else f'   peak traced per image {traced:.1f} MB'}")
+
+
+def print_report(report: dict):
+    for warning in report["warnings"]:
+        print(f"  warning: {warning}")
+    for change in report.get("verdict_changes", []):
+        print(f"  verdict changed: {change['file']} {change['baseline']} -> {change['current']} "
+              f"(label {change['label']})")
+    if report["images_compared"]:
+        print(f"  compared {report['images_compared']} images   box IoU agreement {report['box_iou']:.3f}")
+        for stage, times in report["stage_p50_ms"].items():
+            print(f"    {stage:12s} {times['baseline_ms']:8.1f} -> {times['current_ms']:8.1f} ms")
+    if report["passed"]:
+        print("PASSED")
+    else:
+        for failure in report["failures"]:
+            print(f"  regression: {failure}")
+        print("FAILED")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run the corpus (and compare with a baseline)")
+    run.add_argument("--corpus", default="data/golden", help="Corpus folder with labels.json")
+    run.add_argument("--output", default="golden_results.json", help="Results file to write")
+    run.add_argument("--baseline", help="Baseline results to compare with")
+    run.add_argument("--repeat", type=int, default=3, help="Timed runs per image")
+    run.add_argument("--warmup", type=int, default=1, help="Untimed runs per image")
+    run.add_argument("--no-memory-pass", action="store_true", help="Skip the tracemalloc pass")
+
+    compare = subparsers.add_parser("compare", help="Compare a results file with a baseline")
+    compare.add_argument("--results", required=True, help="Results file")
+    compare.add_argument("--baseline", required=True, help="Baseline results")
+
+    defaults = Tolerances()
+    for sub in (run, compare):
+        sub.add_argument("--report", help="Write the comparison report to this JSON file")
+        sub.add_argument("--max-verdict-changes", type=int, default=defaults.max_verdict_changes,
+                         help="Verdict changes allowed")
+        sub.add_argument("--min-box-iou", type=float, default=defaults.min_box_iou,
+                         help="Minimum mean box IoU agreement with the baseline")
+        sub.add_argument("--max-accuracy-drop", type=float, default=defaults.max_accuracy_drop,
+                         help="Accuracy drop allowed (fraction)")
+        sub.add_argument("--latency-tolerance", type=float, default=defaults.latency,
+                         help="Relative median latency increase allowed per stage")
+        sub.add_argument("--latency-slack-ms", type=float, default=defaults.latency_slack_ms,
+                         help="Absolute latency increase always allowed")
+        sub.add_argument("--memory-tolerance", type=float, default=defaults.memory,
+                         help="Relative peak memory increase allowed")
+        sub.add_argument("--memory-slack-mb", type=float, default=defaults.memory_slack_mb,
+                         help="Absolute memory increase always allowed")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+    tolerances = Tolerances(
+        max_verdict_changes=args.max_verdict_changes,
+        min_box_iou=args.min_box_iou,
+        max_accuracy_drop=args.max_accuracy_drop,
+        latency=args.latency_tolerance,
+        latency_slack_ms=args.latency_slack_ms,
+        memory=args.memory_tolerance,
+        memory_slack_mb=args.memory_slack_mb
+    )
+
+    if args.command == "run":
+        ml_service.load_model()
+        try:
+            results = asyncio.run(run_corpus(
+                args.corpus,
+                ml_service,
+                repeat=args.repeat,
+                warmup=args.warmup,
+                memory_pass=not args.no_memory_pass
+            ))
+        finally:
+            ml_service.shutdown()
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print_summary(results)
+        print(f"Results written to {args.output}")
+        if not args.baseline:
+            return
+    else:
+        results = json.loads(Path(args.results).read_text())
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    report = compare_results(results, baseline, tolerances)
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    print(f"Compared with {args.baseline}:")
+    print_report(report)
+    if not report["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
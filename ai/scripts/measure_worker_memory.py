@@ -0,0 +1,134 @@
+"""
+Measure per-worker memory with and without pre-fork model loading
+
+Starts the service twice with WORKERS worker processes - once with
+PREFORK_MODEL=false (every uvicorn worker loads its own model) and once with
+PREFORK_MODEL=true (the model is loaded in the master and shared
+copy-on-write) - warms the workers up with a few detection requests, and
+reports RSS, PSS and USS of every process from /proc/<pid>/smaps_rollup.
+
+PSS splits shared pages between the processes sharing them and USS counts
+only private pages, so with sharing the per-worker USS drops to roughly the
+unshared baseline while the PSS total falls by about (workers - 1) model
+copies. Linux only.
+
+Usage:
+    python scripts/measure_worker_memory.py --model models/weights/yolov10n.onnx
+    python scripts/measure_worker_memory.py --model models/weights/yolov10n.onnx --workers 4
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+import requests
+
+AI_DIR = Path(__file__).resolve().parent.parent
+
+
+def read_memory(pid: int) -> Dict[str, int]:
+    """RSS, PSS and USS of a process in kB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    }
+
+
+def descendants(pid: int) -> List[int]:
+    """Server processes below pid (multiprocessing helpers excluded)"""
+    found = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        children = (task / "children").read_text().split()
+        for child in map(int, children):
+            cmdline = Path(f"/proc/{child}/cmdline").read_bytes()
+            if b"resource_tracker" in cmdline:
+                continue
+            found.append(child)
+            found.extend(descendants(child))
+    return found
+
+
+def run(model: str, workers: int, prefork: bool, port: int, requests_per_worker: int, settle: float):
+    env = dict(
+        os.environ,
+        MODEL_PATH=model,
+        WORKERS=str(workers),
+        PREFORK_MODEL=str(prefork).lower(),
+        PORT=str(port),
+        LOG_LEVEL="WARNING"
+    )
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=AI_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                if requests.get(f"{url}/health", timeout=1).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise SystemExit("Service did not start")
+            time.sleep(0.5)
+
+        # Let every worker finish loading, then run some inference in each
+        time.sleep(settle)
+        img = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        payload = cv2.imencode(".jpg", img)[1].tobytes()
+        for _ in range(workers * requests_per_worker):
+            with requests.Session() as session:
+                session.post(f"{url}/api/v1/detect", files={"file": ("warmup.jpg", payload, "image/jpeg")})
+        time.sleep(1)
+
+        pids = [server.pid] + descendants(server.pid)
+        usage = {pid: read_memory(pid) for pid in pids}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    label = "pre-fork (shared model)" if prefork else "independent workers"
+    print(f"\n{label}: {workers} workers")
+    print(f"  {'pid':>8} {'role':<8} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}")
+    for pid, mem in usage.items():
+        role = "master" if pid == server.pid else "worker"
+        print(f"  {pid:>8} {role:<8} {mem['rss'] / 1024:8.1f} {mem['pss'] / 1024:8.1f} {mem['uss'] / 1024:8.1f}")
+    total_pss = sum(mem["pss"] for mem in usage.values()) / 1024
+    worker_uss = [mem["uss"] / 1024 for pid, mem in usage.items() if pid != server.pid]
+    print(f"  total PSS: {total_pss:.1f} MB, mean worker USS: {sum(worker_uss) / max(1, len(worker_uss)):.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", required=True, help="ONNX model to serve")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes")
+    parser.add_argument("--port", type=int, default=8102, help="Port to run the measured service on")
+    parser.add_argument("--requests", type=int, default=5, help="Warm-up requests per worker")
+    parser.add_argument("--settle", type=float, default=5.0, help="Seconds to wait for workers to load")
+    args = parser.parse_args()
+
+    model = str(Path(args.model).resolve())
+    for prefork in (False, True):
+        run(model, args.workers, prefork, args.port, args.requests, args.settle)
+
+
+if __name__ == "__main__":
+    main()
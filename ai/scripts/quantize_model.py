@@ -0,0 +1,85 @@
+"""
+Build and evaluate an INT8-quantized detection model
+
+Usage:
+    # Export the FP32 model once (requires ultralytics)
+    yolo export model=models/weights/yolov10n.pt format=onnx
+
+    # Static INT8 quantization calibrated on representative product images
+    python scripts/quantize_model.py calibrate \
+        --fp32 models/weights/yolov10n.onnx \
+        --images data/calibration \
+        --output models/weights/yolov10n.int8.onnx
+
+    # Accuracy / latency comparison on a labelled set
+    python scripts/quantize_model.py compare \
+        --fp32 models/weights/yolov10n.onnx \
+        --int8 models/weights/yolov10n.int8.onnx \
+        --images data/labelled --labels data/labelled/labels.json \
+        --report quantization_report.json
+
+Then set MODEL_PRECISION=int8 (and INT8_MODEL_PATH) to serve the INT8 model.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai.utils.config import settings  # noqa: E402
+from ai.utils.quantization import build_int8_model, compare_models  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    calibrate = subparsers.add_parser("calibrate", help="Build a static INT8 model")
+    calibrate.add_argument("--fp32", required=True, help="FP32 ONNX model")
+    calibrate.add_argument("--images", required=True, help="Folder of calibration images")
+    calibrate.add_argument("--output", default=settings.int8_model_path, help="INT8 model output path")
+    calibrate.add_argument("--max-images", type=int, default=200, help="Calibration images to use")
+    calibrate.add_argument("--per-tensor", action="store_true", help="Per-tensor instead of per-channel weights")
+
+    compare = subparsers.add_parser("compare", help="Compare FP32 and INT8 on a labelled set")
+    compare.add_argument("--fp32", required=True, help="FP32 ONNX model")
+    compare.add_argument("--int8", default=settings.int8_model_path, help="INT8 ONNX model")
+    compare.add_argument("--images", required=True, help="Folder of labelled images")
+    compare.add_argument("--labels", required=True, help="JSON mapping filename -> is_counterfeit")
+    compare.add_argument("--report", help="Write the report to this JSON file")
+
+    for sub in (calibrate, compare):
+        sub.add_argument("--input-size", type=int, default=settings.model_input_size, help="Model input size")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+
+    if args.command == "calibrate":
+        build_int8_model(
+            args.fp32,
+            args.images,
+            args.output,
+            input_size=args.input_size,
+            max_images=args.max_images,
+            per_channel=not args.per_tensor
+        )
+        return
+
+    report = compare_models(
+        args.fp32,
+        args.int8,
+        args.images,
+        args.labels,
+        confidence_threshold=settings.confidence_threshold,
+        input_size=args.input_size
+    )
+    print(json.dumps(report, indent=2))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()